@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='temperaturelog',
+            index=models.Index(fields=['-timestamp', '-id'], name='temperature_log_timestamp_idx'),
+        ),
+    ]
@@ -120,6 +120,10 @@ class TemperatureLog(models.Model):
 
     class Meta:
         ordering = ['-timestamp']
+        # The API pages logs by `(timestamp, id)`, newest first.
+        indexes = [
+            models.Index(fields=['-timestamp', '-id'], name='temperature_log_timestamp_idx'),
+        ]
 
 
 class UserProfile(models.Model):
@@ -6,6 +6,8 @@ from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
 from django.shortcuts import get_object_or_404
 
+from thermostats.pagination import TimestampCursorPagination
+
 from .models import Property, Thermostat, Calendar, Schedule, TemperatureLog, UserProfile
 from .serializers import (
     UserSerializer, PropertySerializer, ThermostatSerializer, 
@@ -50,8 +52,7 @@ class ThermostatViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         """Filter thermostats to return only those belonging to the current user's properties"""
-        user_properties = Property.objects.filter(user=self.request.user)
-        return Thermostat.objects.filter(property__in=user_properties)
+        return Thermostat.objects.filter(property__user=self.request.user).select_related('property')
 
 
 class CalendarViewSet(viewsets.ModelViewSet):
@@ -64,8 +65,7 @@ class CalendarViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         """Filter calendars to return only those belonging to the current user's properties"""
-        user_properties = Property.objects.filter(user=self.request.user)
-        return Calendar.objects.filter(property__in=user_properties)
+        return Calendar.objects.filter(property__user=self.request.user).select_related('property')
 
 
 class ScheduleViewSet(viewsets.ModelViewSet):
@@ -78,9 +78,7 @@ class ScheduleViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         """Filter schedules to return only those belonging to the current user's thermostats"""
-        user_properties = Property.objects.filter(user=self.request.user)
-        user_thermostats = Thermostat.objects.filter(property__in=user_properties)
-        return Schedule.objects.filter(thermostat__in=user_thermostats)
+        return Schedule.objects.filter(thermostat__property__user=self.request.user).select_related('thermostat')
 
 
 class TemperatureLogViewSet(viewsets.ReadOnlyModelViewSet):
@@ -90,12 +88,13 @@ class TemperatureLogViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = TemperatureLog.objects.all()
     serializer_class = TemperatureLogSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = TimestampCursorPagination
     
     def get_queryset(self):
         """Filter temperature logs to return only those belonging to the current user's thermostats"""
-        user_properties = Property.objects.filter(user=self.request.user)
-        user_thermostats = Thermostat.objects.filter(property__in=user_properties)
-        return TemperatureLog.objects.filter(thermostat__in=user_thermostats)
+        return TemperatureLog.objects.filter(
+            thermostat__property__user=self.request.user
+        ).select_related('thermostat')
 
 
 class UserRegistrationView(APIView):
@@ -154,13 +153,13 @@ class UserProfileView(APIView):
     
     def get(self, request):
         user = request.user
-        profile, created = UserProfile.objects.get_or_create(user=user)
+        profile, created = UserProfile.objects.select_related('user').get_or_create(user=user)
         serializer = UserProfileSerializer(profile)
         return Response(serializer.data)
     
     def put(self, request):
         user = request.user
-        profile = get_object_or_404(UserProfile, user=user)
+        profile = get_object_or_404(UserProfile.objects.select_related('user'), user=user)
         serializer = UserProfileSerializer(profile, data=request.data, partial=True)
         
         if serializer.is_valid():
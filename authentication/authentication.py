@@ -0,0 +1,70 @@
+"""
+Stateless JWT authentication.
+
+`StatelessJWTAuthentication` builds ``request.user`` as a simplejwt
+``TokenUser`` from the token's claims (``user_id``, ``email``, ``is_staff``
+and ``is_superuser``, see `CustomTokenObtainPairSerializer`) instead of
+loading the user row on every request.  Views that need the full user load it
+themselves.
+
+Since the row is no longer checked, every token carries the user's
+``token_version`` as its ``ver`` claim.  Deactivating a user or changing
+their password or staff flags bumps the version (see
+`authentication.signals`), which rejects every access and refresh token
+issued before.  The current versions are cached in the default cache for
+``TOKEN_VERSION_CACHE_SECONDS``; that cache must be shared by all workers
+(see ``CACHES``) for a revocation to take effect everywhere at once.
+"""
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+
+
+def token_version_key(user_id):
+    return f'jwt-token-version:{user_id}'
+
+
+def token_version(user_id):
+    """Return the current token version of a user, or None if they no longer exist."""
+    key = token_version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = get_user_model().objects.filter(pk=user_id).values_list('token_version', flat=True).first()
+        if version is not None:
+            cache.set(key, version, settings.TOKEN_VERSION_CACHE_SECONDS)
+    return version
+
+
+def forget_token_version(user_id):
+    """Drop the cached token version of a user."""
+    key = token_version_key(user_id)
+    cache.delete(key)
+    # A request running alongside the transaction may cache the old version
+    # again before it commits.
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def revoke_tokens(user_id):
+    """Reject every token issued to a user so far."""
+    get_user_model().objects.filter(pk=user_id).update(token_version=F('token_version') + 1)
+    forget_token_version(user_id)
+
+
+def token_is_revoked(token):
+    current = token_version(token.get('user_id'))
+    return current is None or token.get('ver', 0) != current
+
+
+class StatelessJWTAuthentication(JWTStatelessUserAuthentication):
+    """JWT authentication backed by the token's claims rather than the database."""
+
+    def get_user(self, validated_token):
+        user = super().get_user(validated_token)
+        if token_is_revoked(validated_token):
+            raise AuthenticationFailed('Token has been revoked', code='token_revoked')
+        return user
@@ -9,6 +9,21 @@ class User(AbstractUser):
         choices=[('F', 'Fahrenheit'), ('C', 'Celsius')],
         default='F'
     )
+    # Carried by issued tokens as their `ver` claim; bumped to revoke them
+    # (see authentication.authentication)
+    token_version = models.PositiveIntegerField(default=0)
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the credentials the row was loaded with so that changing
+        # them revokes the user's tokens (see authentication.signals).
+        instance._original_credentials = instance.token_credentials()
+        return instance
+
+    def token_credentials(self):
+        """Fields whose change must invalidate issued tokens"""
+        return (self.password, self.is_active, self.is_staff, self.is_superuser)
     
     def __str__(self):
         return self.email
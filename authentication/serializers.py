@@ -1,7 +1,9 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from .authentication import token_is_revoked
 
 User = get_user_model()
 
@@ -47,4 +49,17 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         token['first_name'] = user.first_name
         token['last_name'] = user.last_name
         
+        # Flags read by stateless authentication instead of the user row
+        token['is_staff'] = user.is_staff
+        token['is_superuser'] = user.is_superuser
+        token['ver'] = user.token_version
+        
         return token
+
+class CustomTokenRefreshSerializer(TokenRefreshSerializer):
+    def validate(self, attrs):
+        # Access tokens are not checked against the user row, so a revoked
+        # refresh token must not be able to mint new ones.
+        if token_is_revoked(self.token_class(attrs['refresh'])):
+            raise InvalidToken('Token has been revoked')
+        return super().validate(attrs)
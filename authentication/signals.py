@@ -0,0 +1,30 @@
+"""
+Signal handlers for the authentication application.
+
+Tokens are authenticated without loading the user (see
+``authentication.authentication``), so changing a user's password, active
+flag or staff flags bumps their token version, revoking the tokens issued
+to them so far.
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import forget_token_version, revoke_tokens
+from .models import User
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    original = getattr(instance, '_original_credentials', None)
+    current = instance.token_credentials()
+    if original is not None and original != current:
+        revoke_tokens(instance.pk)
+        # Saving this instance again must not write back the old version
+        instance.token_version = User.objects.values_list('token_version', flat=True).get(pk=instance.pk)
+    instance._original_credentials = current
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    forget_token_version(instance.pk)
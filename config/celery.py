@@ -13,9 +13,28 @@ To run the beat scheduler (periodic tasks):
 
     celery -A config beat --loglevel=info
 
+Work is split across three queues so that slow bulk jobs never delay
+user-facing or time-critical work:
+
+- ``interactive``: user-initiated tasks and anything without an explicit
+  route.  Workers run with a prefetch multiplier of 1 so a waiting command is
+  picked up by the next free process.
+- ``scheduled``: pre-arrival/post-checkout actions and their dispatcher,
+  which must run close to their due time.
+- ``bulk``: calendar feed syncs and scans, polling and analytics, consumed
+  by a separate worker with a larger prefetch.
+
+Each queue is consumed by its own worker, e.g.:
+
+    celery -A config worker -Q interactive --concurrency=4 --prefetch-multiplier=1 -O fair
+    celery -A config worker -Q scheduled --concurrency=8 --prefetch-multiplier=1 -O fair
+    celery -A config worker -Q bulk --concurrency=2 --prefetch-multiplier=4
+
 """
 import os
 from celery import Celery
+from celery.schedules import crontab
+from kombu import Queue
 
 # Set the default Django settings module for the 'celery' program.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
@@ -28,6 +47,49 @@ app = Celery('smart_thermostat')
 # means all celery-related configuration keys should have a `CELERY_` prefix.
 app.config_from_object('django.conf:settings', namespace='CELERY')
 
+# Queue topology.  Routes are defined here rather than in the Django settings
+# so that every settings module shares the same layout.
+INTERACTIVE_QUEUE = 'interactive'
+SCHEDULED_QUEUE = 'scheduled'
+BULK_QUEUE = 'bulk'
+
+app.conf.task_queues = (
+    Queue(INTERACTIVE_QUEUE),
+    Queue(SCHEDULED_QUEUE),
+    Queue(BULK_QUEUE),
+)
+app.conf.task_default_queue = INTERACTIVE_QUEUE
+app.conf.task_routes = {
+    'thermostats.tasks.dispatch_due_actions': {'queue': SCHEDULED_QUEUE},
+    'thermostats.tasks.execute_scheduled_actions': {'queue': SCHEDULED_QUEUE},
+    'thermostats.tasks.pre_arrival_action': {'queue': SCHEDULED_QUEUE},
+    'thermostats.tasks.post_checkout_action': {'queue': SCHEDULED_QUEUE},
+    'thermostats.tasks.scan_calendar_events': {'queue': BULK_QUEUE},
+    'thermostats.tasks.sync_calendar_feeds': {'queue': BULK_QUEUE},
+}
+# Hand out one message per process at a time by default; only the bulk worker
+# raises this on its command line.
+app.conf.worker_prefetch_multiplier = 1
+
+# Periodic tasks: sync external calendar feeds, scan calendar events to record
+# pre-arrival and post-checkout actions, and dispatch the recorded actions
+# once they fall due.  Like the routes, the schedule lives here so that beat
+# runs the same tasks under every settings module.
+app.conf.beat_schedule = {
+    'scan-calendar-events-every-hour': {
+        'task': 'thermostats.tasks.scan_calendar_events',
+        'schedule': crontab(minute=0, hour='*'),
+    },
+    'sync-calendar-feeds-every-10-minutes': {
+        'task': 'thermostats.tasks.sync_calendar_feeds',
+        'schedule': crontab(minute='*/10'),
+    },
+    'dispatch-due-actions-every-minute': {
+        'task': 'thermostats.tasks.dispatch_due_actions',
+        'schedule': crontab(minute='*'),
+    },
+}
+
 # Load task modules from all registered Django apps.
 app.autodiscover_tasks()
 
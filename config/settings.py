@@ -46,6 +46,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so that its budgets cover every other middleware
+    'thermostats.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -130,6 +132,75 @@ DEFAULT_HEAT_TEMP = float(os.getenv('DEFAULT_HEAT_TEMP', '68'))   # occupied hea
 DEFAULT_ECO_COOL_TEMP = float(os.getenv('DEFAULT_ECO_COOL_TEMP', '78'))  # eco cooling
 DEFAULT_ECO_HEAT_TEMP = float(os.getenv('DEFAULT_ECO_HEAT_TEMP', '62'))  # eco heating
 
+# How long (in seconds) clients may cache property usage statistics.  The
+# period totals are precomputed and carry an ETag, so revalidation is cheap.
+USAGE_STATISTICS_CACHE_SECONDS = int(os.getenv('USAGE_STATISTICS_CACHE_SECONDS', '300'))
+
+# Due-queue dispatching of scheduled actions.  Every minute the dispatcher
+# claims up to SCHEDULED_ACTION_MAX_BATCHES batches of due actions and sends
+# each batch to the workers as one task.  Claims that were never dispatched
+# (e.g. the dispatcher crashed) are released after the claim timeout.
+# Dispatched actions hold a lease that the executing task renews on every
+# attempt; if it lapses for SCHEDULED_ACTION_DISPATCH_TIMEOUT_SECONDS (the
+# worker died or the message was lost) the action is dispatched again, up to
+# SCHEDULED_ACTION_MAX_DISPATCHES times in all.  The timeout must exceed
+# SCHEDULED_ACTION_RETRY_BACKOFF_MAX.
+SCHEDULED_ACTION_BATCH_SIZE = int(os.getenv('SCHEDULED_ACTION_BATCH_SIZE', '50'))
+SCHEDULED_ACTION_MAX_BATCHES = int(os.getenv('SCHEDULED_ACTION_MAX_BATCHES', '20'))
+SCHEDULED_ACTION_CLAIM_TIMEOUT_SECONDS = int(os.getenv('SCHEDULED_ACTION_CLAIM_TIMEOUT_SECONDS', '300'))
+SCHEDULED_ACTION_DISPATCH_TIMEOUT_SECONDS = int(os.getenv('SCHEDULED_ACTION_DISPATCH_TIMEOUT_SECONDS', '1800'))
+SCHEDULED_ACTION_MAX_DISPATCHES = int(os.getenv('SCHEDULED_ACTION_MAX_DISPATCHES', '3'))
+
+# Incremental calendar scanning.  Each scan reads events changed since the
+# previous run (re-reading CALENDAR_SCAN_OVERLAP_SECONDS to tolerate late
+# commits) plus events whose actions enter the lookahead horizon.  Events are
+# streamed from the database in chunks of CALENDAR_SCAN_CHUNK_SIZE.
+CALENDAR_SCAN_LOOKAHEAD_HOURS = int(os.getenv('CALENDAR_SCAN_LOOKAHEAD_HOURS', '48'))
+CALENDAR_SCAN_OVERLAP_SECONDS = int(os.getenv('CALENDAR_SCAN_OVERLAP_SECONDS', '300'))
+CALENDAR_SCAN_CHUNK_SIZE = int(os.getenv('CALENDAR_SCAN_CHUNK_SIZE', '500'))
+
+# Pre-arrival and post-checkout actions are applied to every thermostat of a
+# property concurrently.  This caps the number of threads used per action.
+THERMOSTAT_FANOUT_MAX_WORKERS = int(os.getenv('THERMOSTAT_FANOUT_MAX_WORKERS', '8'))
+
+# Batches of due actions are grouped by vendor account.  Each account shares
+# one HTTP session and gets at most this many concurrent requests.
+VENDOR_ACCOUNT_MAX_CONCURRENCY = int(os.getenv('VENDOR_ACCOUNT_MAX_CONCURRENCY', '4'))
+
+# Load levelling.  Actions fall due at a deterministic per-property point in
+# the SCHEDULED_ACTION_SPREAD_SECONDS before their planned time, so bookings
+# starting on the hour do not all fire at :00.  Vendor calls are additionally
+# paced to at most the given number of requests per second per worker
+# process (0 disables the limit), but never beyond an action's planned time.
+SCHEDULED_ACTION_SPREAD_SECONDS = int(os.getenv('SCHEDULED_ACTION_SPREAD_SECONDS', '900'))
+VENDOR_RATE_LIMITS = {
+    'nest': float(os.getenv('NEST_RATE_LIMIT', '5')),
+    'cielo': float(os.getenv('CIELO_RATE_LIMIT', '5')),
+    'pioneer': float(os.getenv('PIONEER_RATE_LIMIT', '5')),
+}
+
+# Retries of tasks that command thermostats.  Delays grow exponentially from
+# SCHEDULED_ACTION_RETRY_BACKOFF seconds (with jitter) up to the maximum;
+# tasks that still fail are recorded as dead letters for replay.
+SCHEDULED_ACTION_MAX_RETRIES = int(os.getenv('SCHEDULED_ACTION_MAX_RETRIES', '5'))
+SCHEDULED_ACTION_RETRY_BACKOFF = int(os.getenv('SCHEDULED_ACTION_RETRY_BACKOFF', '30'))
+SCHEDULED_ACTION_RETRY_BACKOFF_MAX = int(os.getenv('SCHEDULED_ACTION_RETRY_BACKOFF_MAX', '600'))
+
+# Fleet-wide iCal feed sync.  Each run syncs up to CALENDAR_SYNC_BATCH_SIZE
+# due feeds, downloading CALENDAR_SYNC_MAX_WORKERS at a time with at most
+# CALENDAR_SYNC_HOST_CONCURRENCY concurrent requests per host (overridable
+# per channel domain in CALENDAR_SYNC_HOST_LIMITS).  Events are synced for
+# the next CALENDAR_SYNC_WINDOW_DAYS.
+CALENDAR_SYNC_BATCH_SIZE = int(os.getenv('CALENDAR_SYNC_BATCH_SIZE', '500'))
+CALENDAR_SYNC_MAX_WORKERS = int(os.getenv('CALENDAR_SYNC_MAX_WORKERS', '16'))
+CALENDAR_SYNC_HOST_CONCURRENCY = int(os.getenv('CALENDAR_SYNC_HOST_CONCURRENCY', '4'))
+CALENDAR_SYNC_HOST_LIMITS = {
+    'airbnb.com': int(os.getenv('AIRBNB_SYNC_CONCURRENCY', '4')),
+    'vrbo.com': int(os.getenv('VRBO_SYNC_CONCURRENCY', '4')),
+}
+CALENDAR_SYNC_TIMEOUT_SECONDS = int(os.getenv('CALENDAR_SYNC_TIMEOUT_SECONDS', '30'))
+CALENDAR_SYNC_WINDOW_DAYS = int(os.getenv('CALENDAR_SYNC_WINDOW_DAYS', '365'))
+
 # ---------------------------------------------------------------------------
 # Celery configuration
 #
@@ -144,22 +215,14 @@ DEFAULT_ECO_HEAT_TEMP = float(os.getenv('DEFAULT_ECO_HEAT_TEMP', '62'))  # eco h
 #
 # Celery settings are namespaced by the `CELERY_` prefix, which allows us to
 # call `app.config_from_object('django.conf:settings', namespace='CELERY')`
-#
-# We also define a beat schedule that periodically scans calendar events and
-# schedules pre‑arrival and post‑checkout actions.
 CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'memory://')
 CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', 'rpc://')
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 
-from celery.schedules import crontab
-CELERY_BEAT_SCHEDULE = {
-    'scan-calendar-events-every-hour': {
-        'task': 'thermostats.tasks.scan_calendar_events',
-        'schedule': crontab(minute=0, hour='*'),
-    },
-}
+# The beat schedule is defined in config/celery.py so that every settings
+# module runs the same periodic tasks.
 
 # Static files (CSS, JavaScript, Images)
 STATIC_URL = 'static/'
@@ -168,14 +231,60 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Stateless JWT authentication builds request.user from the token's claims
+# instead of loading the user on every request (see
+# authentication.authentication).  Set JWT_STATELESS_AUTH=False to load the
+# user row instead.
+JWT_STATELESS_AUTH = os.getenv('JWT_STATELESS_AUTH', 'True') == 'True'
+
+# How long (in seconds) the ids of the properties each user owns are cached
+# for scoping querysets.  Entries are dropped when ownership changes.
+OWNED_PROPERTY_IDS_CACHE_SECONDS = int(os.getenv('OWNED_PROPERTY_IDS_CACHE_SECONDS', '300'))
+
+# How long (in seconds) each user's token version is cached.  Bumping a
+# version drops its entry.
+TOKEN_VERSION_CACHE_SECONDS = int(os.getenv('TOKEN_VERSION_CACHE_SECONDS', '300'))
+
+# Token versions and owned property ids are cached and dropped on change, so
+# every web worker must share the cache: set CACHE_URL (e.g. the Redis
+# instance used by Celery, redis://redis:6379/2) in production.  Without it
+# each process keeps its own in-memory cache, which is only safe with one
+# process.
+CACHE_URL = os.getenv('CACHE_URL', '')
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+
+# List endpoints are cursor paginated (see thermostats.pagination).  Pages
+# hold API_PAGE_SIZE rows by default; clients may request up to
+# API_MAX_PAGE_SIZE with ?page_size=.
+API_PAGE_SIZE = int(os.getenv('API_PAGE_SIZE', '100'))
+API_MAX_PAGE_SIZE = int(os.getenv('API_MAX_PAGE_SIZE', '1000'))
+
+# Per-request budgets checked by thermostats.middleware.RequestMetricsMiddleware
+# (0 disables a budget).  Requests over budget are logged as warnings, or
+# raise with REQUEST_BUDGET_MODE=raise so that test runs fail on N+1 queries.
+REQUEST_QUERY_BUDGET = int(os.getenv('REQUEST_QUERY_BUDGET', '50'))
+REQUEST_DB_TIME_BUDGET_MS = float(os.getenv('REQUEST_DB_TIME_BUDGET_MS', '500'))
+REQUEST_HTTP_CALL_BUDGET = int(os.getenv('REQUEST_HTTP_CALL_BUDGET', '10'))
+REQUEST_HTTP_TIME_BUDGET_MS = float(os.getenv('REQUEST_HTTP_TIME_BUDGET_MS', '5000'))
+REQUEST_BUDGET_MODE = os.getenv('REQUEST_BUDGET_MODE', 'log')
+
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'authentication.authentication.StatelessJWTAuthentication' if JWT_STATELESS_AUTH
+        else 'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    'DEFAULT_PAGINATION_CLASS': 'thermostats.pagination.CursorPagination',
+    'PAGE_SIZE': API_PAGE_SIZE,
 }
 
 # JWT settings
@@ -20,15 +20,17 @@ class PropertyViewSet(viewsets.ModelViewSet):
         for the currently authenticated user.
         """
         user = self.request.user
-        return Property.objects.filter(owner=user)
+        # The serializer nests each property's settings; join them in.
+        return Property.objects.filter(owner=user).select_related('settings')
     
     @action(detail=True, methods=['get', 'put', 'patch'])
     def settings(self, request, pk=None):
         """
         Retrieve or update property settings.
         """
-        property_instance = get_object_or_404(Property, pk=pk, owner=request.user)
-        settings_instance = get_object_or_404(PropertySettings, property=property_instance)
+        settings_instance = get_object_or_404(
+            PropertySettings.objects.select_related('property'), property_id=pk, property__owner=request.user
+        )
         
         if request.method == 'GET':
             serializer = PropertySettingsSerializer(settings_instance)
@@ -0,0 +1,137 @@
+"""Compare concurrent write throughput of the Flask app's database setups.
+
+Simulates gunicorn workers: each process builds its own engine (as a worker
+does after forking) and runs request-sized transactions (one INSERT into a
+thermostat log table plus a read of that thermostat's latest entries) for a
+fixed time.  Three setups are compared:
+
+- ``sqlite-default``: the previous configuration, a SQLite file with the
+  rollback journal and no busy timeout;
+- ``sqlite-wal``: SQLite as configured by `src.utils.database`;
+- ``postgres``: the pooled engine of ``DATABASE_URL``, if set.
+
+Usage:
+    python scripts/benchmark_database.py [--workers 4] [--threads 4] [--seconds 5]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import (  # noqa: E402
+    Column, DateTime, Integer, MetaData, String, Table, create_engine, event, func, select,
+)
+from sqlalchemy.exc import OperationalError  # noqa: E402
+
+from src.utils import database  # noqa: E402
+
+metadata = MetaData()
+benchmark_logs = Table(
+    'benchmark_logs', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('thermostat_id', Integer, nullable=False, index=True),
+    Column('message', String(255)),
+    Column('created_at', DateTime, server_default=func.now()),
+)
+
+
+def build_engine(setup, url):
+    if setup == 'sqlite-default':
+        engine = create_engine(url, connect_args={'timeout': 0})
+
+        # Runs after `database._configure_sqlite`, undoing it.
+        @event.listens_for(engine, 'connect')
+        def _restore_defaults(dbapi_connection, connection_record):
+            dbapi_connection.execute('PRAGMA journal_mode=DELETE')
+            dbapi_connection.execute('PRAGMA synchronous=FULL')
+            dbapi_connection.execute('PRAGMA busy_timeout=0')
+        return engine
+    return create_engine(url, **database.engine_options(url))
+
+
+def _request(engine, thermostat_id):
+    with engine.begin() as connection:
+        connection.execute(benchmark_logs.insert().values(thermostat_id=thermostat_id, message='setpoint changed'))
+    with engine.connect() as connection:
+        connection.execute(
+            select(benchmark_logs).where(benchmark_logs.c.thermostat_id == thermostat_id)
+            .order_by(benchmark_logs.c.id.desc()).limit(10)
+        ).all()
+
+
+def _worker(setup, url, threads, seconds, results):
+    import threading
+
+    engine = build_engine(setup, url)
+    counts = {'ok': 0, 'locked': 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def run(thermostat_id):
+        while time.monotonic() < deadline:
+            try:
+                _request(engine, thermostat_id)
+                outcome = 'ok'
+            except OperationalError:
+                outcome = 'locked'
+            with lock:
+                counts[outcome] += 1
+
+    pool = [threading.Thread(target=run, args=(os.getpid() * 100 + index,)) for index in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    engine.dispose()
+    results.put(counts)
+
+
+def benchmark(setup, url, workers, threads, seconds):
+    engine = build_engine(setup, url)
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    engine.dispose()
+
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=_worker, args=(setup, url, threads, seconds, results))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    totals = {'ok': 0, 'locked': 0}
+    for _ in processes:
+        for key, value in results.get().items():
+            totals[key] += value
+    for process in processes:
+        process.join()
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4, help='processes, like gunicorn workers')
+    parser.add_argument('--threads', type=int, default=4, help='concurrent requests per worker')
+    parser.add_argument('--seconds', type=float, default=5.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        setups = [
+            ('sqlite-default', f'sqlite:///{directory}/default.db'),
+            ('sqlite-wal', f'sqlite:///{directory}/wal.db'),
+        ]
+        if os.getenv('DATABASE_URL'):
+            setups.append(('postgres', database.database_url()))
+
+        print(f"{'setup':<16}{'requests/s':>12}{'failed/s':>12}")
+        for setup, url in setups:
+            totals = benchmark(setup, url, args.workers, args.threads, args.seconds)
+            print(f"{setup:<16}{totals['ok'] / args.seconds:>12.1f}{totals['locked'] / args.seconds:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
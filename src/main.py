@@ -12,6 +12,9 @@ from src.routes.thermostats import thermostats_bp
 from src.routes.calendars import calendars_bp
 from src.routes.schedules import schedules_bp
 from src.routes.admin import admin_bp
+from src.utils.access import clear_request_cache
+from src.utils.database import configure_database, upgrade_database
+from src.utils.request_metrics import discard_request_metrics, finish_request_metrics, start_request_metrics
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev_key_12345')
@@ -19,8 +22,8 @@ app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev_key_12345')
 # Enable CORS for frontend requests
 CORS(app, resources={r"/api/*": {"origins": "https://smartstatfront.onrender.com"}})
 
-# Switch to SQLite for deployment compatibility
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///thermostat_system.db'
+# SQLite in WAL mode by default, or the pooled database of DATABASE_URL
+configure_database(app)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 db.init_app(app)
@@ -33,6 +36,15 @@ app.register_blueprint(calendars_bp, url_prefix='/api/calendars')
 app.register_blueprint(schedules_bp, url_prefix='/api/schedules')
 app.register_blueprint(admin_bp, url_prefix='/api/admin')
 
+# Access checks memoize objects on `g`, which outlives the request when an
+# app context was already pushed (scripts, tests)
+app.teardown_request(clear_request_cache)
+
+# Count each request's SQL statements and vendor calls against its budgets
+app.before_request(start_request_metrics)
+app.after_request(finish_request_metrics)
+app.teardown_request(discard_request_metrics)
+
 @app.route('/')
 def index():
     return jsonify({
@@ -48,9 +60,9 @@ def health():
         'database': 'connected'
     })
 
-# Create database tables
+# Create or upgrade the database schema (see src/migrations)
 with app.app_context():
-    db.create_all()
+    upgrade_database(db.engine)
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,57 @@
+"""Alembic environment for the Flask app's models.
+
+The app passes its own connection in ``config.attributes['connection']``
+(see `src.utils.database.upgrade_database`).  From the command line, the
+database of the environment is used.
+"""
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import create_engine
+
+import src.models  # noqa: F401  (registers every model)
+from src.models.base import db
+from src.utils.database import INSTANCE_PATH, database_url, engine_options
+
+config = context.config
+if config.config_file_name is not None and config.attributes.get('connection') is None:
+    fileConfig(config.config_file_name)
+
+target_metadata = db.metadata
+
+
+def run_migrations_offline():
+    context.configure(
+        url=database_url(INSTANCE_PATH),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={'paramstyle': 'named'},
+        render_as_batch=True,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations(connection):
+    # Batch mode lets ALTER-style operations run on SQLite.
+    context.configure(connection=connection, target_metadata=target_metadata, render_as_batch=True)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    connection = config.attributes.get('connection')
+    if connection is not None:
+        run_migrations(connection)
+        return
+    url = database_url(INSTANCE_PATH)
+    engine = create_engine(url, **engine_options(url))
+    with engine.connect() as connection:
+        run_migrations(connection)
+    engine.dispose()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
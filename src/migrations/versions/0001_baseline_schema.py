@@ -0,0 +1,127 @@
+"""baseline schema
+
+The schema `db.create_all()` built from the original models.  Databases
+created that way are stamped with this revision on startup (see
+`src.utils.database.upgrade_database`).
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19 05:00:25.838452
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('users',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('email', sa.String(length=255), nullable=False),
+    sa.Column('password_hash', sa.String(length=255), nullable=False),
+    sa.Column('first_name', sa.String(length=100), nullable=False),
+    sa.Column('last_name', sa.String(length=100), nullable=False),
+    sa.Column('role', sa.Enum('ADMIN', 'MANAGER', 'MAINTENANCE', name='userrole'), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('email')
+    )
+    op.create_table('properties',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=255), nullable=False),
+    sa.Column('address', sa.String(length=255), nullable=False),
+    sa.Column('city', sa.String(length=100), nullable=False),
+    sa.Column('state', sa.String(length=100), nullable=False),
+    sa.Column('zip_code', sa.String(length=20), nullable=False),
+    sa.Column('country', sa.String(length=100), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('calendars',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=255), nullable=False),
+    sa.Column('source_type', sa.String(length=50), nullable=False),
+    sa.Column('source_url', sa.String(length=1024), nullable=False),
+    sa.Column('property_id', sa.Integer(), nullable=False),
+    sa.Column('last_synced', sa.DateTime(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['property_id'], ['properties.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('thermostats',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=255), nullable=False),
+    sa.Column('device_id', sa.String(length=255), nullable=False),
+    sa.Column('type', sa.Enum('CIELO', 'NEST', 'PIONEER', name='thermostattype'), nullable=False),
+    sa.Column('property_id', sa.Integer(), nullable=False),
+    sa.Column('api_key', sa.String(length=255), nullable=True),
+    sa.Column('ip_address', sa.String(length=50), nullable=True),
+    sa.Column('last_status', sa.String(length=50), nullable=True),
+    sa.Column('last_temperature', sa.Float(), nullable=True),
+    sa.Column('last_updated', sa.DateTime(), nullable=True),
+    sa.Column('is_online', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['property_id'], ['properties.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('bookings',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('calendar_id', sa.Integer(), nullable=False),
+    sa.Column('guest_name', sa.String(length=255), nullable=True),
+    sa.Column('check_in', sa.DateTime(), nullable=False),
+    sa.Column('check_out', sa.DateTime(), nullable=False),
+    sa.Column('booking_reference', sa.String(length=255), nullable=True),
+    sa.Column('source', sa.String(length=50), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['calendar_id'], ['calendars.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('schedules',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('thermostat_id', sa.Integer(), nullable=False),
+    sa.Column('schedule_type', sa.Enum('CHECK_IN', 'CHECK_OUT', 'VACANCY', 'MANUAL', name='scheduletype'), nullable=False),
+    sa.Column('hours_before_checkin', sa.Integer(), nullable=True),
+    sa.Column('hours_after_checkout', sa.Integer(), nullable=True),
+    sa.Column('target_temperature', sa.Float(), nullable=False),
+    sa.Column('is_cooling', sa.Boolean(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('start_time', sa.DateTime(), nullable=True),
+    sa.Column('end_time', sa.DateTime(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['thermostat_id'], ['thermostats.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('thermostat_logs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('thermostat_id', sa.Integer(), nullable=False),
+    sa.Column('log_type', sa.Enum('INFO', 'WARNING', 'ERROR', 'SUCCESS', name='logtype'), nullable=False),
+    sa.Column('message', sa.Text(), nullable=False),
+    sa.Column('details', sa.JSON(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['thermostat_id'], ['thermostats.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('thermostat_logs')
+    op.drop_table('schedules')
+    op.drop_table('bookings')
+    op.drop_table('thermostats')
+    op.drop_table('calendars')
+    op.drop_table('properties')
+    op.drop_table('users')
@@ -0,0 +1,62 @@
+"""token version, feed validators and recurrence cache
+
+Schema added after the baseline and before migrations existed:
+
+- ``users.token_version``, bumped to revoke a user's issued tokens;
+- the ``etag``/``last_modified``/``content_hash`` validators of the last
+  fetched feed of each calendar;
+- the ``recurrence_expansions`` cache of expanded recurring events.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 11:20:41.214873
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('token_version', sa.Integer(), server_default='0', nullable=False))
+
+    with op.batch_alter_table('calendars', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('etag', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('last_modified', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+
+    op.create_table('recurrence_expansions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('key', sa.String(length=64), nullable=False),
+    sa.Column('series', sa.JSON(), nullable=False),
+    sa.Column('series_index', sa.LargeBinary(), nullable=False),
+    sa.Column('starts', sa.LargeBinary(), nullable=False),
+    sa.Column('ends', sa.LargeBinary(), nullable=False),
+    sa.Column('last_used', sa.DateTime(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('key')
+    )
+    with op.batch_alter_table('recurrence_expansions', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_recurrence_expansions_last_used'), ['last_used'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('recurrence_expansions', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_recurrence_expansions_last_used'))
+
+    op.drop_table('recurrence_expansions')
+
+    with op.batch_alter_table('calendars', schema=None) as batch_op:
+        batch_op.drop_column('content_hash')
+        batch_op.drop_column('last_modified')
+        batch_op.drop_column('etag')
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('token_version')
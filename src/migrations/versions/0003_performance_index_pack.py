@@ -0,0 +1,39 @@
+"""performance index pack
+
+Indexes for the filters of the hot paths, which were all full table scans:
+
+- thermostat logs of a thermostat, newest first;
+- bookings of a calendar overlapping a window (timeline compilation,
+  /upcoming, feed sync) and matched by their external reference;
+- thermostats and calendars of a property;
+- active schedules of a thermostat.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 05:00:36.756393
+"""
+from alembic import op
+
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_thermostat_logs_thermostat_created', 'thermostat_logs', ['thermostat_id', 'created_at'])
+    op.create_index('ix_bookings_calendar_stay', 'bookings', ['calendar_id', 'check_in', 'check_out'])
+    op.create_index('ix_bookings_calendar_reference', 'bookings', ['calendar_id', 'booking_reference'])
+    op.create_index('ix_thermostats_property_id', 'thermostats', ['property_id'])
+    op.create_index('ix_schedules_thermostat_active', 'schedules', ['thermostat_id', 'is_active'])
+    op.create_index('ix_calendars_property_id', 'calendars', ['property_id'])
+
+
+def downgrade():
+    op.drop_index('ix_calendars_property_id', table_name='calendars')
+    op.drop_index('ix_schedules_thermostat_active', table_name='schedules')
+    op.drop_index('ix_thermostats_property_id', table_name='thermostats')
+    op.drop_index('ix_bookings_calendar_reference', table_name='bookings')
+    op.drop_index('ix_bookings_calendar_stay', table_name='bookings')
+    op.drop_index('ix_thermostat_logs_thermostat_created', table_name='thermostat_logs')
@@ -0,0 +1,28 @@
+"""calendar feed window
+
+``calendars.feed_window`` records the import window the stored feed
+validators and content hash were taken for, so that they are only trusted
+while the window is the same.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 12:05:13.482196
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('calendars', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('feed_window', sa.String(length=128), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('calendars', schema=None) as batch_op:
+        batch_op.drop_column('feed_window')
@@ -5,6 +5,7 @@ from src.models.calendar import Calendar
 from src.models.booking import Booking
 from src.models.schedule import Schedule, ScheduleType
 from src.models.thermostat_log import ThermostatLog, LogType
+from src.models.recurrence_expansion import RecurrenceExpansion
 
 # Import all models here for easy access
 __all__ = [
@@ -17,5 +18,6 @@ __all__ = [
     'Schedule', 
     'ScheduleType',
     'ThermostatLog', 
-    'LogType'
+    'LogType',
+    'RecurrenceExpansion'
 ]
@@ -5,6 +5,12 @@ from datetime import datetime
 class Booking(db.Model, BaseModel):
     """Booking model for storing guest booking information"""
     __tablename__ = 'bookings'
+    __table_args__ = (
+        # Stays of a calendar overlapping a window
+        db.Index('ix_bookings_calendar_stay', 'calendar_id', 'check_in', 'check_out'),
+        # Feed entries matched by their external reference
+        db.Index('ix_bookings_calendar_reference', 'calendar_id', 'booking_reference'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     calendar_id = db.Column(db.Integer, db.ForeignKey('calendars.id'), nullable=False)
@@ -9,9 +9,17 @@ class Calendar(db.Model, BaseModel):
     name = db.Column(db.String(255), nullable=False)
     source_type = db.Column(db.String(50), nullable=False)  # 'google', 'ical', etc.
     source_url = db.Column(db.String(1024), nullable=False)  # URL or identifier for the calendar
-    property_id = db.Column(db.Integer, db.ForeignKey('properties.id'), nullable=False)
+    property_id = db.Column(db.Integer, db.ForeignKey('properties.id'), nullable=False, index=True)
     last_synced = db.Column(db.DateTime, nullable=True)
     
+    # Validators and body hash of the last fetched feed, used to skip
+    # downloading and parsing feeds that have not changed, and the import
+    # window they were taken for
+    etag = db.Column(db.String(255), nullable=True)
+    last_modified = db.Column(db.String(64), nullable=True)
+    content_hash = db.Column(db.String(64), nullable=True)  # SHA-256 hex digest
+    feed_window = db.Column(db.String(128), nullable=True)
+    
     # Relationships
     property = db.relationship('Property', back_populates='calendars')
     bookings = db.relationship('Booking', back_populates='calendar', lazy='dynamic')
@@ -0,0 +1,18 @@
+from src.models.base import db, BaseModel
+from datetime import datetime
+
+class RecurrenceExpansion(db.Model, BaseModel):
+    """Cached occurrences of the recurring events of an iCal feed"""
+    __tablename__ = 'recurrence_expansions'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    # SHA-256 of the recurring components and the expanded window
+    key = db.Column(db.String(64), nullable=False, unique=True)
+    # Distinct (uid, summary) pairs of the expanded series
+    series = db.Column(db.JSON, nullable=False)
+    # Packed arrays, one entry per occurrence: index into `series`, and start
+    # and end as UTC epoch seconds
+    series_index = db.Column(db.LargeBinary, nullable=False)
+    starts = db.Column(db.LargeBinary, nullable=False)
+    ends = db.Column(db.LargeBinary, nullable=False)
+    last_used = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
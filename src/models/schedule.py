@@ -11,6 +11,10 @@ class ScheduleType(enum.Enum):
 class Schedule(db.Model, BaseModel):
     """Schedule model for storing automation schedules"""
     __tablename__ = 'schedules'
+    __table_args__ = (
+        # Active schedules of a thermostat (timeline compilation)
+        db.Index('ix_schedules_thermostat_active', 'thermostat_id', 'is_active'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     thermostat_id = db.Column(db.Integer, db.ForeignKey('thermostats.id'), nullable=False)
@@ -15,7 +15,7 @@ class Thermostat(db.Model, BaseModel):
     name = db.Column(db.String(255), nullable=False)
     device_id = db.Column(db.String(255), nullable=False)
     type = db.Column(db.Enum(ThermostatType), nullable=False)
-    property_id = db.Column(db.Integer, db.ForeignKey('properties.id'), nullable=False)
+    property_id = db.Column(db.Integer, db.ForeignKey('properties.id'), nullable=False, index=True)
     
     # Device-specific fields
     api_key = db.Column(db.String(255), nullable=True)  # For API authentication
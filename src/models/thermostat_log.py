@@ -11,6 +11,10 @@ class LogType(enum.Enum):
 class ThermostatLog(db.Model, BaseModel):
     """Log model for storing thermostat activity logs"""
     __tablename__ = 'thermostat_logs'
+    __table_args__ = (
+        # Latest logs of a thermostat
+        db.Index('ix_thermostat_logs_thermostat_created', 'thermostat_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     thermostat_id = db.Column(db.Integer, db.ForeignKey('thermostats.id'), nullable=False)
@@ -1,3 +1,4 @@
+from sqlalchemy import event, inspect
 from src.models.base import db, BaseModel
 from werkzeug.security import generate_password_hash, check_password_hash
 import enum
@@ -7,6 +8,9 @@ class UserRole(enum.Enum):
     MANAGER = "manager"
     MAINTENANCE = "maintenance"
 
+# Changing any of these revokes the user's existing tokens
+REVOKING_FIELDS = ('password_hash', 'role', 'is_active')
+
 class User(db.Model, BaseModel):
     """User model for authentication and access control"""
     __tablename__ = 'users'
@@ -18,6 +22,8 @@ class User(db.Model, BaseModel):
     last_name = db.Column(db.String(100), nullable=False)
     role = db.Column(db.Enum(UserRole), default=UserRole.MANAGER)
     is_active = db.Column(db.Boolean, default=True)
+    # Bumped whenever issued tokens must stop working (see `REVOKING_FIELDS`)
+    token_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     # Relationships
     properties = db.relationship('Property', back_populates='user', lazy='dynamic')
@@ -42,3 +48,10 @@ class User(db.Model, BaseModel):
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat()
         }
+
+@event.listens_for(User, 'before_update')
+def revoke_tokens_on_credential_change(mapper, connection, target):
+    """Bump the token version when the password, role or active flag changes"""
+    state = inspect(target)
+    if any(state.attrs[field].history.has_changes() for field in REVOKING_FIELDS):
+        target.token_version = (target.token_version or 0) + 1
@@ -6,6 +6,7 @@ import os
 
 from src.models.user import User, UserRole
 from src.models.base import db
+from src.utils import user_cache
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -14,7 +15,24 @@ JWT_SECRET = os.getenv('JWT_SECRET', 'dev_jwt_secret_change_in_production')
 JWT_ALGORITHM = 'HS256'
 JWT_EXPIRATION_HOURS = 24
 
+def generate_token(user):
+    """Issue a token for a user, returning it with its expiry time"""
+    expires_at = datetime.utcnow() + timedelta(hours=JWT_EXPIRATION_HOURS)
+    token_payload = {
+        'user_id': user.id,
+        'email': user.email,
+        'role': user.role.value,
+        'active': user.is_active,
+        'ver': user.token_version or 0,
+        'exp': expires_at
+    }
+    return jwt.encode(token_payload, JWT_SECRET, algorithm=JWT_ALGORITHM), expires_at
+
 # Authentication decorator
+#
+# The decorated view receives a `user_cache.UserSnapshot` (id, email, role,
+# is_active and token_version) rather than a `User` row; views that need the
+# full row load it themselves.
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
@@ -32,10 +50,14 @@ def token_required(f):
         try:
             # Decode token
             payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-            current_user = User.query.get(payload['user_id'])
+            current_user = user_cache.get_user(payload)
             
             if not current_user:
                 return jsonify({'error': 'User not found'}), 401
+            
+            # Tokens issued before the last password, role or status change
+            if payload.get('ver', 0) != current_user.token_version:
+                return jsonify({'error': 'Token has been revoked'}), 401
                 
             if not current_user.is_active:
                 return jsonify({'error': 'User account is inactive'}), 401
@@ -113,44 +135,47 @@ def login():
         return jsonify({'error': 'User account is inactive'}), 401
     
     # Generate JWT token
-    token_payload = {
-        'user_id': user.id,
-        'email': user.email,
-        'role': user.role.value,
-        'exp': datetime.utcnow() + timedelta(hours=JWT_EXPIRATION_HOURS)
-    }
-    token = jwt.encode(token_payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+    token, expires_at = generate_token(user)
     
     return jsonify({
         'token': token,
         'user': user.to_dict(),
-        'expires_at': (datetime.utcnow() + timedelta(hours=JWT_EXPIRATION_HOURS)).isoformat()
+        'expires_at': expires_at.isoformat()
     }), 200
 
 @auth_bp.route('/profile', methods=['GET'])
 @token_required
 def get_profile(current_user):
-    return jsonify({'user': current_user.to_dict()}), 200
+    user = User.query.get_or_404(current_user.id)
+    return jsonify({'user': user.to_dict()}), 200
 
 @auth_bp.route('/profile', methods=['PUT'])
 @token_required
 def update_profile(current_user):
+    user = User.query.get_or_404(current_user.id)
     data = request.get_json()
     
     # Update user fields
     if 'first_name' in data:
-        current_user.first_name = data['first_name']
+        user.first_name = data['first_name']
     if 'last_name' in data:
-        current_user.last_name = data['last_name']
+        user.last_name = data['last_name']
     if 'password' in data:
-        current_user.set_password(data['password'])
+        user.set_password(data['password'])
     
     db.session.commit()
     
-    return jsonify({
+    response = {
         'message': 'Profile updated successfully',
-        'user': current_user.to_dict()
-    }), 200
+        'user': user.to_dict()
+    }
+    # A password change revokes the current token, so hand out a new one
+    if 'password' in data:
+        token, expires_at = generate_token(user)
+        response['token'] = token
+        response['expires_at'] = expires_at.isoformat()
+    
+    return jsonify(response), 200
 
 @auth_bp.route('/users', methods=['GET'])
 @token_required
@@ -196,6 +221,16 @@ def update_user(current_user, user_id):
         'user': user.to_dict()
     }), 200
 
+@auth_bp.route('/users/<int:user_id>/revoke-tokens', methods=['POST'])
+@token_required
+@role_required([UserRole.ADMIN])
+def revoke_user_tokens(current_user, user_id):
+    user = User.query.get_or_404(user_id)
+    user.token_version = (user.token_version or 0) + 1
+    db.session.commit()
+    
+    return jsonify({'message': 'User tokens revoked successfully'}), 200
+
 @auth_bp.route('/users/<int:user_id>', methods=['DELETE'])
 @token_required
 @role_required([UserRole.ADMIN])
@@ -5,14 +5,39 @@ from src.models.booking import Booking
 from src.models.property import Property
 from src.models.user import UserRole
 from src.models.base import db
+from src.utils.access import check_property_access_or_abort, get_accessible_or_abort
+from src.utils.booking_sync import apply_booking_feed, import_window
+from src.utils.http import build_session
+from src.utils.ical_stream import iter_events
+from src.utils.recurrence_cache import expand_recurring_cached
 from datetime import datetime
-import requests
-import icalendar
-import recurring_ical_events
+from urllib.parse import urlparse
+import hashlib
+import io
 from dateutil import rrule, parser
 
 calendars_bp = Blueprint('calendars', __name__)
 
+# iCal feeds are fetched through one pooled session per process, so hourly
+# syncs reuse connections to the same few calendar hosts.
+ICAL_FETCH_TIMEOUT = 30
+_feed_session = None
+
+# Host fragments of known booking channels
+FEED_SOURCES = {
+    'airbnb': 'airbnb',
+    'vrbo': 'vrbo',
+    'homeaway': 'vrbo',
+    'booking.com': 'booking',
+}
+
+def get_feed_session():
+    """Return the shared HTTP session for iCal feeds"""
+    global _feed_session
+    if _feed_session is None:
+        _feed_session = build_session()
+    return _feed_session
+
 # Calendar API adapters
 class CalendarAPIFactory:
     @staticmethod
@@ -66,55 +91,73 @@ class GoogleCalendarAPI(BaseCalendarAPI):
 class ICalAPI(BaseCalendarAPI):
     """API adapter for iCal calendars"""
     def sync(self, start_date=None, end_date=None):
-        """Sync bookings from iCal feed"""
-        try:
-            # In a real implementation, this would fetch and parse the iCal feed
-            # For now, we'll simulate the process
-            
-            # Simulate fetching iCal data
-            # response = requests.get(self.calendar.source_url)
-            # ical_data = response.text
-            
-            # Parse iCal data
-            # cal = icalendar.Calendar.from_ical(ical_data)
-            
-            # Get events in date range
-            # if not start_date:
-            #     start_date = datetime.utcnow()
-            # if not end_date:
-            #     end_date = datetime.utcnow().replace(year=datetime.utcnow().year + 1)
-            
-            # events = recurring_ical_events.of(cal).between(start_date, end_date)
-            
-            # Update last synced timestamp
-            self.calendar.last_synced = datetime.utcnow()
-            db.session.commit()
-            
-            # Return simulated bookings
-            return [
-                {
-                    "guest_name": "iCal Guest",
-                    "check_in": datetime.utcnow().replace(day=datetime.utcnow().day + 10, hour=15, minute=0, second=0, microsecond=0),
-                    "check_out": datetime.utcnow().replace(day=datetime.utcnow().day + 15, hour=11, minute=0, second=0, microsecond=0),
-                    "booking_reference": "ICAL123",
-                    "source": "airbnb"
-                }
-            ]
-        except Exception as e:
-            # Log error and return empty list
-            print(f"Error syncing iCal calendar: {str(e)}")
-            return []
+        """
+        Fetch the iCal feed and return its bookings, or None if it is unchanged.
+
+        The request carries the ETag and Last-Modified validators of the
+        previous fetch, and a 200 whose body hashes to the stored digest is
+        treated like a 304, so unchanged feeds are never parsed.  Both only
+        apply while the import window is the one the previous fetch was
+        parsed for; a moved or different window is always fetched and parsed
+        in full.  The new validators are set on the calendar but committed by
+        the caller together with the bookings, so a failed sync is retried in
+        full.
+        """
+        start_date, end_date = import_window(start_date, end_date)
+        window = f'{start_date.isoformat()}/{end_date.isoformat()}'
+        same_window = window == self.calendar.feed_window
+        
+        headers = {}
+        if same_window and self.calendar.etag:
+            headers['If-None-Match'] = self.calendar.etag
+        if same_window and self.calendar.last_modified:
+            headers['If-Modified-Since'] = self.calendar.last_modified
+        
+        response = get_feed_session().get(self.calendar.source_url, headers=headers, timeout=ICAL_FETCH_TIMEOUT)
+        self.calendar.last_synced = datetime.utcnow()
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+        
+        self.calendar.etag = response.headers.get('ETag')
+        self.calendar.last_modified = response.headers.get('Last-Modified')
+        content_hash = hashlib.sha256(response.content).hexdigest()
+        if same_window and content_hash == self.calendar.content_hash:
+            return None
+        self.calendar.content_hash = content_hash
+        self.calendar.feed_window = window
+        
+        return parse_ical_bookings(response.content, start_date, end_date, feed_source(self.calendar.source_url))
+
+def feed_source(url):
+    """Guess the booking channel of an iCal feed from its host"""
+    host = urlparse(url).netloc.lower()
+    for marker, source in FEED_SOURCES.items():
+        if marker in host:
+            return source
+    return None
+
+def parse_ical_bookings(data, start_date=None, end_date=None, source=None):
+    """Parse the events of an iCal feed between two dates into booking dicts"""
+    start_date, end_date = import_window(start_date, end_date)
+    
+    return [
+        {
+            'guest_name': event.summary,
+            'check_in': event.start,
+            'check_out': event.end,
+            'booking_reference': event.uid,
+            'source': source,
+        }
+        for event in iter_events(io.BytesIO(data), start_date, end_date, expand=expand_recurring_cached)
+    ]
 
 # API Routes
 @calendars_bp.route('/property/<int:property_id>', methods=['GET'])
 @token_required
 def get_property_calendars(current_user, property_id):
     """Get all calendars for a specific property"""
-    property = Property.query.get_or_404(property_id)
-    
-    # Check if user has access to this property
-    if current_user.role != UserRole.ADMIN and property.user_id != current_user.id:
-        return jsonify({'error': 'Access denied'}), 403
+    check_property_access_or_abort(current_user, property_id)
     
     calendars = Calendar.query.filter_by(property_id=property_id).all()
     
@@ -126,12 +169,7 @@ def get_property_calendars(current_user, property_id):
 @token_required
 def get_calendar(current_user, calendar_id):
     """Get a specific calendar"""
-    calendar = Calendar.query.get_or_404(calendar_id)
-    
-    # Check if user has access to this calendar's property
-    property = Property.query.get(calendar.property_id)
-    if current_user.role != UserRole.ADMIN and property.user_id != current_user.id:
-        return jsonify({'error': 'Access denied'}), 403
+    calendar = get_accessible_or_abort(current_user, Calendar, calendar_id)
     
     return jsonify({
         'calendar': calendar.to_dict()
@@ -150,12 +188,7 @@ def create_calendar(current_user):
             return jsonify({'error': f'Missing required field: {field}'}), 400
     
     # Check if property exists and user has access
-    property = Property.query.get(data['property_id'])
-    if not property:
-        return jsonify({'error': 'Property not found'}), 404
-    
-    if current_user.role != UserRole.ADMIN and property.user_id != current_user.id:
-        return jsonify({'error': 'Access denied'}), 403
+    check_property_access_or_abort(current_user, data['property_id'])
     
     # Validate source type
     valid_source_types = ['google', 'ical']
@@ -182,12 +215,7 @@ def create_calendar(current_user):
 @token_required
 def update_calendar(current_user, calendar_id):
     """Update a calendar"""
-    calendar = Calendar.query.get_or_404(calendar_id)
-    
-    # Check if user has access to this calendar's property
-    property = Property.query.get(calendar.property_id)
-    if current_user.role != UserRole.ADMIN and property.user_id != current_user.id:
-        return jsonify({'error': 'Access denied'}), 403
+    calendar = get_accessible_or_abort(current_user, Calendar, calendar_id)
     
     data = request.get_json()
     
@@ -222,12 +250,7 @@ def update_calendar(current_user, calendar_id):
 @token_required
 def delete_calendar(current_user, calendar_id):
     """Delete a calendar"""
-    calendar = Calendar.query.get_or_404(calendar_id)
-    
-    # Check if user has access to this calendar's property
-    property = Property.query.get(calendar.property_id)
-    if current_user.role != UserRole.ADMIN and property.user_id != current_user.id:
-        return jsonify({'error': 'Access denied'}), 403
+    calendar = get_accessible_or_abort(current_user, Calendar, calendar_id)
     
     # Delete associated bookings first
     Booking.query.filter_by(calendar_id=calendar_id).delete()
@@ -244,68 +267,38 @@ def delete_calendar(current_user, calendar_id):
 @token_required
 def sync_calendar(current_user, calendar_id):
     """Sync bookings from a calendar source"""
-    calendar = Calendar.query.get_or_404(calendar_id)
-    
-    # Check if user has access to this calendar's property
-    property = Property.query.get(calendar.property_id)
-    if current_user.role != UserRole.ADMIN and property.user_id != current_user.id:
-        return jsonify({'error': 'Access denied'}), 403
+    calendar = get_accessible_or_abort(current_user, Calendar, calendar_id)
     
     try:
         # Get date range from request (optional)
         data = request.get_json() or {}
         start_date = parser.parse(data['start_date']) if 'start_date' in data else None
         end_date = parser.parse(data['end_date']) if 'end_date' in data else None
+        start_date, end_date = import_window(start_date, end_date)
         
         # Get the appropriate API adapter
         api = CalendarAPIFactory.get_api(calendar)
         
         # Sync bookings from the calendar source
         bookings_data = api.sync(start_date, end_date)
+        if bookings_data is None:
+            # The feed has not changed since the last sync
+            db.session.commit()
+            return jsonify({
+                'message': 'Calendar synced successfully. Feed unchanged since last sync.',
+                'changes': {'created': 0, 'updated': 0, 'deleted': 0},
+                'calendar': calendar.to_dict()
+            }), 200
         
-        # Process bookings
-        new_bookings = []
-        for booking_data in bookings_data:
-            # Check if booking already exists (by reference or date range)
-            existing_booking = None
-            if 'booking_reference' in booking_data and booking_data['booking_reference']:
-                existing_booking = Booking.query.filter_by(
-                    calendar_id=calendar.id,
-                    booking_reference=booking_data['booking_reference']
-                ).first()
-            
-            if not existing_booking:
-                # Check for overlapping bookings by date
-                existing_booking = Booking.query.filter_by(calendar_id=calendar.id).filter(
-                    Booking.check_in <= booking_data['check_out'],
-                    Booking.check_out >= booking_data['check_in']
-                ).first()
-            
-            if existing_booking:
-                # Update existing booking
-                existing_booking.guest_name = booking_data.get('guest_name', existing_booking.guest_name)
-                existing_booking.check_in = booking_data['check_in']
-                existing_booking.check_out = booking_data['check_out']
-                existing_booking.booking_reference = booking_data.get('booking_reference', existing_booking.booking_reference)
-                existing_booking.source = booking_data.get('source', existing_booking.source)
-            else:
-                # Create new booking
-                new_booking = Booking(
-                    calendar_id=calendar.id,
-                    guest_name=booking_data.get('guest_name'),
-                    check_in=booking_data['check_in'],
-                    check_out=booking_data['check_out'],
-                    booking_reference=booking_data.get('booking_reference'),
-                    source=booking_data.get('source')
-                )
-                db.session.add(new_booking)
-                new_bookings.append(new_booking)
+        # Diff the feed against the calendar's bookings and apply it in bulk
+        changes = apply_booking_feed(calendar, bookings_data, start_date, end_date)
         
         # Commit changes
         db.session.commit()
         
         return jsonify({
-            'message': f'Calendar synced successfully. {len(new_bookings)} new bookings created.',
+            'message': f'Calendar synced successfully. {changes["created"]} new bookings created.',
+            'changes': changes,
             'calendar': calendar.to_dict()
         }), 200
     
@@ -319,12 +312,7 @@ def sync_calendar(current_user, calendar_id):
 @token_required
 def get_calendar_bookings(current_user, calendar_id):
     """Get all bookings for a specific calendar"""
-    calendar = Calendar.query.get_or_404(calendar_id)
-    
-    # Check if user has access to this calendar's property
-    property = Property.query.get(calendar.property_id)
-    if current_user.role != UserRole.ADMIN and property.user_id != current_user.id:
-        return jsonify({'error': 'Access denied'}), 403
+    calendar = get_accessible_or_abort(current_user, Calendar, calendar_id)
     
     # Get query parameters for filtering
     start_date = request.args.get('start_date')
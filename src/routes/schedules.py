@@ -5,20 +5,38 @@ from src.models.thermostat import Thermostat
 from src.models.property import Property
 from src.models.user import UserRole
 from src.models.base import db
-from datetime import datetime, timedelta
+from src.utils.access import get_accessible_or_abort
+from src.models.booking import Booking
+from src.models.calendar import Calendar
+from src.utils.schedule_compiler import bookings_from, compile_timeline, get_timeline
+from sqlalchemy.orm import contains_eager
+from datetime import datetime, timedelta, timezone
 
 schedules_bp = Blueprint('schedules', __name__)
 
+# Default window and page sizes of /upcoming
+UPCOMING_WINDOW_DAYS = 7
+UPCOMING_DEFAULT_LIMIT = 50
+UPCOMING_MAX_LIMIT = 200
+
+def parse_utc(value):
+    """Parse an ISO datetime into the naive UTC the database stores
+
+    Aware values (``...Z``, ``+02:00``) are converted to UTC; naive ones are
+    taken to be UTC already.
+    """
+    if value.endswith(('Z', 'z')):
+        value = value[:-1] + '+00:00'
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
 @schedules_bp.route('/thermostat/<int:thermostat_id>', methods=['GET'])
 @token_required
 def get_thermostat_schedules(current_user, thermostat_id):
     """Get all schedules for a specific thermostat"""
-    thermostat = Thermostat.query.get_or_404(thermostat_id)
-    
-    # Check if user has access to this thermostat's property
-    property = Property.query.get(thermostat.property_id)
-    if current_user.role != UserRole.ADMIN and property.user_id != current_user.id:
-        return jsonify({'error': 'Access denied'}), 403
+    thermostat = get_accessible_or_abort(current_user, Thermostat, thermostat_id)
     
     schedules = Schedule.query.filter_by(thermostat_id=thermostat_id).all()
     
@@ -30,13 +48,7 @@ def get_thermostat_schedules(current_user, thermostat_id):
 @token_required
 def get_schedule(current_user, schedule_id):
     """Get a specific schedule"""
-    schedule = Schedule.query.get_or_404(schedule_id)
-    
-    # Check if user has access to this schedule's thermostat
-    thermostat = Thermostat.query.get(schedule.thermostat_id)
-    property = Property.query.get(thermostat.property_id)
-    if current_user.role != UserRole.ADMIN and property.user_id != current_user.id:
-        return jsonify({'error': 'Access denied'}), 403
+    schedule = get_accessible_or_abort(current_user, Schedule, schedule_id)
     
     return jsonify({
         'schedule': schedule.to_dict()
@@ -55,13 +67,7 @@ def create_schedule(current_user):
             return jsonify({'error': f'Missing required field: {field}'}), 400
     
     # Check if thermostat exists and user has access
-    thermostat = Thermostat.query.get(data['thermostat_id'])
-    if not thermostat:
-        return jsonify({'error': 'Thermostat not found'}), 404
-    
-    property = Property.query.get(thermostat.property_id)
-    if current_user.role != UserRole.ADMIN and property.user_id != current_user.id:
-        return jsonify({'error': 'Access denied'}), 403
+    thermostat = get_accessible_or_abort(current_user, Thermostat, data['thermostat_id'])
     
     # Validate schedule type
     try:
@@ -116,13 +122,7 @@ def create_schedule(current_user):
 @token_required
 def update_schedule(current_user, schedule_id):
     """Update a schedule"""
-    schedule = Schedule.query.get_or_404(schedule_id)
-    
-    # Check if user has access to this schedule's thermostat
-    thermostat = Thermostat.query.get(schedule.thermostat_id)
-    property = Property.query.get(thermostat.property_id)
-    if current_user.role != UserRole.ADMIN and property.user_id != current_user.id:
-        return jsonify({'error': 'Access denied'}), 403
+    schedule = get_accessible_or_abort(current_user, Schedule, schedule_id)
     
     data = request.get_json()
     
@@ -160,13 +160,7 @@ def update_schedule(current_user, schedule_id):
 @token_required
 def delete_schedule(current_user, schedule_id):
     """Delete a schedule"""
-    schedule = Schedule.query.get_or_404(schedule_id)
-    
-    # Check if user has access to this schedule's thermostat
-    thermostat = Thermostat.query.get(schedule.thermostat_id)
-    property = Property.query.get(thermostat.property_id)
-    if current_user.role != UserRole.ADMIN and property.user_id != current_user.id:
-        return jsonify({'error': 'Access denied'}), 403
+    schedule = get_accessible_or_abort(current_user, Schedule, schedule_id)
     
     db.session.delete(schedule)
     db.session.commit()
@@ -178,50 +172,121 @@ def delete_schedule(current_user, schedule_id):
 @schedules_bp.route('/upcoming', methods=['GET'])
 @token_required
 def get_upcoming_schedules(current_user):
-    """Get upcoming schedule triggers for the user's thermostats"""
-    # Get all properties for the user
-    if current_user.role == UserRole.ADMIN:
-        properties = Property.query.all()
-    else:
-        properties = Property.query.filter_by(user_id=current_user.id).all()
-    
-    property_ids = [p.id for p in properties]
-    
-    # Get all thermostats for these properties
-    thermostats = Thermostat.query.filter(Thermostat.property_id.in_(property_ids)).all()
-    thermostat_ids = [t.id for t in thermostats]
-    
-    # Get all active schedules for these thermostats
-    schedules = Schedule.query.filter(
-        Schedule.thermostat_id.in_(thermostat_ids),
-        Schedule.is_active == True
-    ).all()
-    
-    # For manual schedules, filter to only include upcoming ones
+    """Get upcoming schedule triggers for the user's thermostats
+    
+    Query parameters:
+        from, to: ISO datetimes bounding the window (default: now to 7 days
+            ahead); aware values are converted to UTC
+        limit, offset: pagination over the triggers, ordered by time; limit
+            must be at least 1 (at most 200 are returned) and offset at least 0
+    
+    Schedules, thermostats and properties are loaded in one joined query and
+    the bookings of all those properties in a second one; trigger times are
+    then resolved in memory with the schedule compiler.
+    """
     now = datetime.utcnow()
+    try:
+        window_start = parse_utc(request.args['from']) if 'from' in request.args else now
+        window_end = parse_utc(request.args['to']) if 'to' in request.args else window_start + timedelta(days=UPCOMING_WINDOW_DAYS)
+        limit = min(int(request.args.get('limit', UPCOMING_DEFAULT_LIMIT)), UPCOMING_MAX_LIMIT)
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        return jsonify({'error': 'from/to must be ISO datetimes and limit/offset integers'}), 400
+    if limit < 1 or offset < 0:
+        return jsonify({'error': 'limit must be at least 1 and offset at least 0'}), 400
+    
+    # Active schedules with their thermostat and property in a single query
+    query = Schedule.query.join(Schedule.thermostat).join(Thermostat.property).options(
+        contains_eager(Schedule.thermostat).contains_eager(Thermostat.property)
+    ).filter(Schedule.is_active == True)
+    if current_user.role != UserRole.ADMIN:
+        query = query.filter(Property.user_id == current_user.id)
+    schedules = query.order_by(Schedule.id).all()
+    
+    # Bookings of every involved property whose schedules overlap the window:
+    # those not yet over (allowing for the check-out delay) and the last one
+    # before them, whose check-out schedule may still be in effect
+    property_ids = {schedule.thermostat.property_id for schedule in schedules}
+    max_after = max((s.hours_after_checkout or 0 for s in schedules), default=0)
+    bookings_by_property = {}
+    if property_ids:
+        rows = db.session.query(Booking, Calendar.property_id).join(Calendar).filter(
+            Calendar.property_id.in_(property_ids),
+            bookings_from(window_start - timedelta(hours=max_after))
+        ).order_by(Booking.check_in).all()
+        for booking, property_id in rows:
+            bookings_by_property.setdefault(property_id, []).append(booking)
+    
+    schedules_by_thermostat = {}
+    for schedule in schedules:
+        schedules_by_thermostat.setdefault(schedule.thermostat_id, []).append(schedule)
+    
+    triggers = []
+    for thermostat_schedules in schedules_by_thermostat.values():
+        thermostat = thermostat_schedules[0].thermostat
+        timeline = compile_timeline(thermostat_schedules, bookings_by_property.get(thermostat.property_id, []), window_start)
+        by_id = {schedule.id: schedule for schedule in thermostat_schedules}
+        for segment in timeline.segments_between(window_start, window_end):
+            triggers.append((segment, by_id[segment['schedule_id']]))
+    triggers.sort(key=lambda item: (item[0]['start'], item[1].id))
+    
+    # Serialize each thermostat and property once
+    thermostat_dicts = {}
+    property_dicts = {}
     upcoming_schedules = []
+    for segment, schedule in triggers[offset:offset + limit]:
+        thermostat = schedule.thermostat
+        if thermostat.id not in thermostat_dicts:
+            thermostat_dicts[thermostat.id] = thermostat.to_dict()
+        if thermostat.property_id not in property_dicts:
+            property_dicts[thermostat.property_id] = thermostat.property.to_dict()
+        upcoming_schedules.append({
+            'schedule': schedule.to_dict(),
+            'thermostat': thermostat_dicts[thermostat.id],
+            'property': property_dicts[thermostat.property_id],
+            'trigger_time': segment['start'].isoformat() if segment['start'] > now else 'In progress',
+            'end_time': segment['end'].isoformat() if segment['end'] else None
+        })
     
-    for schedule in schedules:
-        if schedule.schedule_type == ScheduleType.MANUAL:
-            if schedule.end_time > now:
-                upcoming_schedules.append({
-                    'schedule': schedule.to_dict(),
-                    'thermostat': Thermostat.query.get(schedule.thermostat_id).to_dict(),
-                    'property': Property.query.get(Thermostat.query.get(schedule.thermostat_id).property_id).to_dict(),
-                    'trigger_time': schedule.start_time.isoformat() if schedule.start_time > now else 'In progress',
-                    'end_time': schedule.end_time.isoformat()
-                })
-        else:
-            # For non-manual schedules, we'd need to calculate based on bookings
-            # This is simplified for the prototype
-            upcoming_schedules.append({
-                'schedule': schedule.to_dict(),
-                'thermostat': Thermostat.query.get(schedule.thermostat_id).to_dict(),
-                'property': Property.query.get(Thermostat.query.get(schedule.thermostat_id).property_id).to_dict(),
-                'trigger_time': 'Based on bookings',
-                'end_time': 'Based on bookings'
-            })
+    return jsonify({
+        'upcoming_schedules': upcoming_schedules,
+        'total': len(triggers),
+        'limit': limit,
+        'offset': offset
+    }), 200
+
+@schedules_bp.route('/thermostat/<int:thermostat_id>/timeline', methods=['GET'])
+@token_required
+def get_thermostat_timeline(current_user, thermostat_id):
+    """Get the setpoint at a point in time and the transitions that follow it
+    
+    Query parameters:
+        at: ISO datetime to look up (default: now); aware values are
+            converted to UTC
+        limit: number of transitions after it, at most 100
+    """
+    thermostat = get_accessible_or_abort(current_user, Thermostat, thermostat_id)
+    
+    try:
+        at = parse_utc(request.args['at']) if 'at' in request.args else datetime.utcnow()
+        limit = min(int(request.args.get('limit', 10)), 100)
+    except ValueError:
+        return jsonify({'error': 'at must be an ISO datetime and limit an integer'}), 400
+    
+    timeline = get_timeline(thermostat, at)
+    
+    def serialize(segment):
+        return {
+            'start': segment['start'].isoformat(),
+            'end': segment['end'].isoformat() if segment['end'] else None,
+            'target_temperature': segment['target_temperature'],
+            'is_cooling': segment['is_cooling'],
+            'schedule_id': segment['schedule_id']
+        }
     
+    current = timeline.segment_at(at)
     return jsonify({
-        'upcoming_schedules': upcoming_schedules
+        'at': at.isoformat(),
+        'current': serialize(current) if current else None,
+        'transitions': [serialize(segment) for segment in timeline.next_transitions(at, limit)]
     }), 200
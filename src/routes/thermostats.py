@@ -5,6 +5,7 @@ from src.models.property import Property
 from src.models.thermostat_log import ThermostatLog, LogType
 from src.models.user import UserRole
 from src.models.base import db
+from src.utils.access import check_property_access_or_abort, get_accessible_or_abort
 from datetime import datetime
 
 thermostats_bp = Blueprint('thermostats', __name__)
@@ -140,11 +141,7 @@ class PioneerAPI(BaseThermostatAPI):
 @token_required
 def get_property_thermostats(current_user, property_id):
     """Get all thermostats for a specific property"""
-    property = Property.query.get_or_404(property_id)
-    
-    # Check if user has access to this property
-    if current_user.role != UserRole.ADMIN and property.user_id != current_user.id:
-        return jsonify({'error': 'Access denied'}), 403
+    check_property_access_or_abort(current_user, property_id)
     
     thermostats = Thermostat.query.filter_by(property_id=property_id).all()
     
@@ -156,12 +153,7 @@ def get_property_thermostats(current_user, property_id):
 @token_required
 def get_thermostat(current_user, thermostat_id):
     """Get a specific thermostat"""
-    thermostat = Thermostat.query.get_or_404(thermostat_id)
-    
-    # Check if user has access to this thermostat's property
-    property = Property.query.get(thermostat.property_id)
-    if current_user.role != UserRole.ADMIN and property.user_id != current_user.id:
-        return jsonify({'error': 'Access denied'}), 403
+    thermostat = get_accessible_or_abort(current_user, Thermostat, thermostat_id)
     
     return jsonify({
         'thermostat': thermostat.to_dict()
@@ -180,12 +172,7 @@ def create_thermostat(current_user):
             return jsonify({'error': f'Missing required field: {field}'}), 400
     
     # Check if property exists and user has access
-    property = Property.query.get(data['property_id'])
-    if not property:
-        return jsonify({'error': 'Property not found'}), 404
-    
-    if current_user.role != UserRole.ADMIN and property.user_id != current_user.id:
-        return jsonify({'error': 'Access denied'}), 403
+    check_property_access_or_abort(current_user, data['property_id'])
     
     # Create new thermostat
     try:
@@ -222,12 +209,7 @@ def create_thermostat(current_user):
 @token_required
 def update_thermostat(current_user, thermostat_id):
     """Update a thermostat"""
-    thermostat = Thermostat.query.get_or_404(thermostat_id)
-    
-    # Check if user has access to this thermostat's property
-    property = Property.query.get(thermostat.property_id)
-    if current_user.role != UserRole.ADMIN and property.user_id != current_user.id:
-        return jsonify({'error': 'Access denied'}), 403
+    thermostat = get_accessible_or_abort(current_user, Thermostat, thermostat_id)
     
     data = request.get_json()
     
@@ -271,12 +253,7 @@ def update_thermostat(current_user, thermostat_id):
 @token_required
 def delete_thermostat(current_user, thermostat_id):
     """Delete a thermostat"""
-    thermostat = Thermostat.query.get_or_404(thermostat_id)
-    
-    # Check if user has access to this thermostat's property
-    property = Property.query.get(thermostat.property_id)
-    if current_user.role != UserRole.ADMIN and property.user_id != current_user.id:
-        return jsonify({'error': 'Access denied'}), 403
+    thermostat = get_accessible_or_abort(current_user, Thermostat, thermostat_id)
     
     # Log the deletion first (before the thermostat is removed)
     log = ThermostatLog(
@@ -299,12 +276,7 @@ def delete_thermostat(current_user, thermostat_id):
 @token_required
 def get_thermostat_status(current_user, thermostat_id):
     """Get the current status of a thermostat"""
-    thermostat = Thermostat.query.get_or_404(thermostat_id)
-    
-    # Check if user has access to this thermostat's property
-    property = Property.query.get(thermostat.property_id)
-    if current_user.role != UserRole.ADMIN and property.user_id != current_user.id:
-        return jsonify({'error': 'Access denied'}), 403
+    thermostat = get_accessible_or_abort(current_user, Thermostat, thermostat_id)
     
     try:
         # Get the appropriate API adapter
@@ -344,12 +316,7 @@ def get_thermostat_status(current_user, thermostat_id):
 @token_required
 def set_thermostat_temperature(current_user, thermostat_id):
     """Set the temperature for a thermostat"""
-    thermostat = Thermostat.query.get_or_404(thermostat_id)
-    
-    # Check if user has access to this thermostat's property
-    property = Property.query.get(thermostat.property_id)
-    if current_user.role != UserRole.ADMIN and property.user_id != current_user.id:
-        return jsonify({'error': 'Access denied'}), 403
+    thermostat = get_accessible_or_abort(current_user, Thermostat, thermostat_id)
     
     data = request.get_json()
     
@@ -399,12 +366,7 @@ def set_thermostat_temperature(current_user, thermostat_id):
 @token_required
 def set_thermostat_power(current_user, thermostat_id):
     """Turn a thermostat on or off"""
-    thermostat = Thermostat.query.get_or_404(thermostat_id)
-    
-    # Check if user has access to this thermostat's property
-    property = Property.query.get(thermostat.property_id)
-    if current_user.role != UserRole.ADMIN and property.user_id != current_user.id:
-        return jsonify({'error': 'Access denied'}), 403
+    thermostat = get_accessible_or_abort(current_user, Thermostat, thermostat_id)
     
     data = request.get_json()
     
@@ -456,12 +418,7 @@ def set_thermostat_power(current_user, thermostat_id):
 @token_required
 def get_thermostat_logs(current_user, thermostat_id):
     """Get logs for a specific thermostat"""
-    thermostat = Thermostat.query.get_or_404(thermostat_id)
-    
-    # Check if user has access to this thermostat's property
-    property = Property.query.get(thermostat.property_id)
-    if current_user.role != UserRole.ADMIN and property.user_id != current_user.id:
-        return jsonify({'error': 'Access denied'}), 403
+    thermostat = get_accessible_or_abort(current_user, Thermostat, thermostat_id)
     
     # Get query parameters
     limit = request.args.get('limit', 100, type=int)
@@ -0,0 +1,100 @@
+"""Access checks for objects that belong to a user through their property.
+
+Thermostats, calendars and schedules are owned through their property, so
+checking access used to cost one query per hop: ``get_or_404`` on the object,
+``Property.query.get`` on its property and, for schedules, the thermostat in
+between.  Instead:
+
+- `get_accessible_or_abort` loads an object and its owner's id with a single
+  joined query and memoizes both on `flask.g` for the rest of the request;
+- `check_property_access_or_abort` only reads the owner id of a bare property
+  id, so endpoints that only take a property id do not load the property.
+
+Ownership is always read from the database before access is granted.  Nothing
+is cached across requests, so a property that is reassigned or deleted stops
+being accessible at once in every process.
+"""
+from flask import abort, g, jsonify, make_response
+from sqlalchemy import select
+
+from src.models.base import db
+from src.models.calendar import Calendar
+from src.models.property import Property
+from src.models.schedule import Schedule
+from src.models.thermostat import Thermostat
+from src.models.user import UserRole
+
+# Joins from each model to its property
+PROPERTY_JOINS = {
+    Property: (),
+    Thermostat: ((Property, Thermostat.property_id == Property.id),),
+    Calendar: ((Property, Calendar.property_id == Property.id),),
+    Schedule: (
+        (Thermostat, Schedule.thermostat_id == Thermostat.id),
+        (Property, Thermostat.property_id == Property.id),
+    ),
+}
+
+
+def _abort(status, message):
+    abort(make_response(jsonify({'error': message}), status))
+
+
+def _is_admin(current_user):
+    return current_user.role == UserRole.ADMIN
+
+
+def get_accessible_or_abort(current_user, model, object_id):
+    """
+    Return an object the current user may access.
+
+    Aborts with 404 if the object does not exist and 403 if it belongs to
+    another user's property.
+
+    Args:
+        current_user: The authenticated user.
+        model: `Property`, `Thermostat`, `Calendar` or `Schedule`.
+        object_id: Primary key of the object.
+    """
+    objects = g.setdefault('accessible_objects', {})
+    key = (model, object_id)
+    if key not in objects:
+        query = select(model, Property.user_id)
+        for target, onclause in PROPERTY_JOINS[model]:
+            query = query.join(target, onclause)
+        row = db.session.execute(query.where(model.id == object_id)).first()
+        objects[key] = tuple(row) if row is not None else None
+
+    entry = objects[key]
+    if entry is None:
+        _abort(404, f'{model.__name__} not found')
+    obj, owner_id = entry
+    if not _is_admin(current_user) and owner_id != current_user.id:
+        _abort(403, 'Access denied')
+    return obj
+
+
+def check_property_access_or_abort(current_user, property_id):
+    """
+    Abort unless a property exists and the current user may access it.
+
+    Aborts with 404 if the property does not exist and 403 if it belongs to
+    another user.  The owner id is memoized for the rest of the request.
+    """
+    owners = g.setdefault('property_owners', {})
+    if property_id not in owners:
+        owners[property_id] = db.session.execute(
+            select(Property.user_id).where(Property.id == property_id)
+        ).scalar_one_or_none()
+
+    owner_id = owners[property_id]
+    if owner_id is None:
+        _abort(404, 'Property not found')
+    if not _is_admin(current_user) and owner_id != current_user.id:
+        _abort(403, 'Access denied')
+
+
+def clear_request_cache(exception=None):
+    """Forget the objects and owners memoized for the current request."""
+    g.pop('accessible_objects', None)
+    g.pop('property_owners', None)
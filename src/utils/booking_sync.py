@@ -0,0 +1,167 @@
+"""Apply a calendar feed to the bookings of a calendar in bulk.
+
+Matching every incoming booking against the database costs up to two queries
+per booking (a lookup by reference, then an overlap scan) plus one INSERT
+per new row.  Instead, the calendar's existing bookings are loaded once as
+plain rows and indexed two ways:
+
+- a dict keyed by ``booking_reference``;
+- the rows sorted by ``check_in`` together with the running maximum of
+  ``check_out``, so the bookings overlapping a stay are found with a bisect
+  and a short walk backwards.
+
+The feed is diffed against that snapshot in memory and the result is written
+with one bulk INSERT, one bulk UPDATE and one DELETE, leaving the commit to
+the caller so the whole sync is one transaction.  Only bookings within the
+window the feed was read for (see `import_window`) can be deleted.
+"""
+from bisect import bisect_right
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, insert, select, update
+
+from src.models.base import db
+from src.models.booking import Booking
+
+# Columns a feed entry can set, besides the stay itself.
+OPTIONAL_FIELDS = ('guest_name', 'booking_reference', 'source')
+
+# Length of the default import window
+DEFAULT_WINDOW_DAYS = 365
+
+
+def import_window(start_date=None, end_date=None):
+    """
+    Return the bounds of the window bookings are imported for.
+
+    The default window runs for `DEFAULT_WINDOW_DAYS` from midnight UTC
+    today, so that the syncs of one day share it and can skip unchanged feeds.
+    """
+    if not start_date:
+        start_date = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+    if not end_date:
+        end_date = start_date + timedelta(days=DEFAULT_WINDOW_DAYS)
+    return start_date, end_date
+
+
+class IntervalIndex:
+    """Find bookings overlapping a stay among rows sorted by check-in."""
+
+    def __init__(self, rows):
+        self.rows = sorted(rows, key=lambda row: row['check_in'])
+        self.starts = [row['check_in'] for row in self.rows]
+        # Running maximum of check-out, so a walk backwards from the last
+        # candidate can stop as soon as no earlier row reaches the stay.
+        self.max_ends = []
+        latest = None
+        for row in self.rows:
+            latest = row['check_out'] if latest is None else max(latest, row['check_out'])
+            self.max_ends.append(latest)
+
+    def overlapping(self, check_in, check_out):
+        """Yield rows with ``check_in <= check_out`` and ``check_out >= check_in``."""
+        index = bisect_right(self.starts, check_out) - 1
+        while index >= 0 and self.max_ends[index] >= check_in:
+            row = self.rows[index]
+            if row['check_out'] >= check_in:
+                yield row
+            index -= 1
+
+
+def _load(calendar_id):
+    columns = (Booking.id, Booking.check_in, Booking.check_out) + tuple(
+        getattr(Booking, field) for field in OPTIONAL_FIELDS
+    )
+    result = db.session.execute(select(*columns).where(Booking.calendar_id == calendar_id))
+    return [dict(row._mapping) for row in result]
+
+
+def _changes(row, entry):
+    """Return the columns of an existing row that a feed entry changes."""
+    wanted = {'check_in': entry['check_in'], 'check_out': entry['check_out']}
+    for field in OPTIONAL_FIELDS:
+        if field in entry:
+            wanted[field] = entry[field]
+    return {field: value for field, value in wanted.items() if row[field] != value}
+
+
+def apply_booking_feed(calendar, entries, start_date=None, end_date=None):
+    """
+    Insert, update and delete bookings so a calendar matches its feed.
+
+    Entries are matched to existing bookings by ``booking_reference`` first,
+    then by overlapping dates, and each existing booking matches at most one
+    entry.  Unmatched bookings that overlap the synced range (see
+    `import_window` for the defaults) are no longer in the feed and are
+    deleted.  Earlier bookings are kept as history, and later ones are left
+    for the sync whose window reaches them.
+
+    Args:
+        calendar: The `Calendar` being synced.
+        entries: Dicts with ``check_in`` and ``check_out`` and optionally
+            ``guest_name``, ``booking_reference`` and ``source``.
+        start_date: Start of the synced range.
+        end_date: End of the synced range.
+
+    Returns:
+        dict: Number of bookings ``created``, ``updated`` and ``deleted``.
+    """
+    existing = _load(calendar.id)
+    by_reference = {row['booking_reference']: row for row in existing if row['booking_reference']}
+    index = IntervalIndex(existing)
+
+    claimed = set()
+    matches = [None] * len(entries)
+    # References are matched for every entry before any overlap so that an
+    # earlier entry cannot take a booking a later entry refers to.
+    for position, entry in enumerate(entries):
+        row = by_reference.get(entry.get('booking_reference'))
+        if row is not None and row['id'] not in claimed:
+            claimed.add(row['id'])
+            matches[position] = row
+    for position, entry in enumerate(entries):
+        if matches[position] is not None:
+            continue
+        for row in index.overlapping(entry['check_in'], entry['check_out']):
+            if row['id'] not in claimed:
+                claimed.add(row['id'])
+                matches[position] = row
+                break
+
+    inserts = []
+    updates = []
+    for entry, row in zip(entries, matches):
+        if row is None:
+            inserts.append({
+                'calendar_id': calendar.id,
+                'check_in': entry['check_in'],
+                'check_out': entry['check_out'],
+                **{field: entry.get(field) for field in OPTIONAL_FIELDS},
+            })
+            continue
+        # Unchanged bookings are left alone so their `updated_at` (and the
+        # schedule timelines keyed on it) stay valid.
+        changes = _changes(row, entry)
+        if changes:
+            updates.append({'id': row['id'], **changes})
+
+    # The same window the feed was parsed for, so bookings beyond its horizon
+    # are not mistaken for cancellations.
+    window_start, window_end = import_window(start_date, end_date)
+    deletes = [
+        row['id'] for row in existing
+        if row['id'] not in claimed
+        and row['check_out'] >= window_start
+        and row['check_in'] <= window_end
+    ]
+
+    if inserts:
+        db.session.execute(insert(Booking), inserts)
+    if updates:
+        db.session.execute(update(Booking), updates)
+    if deletes:
+        db.session.execute(
+            delete(Booking).where(Booking.id.in_(deletes)).execution_options(synchronize_session=False)
+        )
+
+    return {'created': len(inserts), 'updated': len(updates), 'deleted': len(deletes)}
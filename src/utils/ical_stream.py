@@ -0,0 +1,244 @@
+"""Streaming, window-bounded parser for iCal booking feeds.
+
+`icalendar.Calendar.from_ical` builds an object tree of the whole feed before
+anything can be filtered, which for multi-megabyte channel-manager feeds costs
+far more memory and time than the handful of upcoming stays we need.  This
+parser walks the feed line by line instead:
+
+- folded lines are unfolded lazily as they are read;
+- only ``VEVENT`` components are collected, as a flat dict of the few
+  properties bookings use; other components (``VTODO``, ``VALARM``,
+  ``VFREEBUSY``, ...) are skipped without being built;
+- events outside ``[start, end)`` are dropped as soon as they end.
+
+Recurring events (``RRULE``/``RDATE``, and overrides carrying
+``RECURRENCE-ID``) are the exception: their raw lines are kept and expanded
+with ``recurring_ical_events`` once the stream is exhausted, together with
+the feed's ``VTIMEZONE`` definitions.
+
+All times are returned as naive UTC datetimes; all-day dates start at
+midnight.
+"""
+import re
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+# A booking-relevant event.  ``uid`` and ``summary`` may be None.
+IcalEvent = namedtuple('IcalEvent', ['uid', 'summary', 'start', 'end'])
+
+# Properties read from each event; everything else is ignored.
+EVENT_PROPERTIES = {'UID', 'SUMMARY', 'DTSTART', 'DTEND', 'DURATION'}
+
+# Properties that make an event part of a recurrence set.
+RECURRENCE_PROPERTIES = {'RRULE', 'RDATE', 'RECURRENCE-ID'}
+
+DURATION_PATTERN = re.compile(
+    r'^(?P<sign>[+-])?P(?:(?P<weeks>\d+)W)?(?:(?P<days>\d+)D)?'
+    r'(?:T(?:(?P<hours>\d+)H)?(?:(?P<minutes>\d+)M)?(?:(?P<seconds>\d+)S)?)?$'
+)
+
+
+def unfold_lines(lines):
+    """
+    Yield logical content lines from raw (possibly folded) feed lines.
+
+    A line starting with a space or tab continues the previous one
+    (RFC 5545, 3.1).  ``lines`` may yield bytes or str.
+    """
+    current = None
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', errors='replace')
+        line = line.rstrip('\r\n')
+        if line[:1] in (' ', '\t'):
+            if current is not None:
+                current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current:
+        yield current
+
+
+def split_line(line):
+    """Split a content line into ``(name, params, value)``."""
+    # The value starts at the first colon outside a quoted parameter value.
+    quoted = False
+    for index, char in enumerate(line):
+        if char == '"':
+            quoted = not quoted
+        elif char == ':' and not quoted:
+            head, value = line[:index], line[index + 1:]
+            break
+    else:
+        head, value = line, ''
+    name, *raw_params = head.split(';')
+    params = {}
+    for param in raw_params:
+        key, _, param_value = param.partition('=')
+        params[key.upper()] = param_value.strip('"')
+    return name.upper(), params, value
+
+
+def _unescape(value):
+    return (value.replace('\\n', '\n').replace('\\N', '\n')
+            .replace('\\,', ',').replace('\\;', ';').replace('\\\\', '\\'))
+
+
+def parse_datetime(value, params):
+    """Convert a DATE or DATE-TIME value to a naive UTC datetime."""
+    value = value.strip()
+    if params.get('VALUE') == 'DATE' or len(value) == 8:
+        return datetime.strptime(value[:8], '%Y%m%d')
+    if value.endswith('Z'):
+        return datetime.strptime(value[:15], '%Y%m%dT%H%M%S')
+    moment = datetime.strptime(value[:15], '%Y%m%dT%H%M%S')
+    tzid = params.get('TZID')
+    if not tzid:
+        # Floating time; treat it as UTC like the rest of the app.
+        return moment
+    try:
+        zone = ZoneInfo(tzid)
+    except Exception:
+        return moment
+    return moment.replace(tzinfo=zone).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def parse_duration(value):
+    """Convert an iCal DURATION value to a timedelta."""
+    match = DURATION_PATTERN.match(value.strip())
+    if not match:
+        raise ValueError(f"Invalid duration: {value}")
+    parts = {key: int(part or 0) for key, part in match.groupdict().items() if key != 'sign'}
+    delta = timedelta(**parts)
+    return -delta if match.group('sign') == '-' else delta
+
+
+def _build_event(properties):
+    """Turn the collected properties of a VEVENT into an `IcalEvent`, if valid."""
+    if 'DTSTART' not in properties:
+        return None
+    params, value = properties['DTSTART']
+    start = parse_datetime(value, params)
+    if 'DTEND' in properties:
+        end_params, end_value = properties['DTEND']
+        end = parse_datetime(end_value, end_params)
+    elif 'DURATION' in properties:
+        end = start + parse_duration(properties['DURATION'][1])
+    elif params.get('VALUE') == 'DATE' or len(value.strip()) == 8:
+        end = start + timedelta(days=1)
+    else:
+        end = start
+    uid = properties.get('UID', (None, None))[1]
+    summary = properties.get('SUMMARY', (None, None))[1]
+    return IcalEvent(uid, _unescape(summary) if summary is not None else None, start, end)
+
+
+def _as_utc(value):
+    if not isinstance(value, datetime):
+        return datetime.combine(value, datetime.min.time())
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def expand_recurring(components, timezones, start, end):
+    """
+    Expand recurring events with ``recurring_ical_events``.
+
+    Args:
+        components: Raw lines of each recurring VEVENT, including overrides.
+        timezones: Raw lines of each VTIMEZONE of the feed.
+    """
+    import icalendar
+    import recurring_ical_events
+
+    lines = ['BEGIN:VCALENDAR', 'VERSION:2.0']
+    for component in timezones + components:
+        lines.extend(component)
+    lines.append('END:VCALENDAR')
+    calendar = icalendar.Calendar.from_ical('\r\n'.join(lines) + '\r\n')
+    for event in recurring_ical_events.of(calendar).between(start, end):
+        begin = _as_utc(event.decoded('DTSTART'))
+        if 'DTEND' in event:
+            finish = _as_utc(event.decoded('DTEND'))
+        else:
+            finish = begin + event.decoded('DURATION', timedelta(days=1))
+        yield IcalEvent(
+            str(event['UID']) if 'UID' in event else None,
+            str(event['SUMMARY']) if 'SUMMARY' in event else None,
+            begin,
+            finish,
+        )
+
+
+def iter_events(lines, start, end, expand=expand_recurring):
+    """
+    Yield the events of a feed that overlap ``[start, end)``.
+
+    Args:
+        lines: Iterable of raw feed lines (bytes or str), e.g. an open file or
+            ``io.BytesIO(body)``.
+        start: Naive UTC start of the window.
+        end: Naive UTC end of the window.
+        expand: Function expanding the recurring events, with the signature
+            of `expand_recurring` (e.g. a cached version).
+    """
+    recurring = []
+    timezones = []
+    stack = []
+    properties = None
+    raw = None
+
+    for line in unfold_lines(lines):
+        name, params, value = split_line(line)
+        if name == 'BEGIN':
+            component = value.upper()
+            stack.append(component)
+            if component == 'VEVENT' and len(stack) == 2:
+                properties = {}
+                raw = [line]
+            elif component == 'VTIMEZONE' and len(stack) == 2:
+                raw = [line]
+            elif raw is not None:
+                raw.append(line)
+            continue
+
+        if name == 'END':
+            component = stack.pop() if stack else None
+            if raw is not None:
+                raw.append(line)
+            if len(stack) != 1:
+                continue
+            if component == 'VTIMEZONE':
+                timezones.append(raw)
+            elif component == 'VEVENT':
+                if properties.pop('_recurring', False):
+                    recurring.append(raw)
+                else:
+                    event = _build_event(properties)
+                    if event is not None and event.start < end and event.end > start:
+                        yield event
+                properties = None
+            raw = None
+            continue
+
+        if raw is not None:
+            raw.append(line)
+        if properties is None or len(stack) != 2:
+            # Outside an event, or inside one of its sub-components (VALARM)
+            continue
+        if name in RECURRENCE_PROPERTIES:
+            properties['_recurring'] = True
+        elif name in EVENT_PROPERTIES:
+            properties[name] = (params, value)
+
+    if recurring:
+        # Occurrences share their series' UID, so each one is identified by
+        # the UID and its start time (``<uid>/<YYYYMMDDTHHMMSS>``).
+        for event in expand(recurring, timezones, start, end):
+            if event.uid is not None:
+                event = event._replace(uid=f"{event.uid}/{event.start:%Y%m%dT%H%M%S}")
+            yield event
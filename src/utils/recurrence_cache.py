@@ -0,0 +1,116 @@
+"""Memoized expansion of recurring iCal events.
+
+Cleaning schedules and owner blocks are often long-running RRULE series, and
+expanding them with ``recurring_ical_events`` is the most expensive part of
+parsing a feed.  They also rarely change, even when the bookings in the same
+feed do, so expansions are cached in the ``recurrence_expansions`` table:
+
+- the key is the SHA-256 of the feed's recurring components (and time zones)
+  plus the expansion window, widened to whole days so hourly syncs share an
+  entry;
+- occurrences are stored as packed arrays of start and end epochs plus an
+  index into the distinct ``(uid, summary)`` pairs of the series;
+- the table is an LRU: each hit refreshes ``last_used`` and the least
+  recently used entries beyond `MAX_CACHED_EXPANSIONS` are evicted on insert.
+"""
+import calendar
+import hashlib
+from array import array
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError
+
+from src.models.base import db
+from src.models.recurrence_expansion import RecurrenceExpansion
+from src.utils.ical_stream import IcalEvent, expand_recurring
+
+MAX_CACHED_EXPANSIONS = 2000
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def _epoch(moment):
+    return calendar.timegm(moment.timetuple())
+
+
+def _window(start, end):
+    """Widen a window to whole UTC days."""
+    day_start = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    day_end = end.replace(hour=0, minute=0, second=0, microsecond=0)
+    if day_end < end:
+        day_end += timedelta(days=1)
+    return day_start, day_end
+
+
+def expansion_key(components, timezones, start, end):
+    """Return the cache key of expanding ``components`` over ``[start, end)``."""
+    digest = hashlib.sha256()
+    for component in timezones + components:
+        digest.update('\r\n'.join(component).encode('utf-8'))
+        digest.update(b'\0')
+    digest.update(f'{start.isoformat()}/{end.isoformat()}'.encode())
+    return digest.hexdigest()
+
+
+def _pack(events):
+    series = []
+    positions = {}
+    series_index = array('i')
+    starts = array('q')
+    ends = array('q')
+    for event in events:
+        pair = (event.uid, event.summary)
+        if pair not in positions:
+            positions[pair] = len(series)
+            series.append(list(pair))
+        series_index.append(positions[pair])
+        starts.append(_epoch(event.start))
+        ends.append(_epoch(event.end))
+    return series, series_index.tobytes(), starts.tobytes(), ends.tobytes()
+
+
+def _unpack(entry):
+    series_index = array('i', entry.series_index)
+    starts = array('q', entry.starts)
+    ends = array('q', entry.ends)
+    for position, start, end in zip(series_index, starts, ends):
+        uid, summary = entry.series[position]
+        yield IcalEvent(uid, summary, EPOCH + timedelta(seconds=start), EPOCH + timedelta(seconds=end))
+
+
+def _evict():
+    stale = db.session.query(RecurrenceExpansion.id).order_by(
+        RecurrenceExpansion.last_used.desc()
+    ).offset(MAX_CACHED_EXPANSIONS)
+    db.session.query(RecurrenceExpansion).filter(
+        RecurrenceExpansion.id.in_(stale.scalar_subquery())
+    ).delete(synchronize_session=False)
+
+
+def expand_recurring_cached(components, timezones, start, end):
+    """
+    Drop-in replacement for `ical_stream.expand_recurring` backed by the cache.
+
+    Cache entries are added to the current session and committed with the
+    rest of the sync.
+    """
+    window_start, window_end = _window(start, end)
+    key = expansion_key(components, timezones, window_start, window_end)
+    entry = RecurrenceExpansion.query.filter_by(key=key).first()
+    if entry is None:
+        series, series_index, starts, ends = _pack(expand_recurring(components, timezones, window_start, window_end))
+        entry = RecurrenceExpansion(key=key, series=series, series_index=series_index, starts=starts, ends=ends)
+        try:
+            with db.session.begin_nested():
+                db.session.add(entry)
+        except IntegrityError:
+            # Another sync of the same feed stored it first.
+            pass
+        else:
+            _evict()
+    else:
+        entry.last_used = datetime.utcnow()
+
+    for event in _unpack(entry):
+        if event.start < end and event.end > start:
+            yield event
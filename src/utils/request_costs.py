@@ -0,0 +1,130 @@
+"""
+Per-request cost accounting shared by the Django and Flask stacks.
+
+`thermostats.middleware.RequestMetricsMiddleware` and the Flask hooks in
+`src.utils.request_metrics` open a `RequestMetrics` for each request with
+`start_request`, count its SQL statements with their framework's own hooks,
+and close it with `finish_request` and `report`, which sets the
+``Server-Timing`` header value, logs the JSON line and checks the budgets.
+
+HTTP calls made through `requests` are counted here for both: every call,
+including ``requests.get`` and shared vendor sessions, goes through
+`Session.send`, which is patched once against the single `ContextVar` below.
+Only statements and calls made on the request's own thread are counted.
+"""
+import json
+import time
+from contextvars import ContextVar
+
+import requests
+
+
+class BudgetExceeded(AssertionError):
+    """Raised in ``raise`` mode when a request goes over a budget."""
+
+
+class RequestMetrics:
+    """Costs accumulated by one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.http_calls = 0
+        self.http_time = 0.0
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        """Count a statement; a Django ``connection.execute_wrapper`` hook."""
+        self.queries += 1
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+
+    def summary(self):
+        return {
+            'duration_ms': round((time.perf_counter() - self.started) * 1000, 1),
+            'queries': self.queries,
+            'db_ms': round(self.db_time * 1000, 1),
+            'http_calls': self.http_calls,
+            'http_ms': round(self.http_time * 1000, 1),
+        }
+
+    def over_budget(self, queries, db_ms, http_calls, http_ms):
+        """Return a description of each budget (0 disables one) the request exceeded."""
+        budgets = (
+            ('queries', self.queries, queries),
+            ('db_ms', self.db_time * 1000, db_ms),
+            ('http_calls', self.http_calls, http_calls),
+            ('http_ms', self.http_time * 1000, http_ms),
+        )
+        return [f'{name} {value:.0f} > {budget:g}' for name, value, budget in budgets if budget and value > budget]
+
+
+_current = ContextVar('request_metrics', default=None)
+
+
+def current_metrics():
+    """Return the metrics of the request being served, if any."""
+    return _current.get()
+
+
+def start_request():
+    """Start counting for a new request and return the token to finish it with."""
+    return _current.set(RequestMetrics())
+
+
+def finish_request(token):
+    """Stop counting for the request started with ``token`` and return its metrics."""
+    metrics = _current.get()
+    _current.reset(token)
+    return metrics
+
+
+def server_timing(summary):
+    return ', '.join([
+        f'db;dur={summary["db_ms"]};desc="{summary["queries"]} queries"',
+        f'vendor;dur={summary["http_ms"]};desc="{summary["http_calls"]} calls"',
+        f'total;dur={summary["duration_ms"]}',
+    ])
+
+
+def report(logger, method, path, status, metrics, budgets, mode):
+    """
+    Log a finished request and return its ``Server-Timing`` header value.
+
+    Requests within ``budgets`` (see `RequestMetrics.over_budget`) are logged
+    at INFO and the others at WARNING, or raise `BudgetExceeded` when
+    ``mode`` is ``'raise'``.
+    """
+    summary = metrics.summary()
+    line = {'method': method, 'path': path, 'status': status, **summary}
+    exceeded = metrics.over_budget(*budgets)
+    if not exceeded:
+        logger.info(json.dumps(line))
+        return server_timing(summary)
+    line['over_budget'] = exceeded
+    if mode == 'raise':
+        raise BudgetExceeded(f'{method} {path} went over budget: {", ".join(exceeded)}')
+    logger.warning(json.dumps(line))
+    return server_timing(summary)
+
+
+def _timed_send(send):
+    def timed_send(session, prepared_request, **kwargs):
+        metrics = _current.get()
+        if metrics is None:
+            return send(session, prepared_request, **kwargs)
+        started = time.perf_counter()
+        try:
+            return send(session, prepared_request, **kwargs)
+        finally:
+            metrics.http_calls += 1
+            metrics.http_time += time.perf_counter() - started
+    timed_send.request_metrics = True
+    return timed_send
+
+
+if not getattr(requests.Session.send, 'request_metrics', False):
+    requests.Session.send = _timed_send(requests.Session.send)
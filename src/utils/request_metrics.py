@@ -0,0 +1,81 @@
+"""
+Per-request cost accounting.
+
+`start_request_metrics` and `finish_request_metrics` (registered in
+`src.main`) count the SQL statements each request runs and the time spent in
+them, and the HTTP calls made to vendors and calendar hosts through
+`requests` and the time spent waiting on them.  Every response gets a
+``Server-Timing`` header, which browser devtools show next to the request,
+and one JSON log line on this module's logger, e.g.::
+
+    {"method": "GET", "path": "/api/properties/", "status": 200, "duration_ms": 8.1,
+     "queries": 2, "db_ms": 0.6, "http_calls": 0, "http_ms": 0.0}
+
+A request that goes over a budget below (0 disables it) is logged as a
+warning with the budgets it exceeded.  With ``REQUEST_BUDGET_MODE=raise`` it
+raises `BudgetExceeded` instead, so running the tests that way fails them on
+N+1 regressions.
+
+The accounting itself, including the counting of HTTP calls, is shared with
+the Django middleware (see `src.utils.request_costs`).
+"""
+import logging
+import os
+import time
+
+from flask import request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# BudgetExceeded and current_metrics are re-exported for callers using them from here.
+from src.utils.request_costs import BudgetExceeded, current_metrics, finish_request, report, start_request
+
+logger = logging.getLogger(__name__)
+
+REQUEST_QUERY_BUDGET = int(os.getenv('REQUEST_QUERY_BUDGET', '50'))
+REQUEST_DB_TIME_BUDGET_MS = float(os.getenv('REQUEST_DB_TIME_BUDGET_MS', '500'))
+REQUEST_HTTP_CALL_BUDGET = int(os.getenv('REQUEST_HTTP_CALL_BUDGET', '10'))
+REQUEST_HTTP_TIME_BUDGET_MS = float(os.getenv('REQUEST_HTTP_TIME_BUDGET_MS', '5000'))
+
+# 'log' to log requests over budget, 'raise' to fail them
+REQUEST_BUDGET_MODE = os.getenv('REQUEST_BUDGET_MODE', 'log')
+
+
+def start_request_metrics():
+    request.environ['request_metrics.token'] = start_request()
+
+
+def finish_request_metrics(response):
+    token = request.environ.pop('request_metrics.token', None)
+    if token is None:
+        return response
+    metrics = finish_request(token)
+
+    budgets = (REQUEST_QUERY_BUDGET, REQUEST_DB_TIME_BUDGET_MS, REQUEST_HTTP_CALL_BUDGET, REQUEST_HTTP_TIME_BUDGET_MS)
+    response.headers['Server-Timing'] = report(
+        logger, request.method, request.path, response.status_code, metrics, budgets, REQUEST_BUDGET_MODE
+    )
+    return response
+
+
+def discard_request_metrics(exc=None):
+    """Stop counting for a request that failed before `finish_request_metrics`."""
+    token = request.environ.pop('request_metrics.token', None)
+    if token is not None:
+        finish_request(token)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    metrics = current_metrics()
+    if metrics is not None:
+        metrics.queries += 1
+        conn.info['request_metrics.started'] = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    metrics = current_metrics()
+    started = conn.info.pop('request_metrics.started', None)
+    if metrics is not None and started is not None:
+        metrics.db_time += time.perf_counter() - started
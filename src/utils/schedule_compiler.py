@@ -0,0 +1,276 @@
+"""Compile a thermostat's schedules and bookings into a setpoint timeline.
+
+Schedules only describe rules ("cool to 72F three hours before check-in"),
+so answering "what should this thermostat be set to at time t" means
+resolving them against the property's bookings.  The compiler does that once
+per thermostat and stores the result as sorted, non-overlapping segments in
+parallel arrays, so lookups are a bisect:
+
+- ``MANUAL`` schedules win over everything between ``start_time`` and
+  ``end_time``.
+- ``CHECK_IN`` schedules hold their setpoint from ``hours_before_checkin``
+  before each check-in until the guest leaves (extended by the check-out
+  schedule's ``hours_after_checkout``).
+- ``CHECK_OUT`` schedules apply from ``hours_after_checkout`` after each
+  check-out until the next booking's pre-conditioning starts.
+- ``VACANCY`` schedules fill every remaining gap.
+
+Compiled timelines are cached per thermostat together with a version token
+(row count and latest ``updated_at`` of its schedules and of the property's
+bookings).  The token is checked with two aggregate queries on each lookup,
+so a change made by any process recompiles only the thermostats it affects.
+Each of those is recompiled as a whole rather than patched: compiling one
+thermostat's timeline is a single O(n log n) sweep over its rules.
+
+A timeline covers the instants from its ``start`` on, and looking up an
+earlier instant raises `ValueError`.  `get_timeline` compiles from
+`HISTORY` before the instant it is given, so pass the earliest instant
+that will be looked up.
+"""
+import heapq
+from bisect import bisect_right
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import aliased
+
+from src.models.base import db
+from src.models.booking import Booking
+from src.models.calendar import Calendar
+from src.models.schedule import Schedule, ScheduleType
+
+# Higher priority schedules override lower ones where they overlap.
+PRIORITY = {
+    ScheduleType.VACANCY: 0,
+    ScheduleType.CHECK_OUT: 1,
+    ScheduleType.CHECK_IN: 2,
+    ScheduleType.MANUAL: 3,
+}
+
+# How far before the requested instant `get_timeline` compiles, so that
+# lookups shortly before it reuse the cached timeline.
+HISTORY = timedelta(days=1)
+
+# Open-ended segments run until this sentinel.
+END_OF_TIME = datetime.max
+
+MAX_CACHED_TIMELINES = 1024
+
+
+class Timeline:
+    """Sorted, non-overlapping setpoint segments of one thermostat."""
+
+    def __init__(self, start, segments):
+        self.start = start
+        self.starts = [segment[0] for segment in segments]
+        self.ends = [segment[1] for segment in segments]
+        self.setpoints = [segment[2] for segment in segments]
+        self.is_cooling = [segment[3] for segment in segments]
+        self.schedule_ids = [segment[4] for segment in segments]
+        # Segment indexes and end times per schedule.  Segments of one
+        # schedule never overlap, so their end times are sorted as well.
+        self._by_schedule = {}
+        for index, schedule_id in enumerate(self.schedule_ids):
+            indexes, ends = self._by_schedule.setdefault(schedule_id, ([], []))
+            indexes.append(index)
+            ends.append(self.ends[index])
+
+    def __len__(self):
+        return len(self.starts)
+
+    def _check(self, t):
+        if t < self.start:
+            raise ValueError(
+                f'{t.isoformat()} is before the compiled timeline, which starts at {self.start.isoformat()}'
+            )
+
+    def _segment(self, index):
+        return {
+            'start': self.starts[index],
+            'end': None if self.ends[index] == END_OF_TIME else self.ends[index],
+            'target_temperature': self.setpoints[index],
+            'is_cooling': self.is_cooling[index],
+            'schedule_id': self.schedule_ids[index],
+        }
+
+    def segment_at(self, t):
+        """Return the segment in effect at ``t``, or None if no schedule applies."""
+        self._check(t)
+        index = bisect_right(self.starts, t) - 1
+        if index >= 0 and t < self.ends[index]:
+            return self._segment(index)
+        return None
+
+    def setpoint_at(self, t):
+        """Return the target temperature at ``t``, or None if no schedule applies."""
+        segment = self.segment_at(t)
+        return segment['target_temperature'] if segment else None
+
+    def next_transitions(self, t, limit):
+        """Return up to ``limit`` segments starting after ``t``, in order."""
+        self._check(t)
+        index = bisect_right(self.starts, t)
+        return [self._segment(i) for i in range(index, min(index + limit, len(self.starts)))]
+
+    def segments_between(self, start, end):
+        """Return the segments overlapping ``[start, end]``, in order."""
+        self._check(start)
+        first = bisect_right(self.ends, start)
+        last = bisect_right(self.starts, end)
+        return [self._segment(i) for i in range(first, last)]
+
+    def next_segment_for(self, schedule_id, t):
+        """Return the current or next segment produced by a schedule, if any."""
+        self._check(t)
+        indexes, ends = self._by_schedule.get(schedule_id, ([], []))
+        position = bisect_right(ends, t)
+        if position < len(indexes):
+            return self._segment(indexes[position])
+        return None
+
+
+def _pick(schedules, schedule_type):
+    """Return the most recently created active schedule of a type."""
+    matching = [s for s in schedules if s.schedule_type == schedule_type]
+    return max(matching, key=lambda s: s.id) if matching else None
+
+
+def _intervals(schedules, bookings, start):
+    """Yield ``(start, end, priority, setpoint, is_cooling, schedule_id)`` rules."""
+    check_in = _pick(schedules, ScheduleType.CHECK_IN)
+    check_out = _pick(schedules, ScheduleType.CHECK_OUT)
+    vacancy = _pick(schedules, ScheduleType.VACANCY)
+
+    def rule(begin, end, schedule):
+        if begin < end:
+            yield (begin, end, PRIORITY[schedule.schedule_type], schedule.target_temperature,
+                   schedule.is_cooling, schedule.id)
+
+    if vacancy is not None:
+        yield from rule(start, END_OF_TIME, vacancy)
+
+    before = timedelta(hours=check_in.hours_before_checkin or 0) if check_in else timedelta(0)
+    after = timedelta(hours=check_out.hours_after_checkout or 0) if check_out else timedelta(0)
+    occupied_starts = [booking.check_in - before for booking in bookings]
+    for index, booking in enumerate(bookings):
+        if check_in is not None:
+            yield from rule(occupied_starts[index], booking.check_out + after, check_in)
+        if check_out is not None:
+            following = index + 1 < len(bookings)
+            until = occupied_starts[index + 1] if following else END_OF_TIME
+            yield from rule(booking.check_out + after, until, check_out)
+
+    for schedule in schedules:
+        if schedule.schedule_type == ScheduleType.MANUAL and schedule.start_time and schedule.end_time:
+            yield from rule(schedule.start_time, schedule.end_time, schedule)
+
+
+def compile_timeline(schedules, bookings, start):
+    """
+    Resolve schedules against bookings into a `Timeline`.
+
+    A sweep over the rule boundaries keeps the active rules in a heap keyed
+    by priority, so compiling is O(n log n) in the number of rules.
+
+    Args:
+        schedules: Active `Schedule` rows of the thermostat.
+        bookings: `Booking` rows of the thermostat's property, sorted by check-in.
+        start: Earliest time the timeline needs to cover.
+    """
+    rules = sorted(_intervals(schedules, bookings, start), key=lambda r: r[0])
+    boundaries = sorted({r[0] for r in rules} | {r[1] for r in rules})
+
+    segments = []
+    active = []
+    next_rule = 0
+    for begin, end in zip(boundaries, boundaries[1:]):
+        while next_rule < len(rules) and rules[next_rule][0] <= begin:
+            r = rules[next_rule]
+            # Ties go to the later rule, i.e. the more specific booking.
+            heapq.heappush(active, (-r[2], -next_rule, r))
+            next_rule += 1
+        while active and active[0][2][1] <= begin:
+            heapq.heappop(active)
+        if not active:
+            continue
+        _, _, (_, _, _, setpoint, is_cooling, schedule_id) = active[0]
+        previous = segments[-1] if segments else None
+        if previous and previous[1] == begin and previous[2:] == (setpoint, is_cooling, schedule_id):
+            segments[-1] = (previous[0], end, setpoint, is_cooling, schedule_id)
+        else:
+            segments.append((begin, end, setpoint, is_cooling, schedule_id))
+
+    return Timeline(start, segments)
+
+
+def bookings_from(start):
+    """
+    Filter the bookings (joined to their `Calendar`) a timeline from ``start`` depends on.
+
+    Those are the bookings still running at ``start`` and the last booking of
+    the property to end before it, whose check-out schedule lasts until the
+    next booking.
+    """
+    earlier = aliased(Booking)
+    earlier_calendar = aliased(Calendar)
+    previous = select(func.max(earlier.check_out)).join(
+        earlier_calendar, earlier.calendar_id == earlier_calendar.id
+    ).where(
+        earlier_calendar.property_id == Calendar.property_id,
+        earlier.check_out < start,
+    ).scalar_subquery()
+    return Booking.check_out >= func.coalesce(previous, start)
+
+
+def _version(thermostat):
+    schedule_version = db.session.query(func.count(Schedule.id), func.max(Schedule.updated_at)).filter(
+        Schedule.thermostat_id == thermostat.id
+    ).one()
+    booking_version = db.session.query(func.count(Booking.id), func.max(Booking.updated_at)).join(Calendar).filter(
+        Calendar.property_id == thermostat.property_id
+    ).one()
+    return tuple(schedule_version) + tuple(booking_version)
+
+
+_cache = OrderedDict()
+
+
+def get_timeline(thermostat, now=None):
+    """
+    Return the compiled timeline of a thermostat, recompiling only if needed.
+
+    Args:
+        thermostat: A `Thermostat` instance.
+        now: Earliest instant that will be looked up; defaults to
+            ``datetime.utcnow()``.  A cached timeline starting later is
+            recompiled from the database.
+    """
+    now = now or datetime.utcnow()
+    start = now - HISTORY
+    version = _version(thermostat)
+    cached = _cache.get(thermostat.id)
+    if cached is not None and cached[0] == version and cached[1].start <= start:
+        _cache.move_to_end(thermostat.id)
+        return cached[1]
+
+    schedules = Schedule.query.filter(
+        Schedule.thermostat_id == thermostat.id,
+        Schedule.is_active == True,
+    ).all()
+    bookings = Booking.query.join(Calendar).filter(
+        Calendar.property_id == thermostat.property_id,
+        bookings_from(start),
+    ).order_by(Booking.check_in).all()
+
+    timeline = compile_timeline(schedules, bookings, start)
+    _cache[thermostat.id] = (version, timeline)
+    _cache.move_to_end(thermostat.id)
+    while len(_cache) > MAX_CACHED_TIMELINES:
+        _cache.popitem(last=False)
+    return timeline
+
+
+def clear_cache():
+    """Drop every compiled timeline (e.g. between tests)."""
+    _cache.clear()
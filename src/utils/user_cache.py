@@ -0,0 +1,164 @@
+"""In-process cache of the users behind authentication tokens.
+
+`token_required` only needs a user's role, active flag and token version, so
+those are kept as `UserSnapshot` tuples instead of loading the ``users`` row
+on every request:
+
+- a snapshot is loaded on first use and dropped from this process's cache as
+  soon as a transaction creating, updating or deleting that user commits;
+- once every `USER_CACHE_TTL` seconds all cached users are reloaded with a
+  single query, which picks up changes committed by other processes;
+- with `TRUST_TOKEN_CLAIMS` enabled, tokens carrying ``active`` and ``ver``
+  claims are not looked up at all on a cache miss.  Their claims are then
+  checked at the next reload.
+
+Changing a user's password, role or active flag bumps ``token_version`` (see
+`src.models.user`), and tokens carrying an older ``ver`` claim are rejected.
+The lockout takes effect immediately in the process that made the change and
+within `USER_CACHE_TTL` seconds in all the others.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from src.models.base import db
+from src.models.user import User, UserRole
+
+USER_CACHE_TTL = float(os.getenv('AUTH_USER_CACHE_TTL', '30'))
+TRUST_TOKEN_CLAIMS = os.getenv('AUTH_TRUST_TOKEN_CLAIMS', 'false').lower() in ('1', 'true', 'yes')
+
+MAX_CACHED_USERS = 4096
+
+# Users are reloaded in chunks to stay below bound-parameter limits.
+RELOAD_CHUNK_SIZE = 500
+
+UserSnapshot = namedtuple('UserSnapshot', ['id', 'email', 'role', 'is_active', 'token_version'])
+
+# User id -> UserSnapshot, or None for users that no longer exist.
+_cache = OrderedDict()
+# Ids of users accepted on their token claims alone, checked on the next reload.
+_unverified = set()
+# Ids of users changed by this process, whose claims can no longer be trusted.
+_changed = set()
+_reloaded_at = None
+_lock = threading.Lock()
+
+
+def _load(user_ids):
+    columns = (User.id, User.email, User.role, User.is_active, User.token_version)
+    snapshots = {}
+    for index in range(0, len(user_ids), RELOAD_CHUNK_SIZE):
+        chunk = user_ids[index:index + RELOAD_CHUNK_SIZE]
+        for row in db.session.execute(select(*columns).where(User.id.in_(chunk))):
+            snapshots[row.id] = UserSnapshot(row.id, row.email, row.role, row.is_active, row.token_version or 0)
+    return snapshots
+
+
+def _store(user_id, snapshot):
+    _cache[user_id] = snapshot
+    _cache.move_to_end(user_id)
+    while len(_cache) > MAX_CACHED_USERS:
+        _cache.popitem(last=False)
+
+
+def _reload(now):
+    global _reloaded_at
+    with _lock:
+        user_ids = list(_cache) + list((_unverified | _changed) - _cache.keys())
+        _unverified.clear()
+        _changed.clear()
+        _reloaded_at = now
+    if not user_ids:
+        return
+    snapshots = _load(user_ids)
+    with _lock:
+        for user_id in user_ids:
+            _store(user_id, snapshots.get(user_id))
+
+
+def _from_claims(payload):
+    try:
+        return UserSnapshot(
+            payload['user_id'],
+            payload.get('email'),
+            UserRole(payload['role']),
+            bool(payload['active']),
+            payload['ver'],
+        )
+    except (KeyError, ValueError):
+        return None
+
+
+def get_user(payload, now=None):
+    """
+    Return the `UserSnapshot` of a decoded token's user.
+
+    Args:
+        payload: The decoded JWT payload.
+        now: Current ``time.monotonic()`` value, for tests.
+
+    Returns:
+        UserSnapshot: The user, or None if it does not exist.
+    """
+    now = time.monotonic() if now is None else now
+    if _reloaded_at is None or now - _reloaded_at >= USER_CACHE_TTL:
+        _reload(now)
+
+    user_id = payload['user_id']
+    with _lock:
+        if user_id in _cache:
+            _cache.move_to_end(user_id)
+            return _cache[user_id]
+
+    if TRUST_TOKEN_CLAIMS and user_id not in _changed:
+        snapshot = _from_claims(payload)
+        if snapshot is not None:
+            with _lock:
+                _unverified.add(user_id)
+            return snapshot
+
+    snapshot = _load([user_id]).get(user_id)
+    with _lock:
+        _store(user_id, snapshot)
+        _changed.discard(user_id)
+    return snapshot
+
+
+def invalidate(user_id):
+    """Drop a user from this process's cache."""
+    with _lock:
+        _cache.pop(user_id, None)
+        _unverified.discard(user_id)
+        _changed.add(user_id)
+
+
+def clear_cache():
+    """Drop every cached user (e.g. between tests)."""
+    global _reloaded_at
+    with _lock:
+        _cache.clear()
+        _unverified.clear()
+        _changed.clear()
+        _reloaded_at = None
+
+
+# Changed users are collected per session and only invalidated once the
+# change is committed, so a concurrent request cannot cache the old row again.
+@event.listens_for(User, 'after_insert')
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _collect_changed_user(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault('changed_user_ids', set()).add(target.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_users(session):
+    for user_id in session.info.pop('changed_user_ids', ()):
+        invalidate(user_id)
+
@@ -4,6 +4,7 @@ import jwt
 from datetime import datetime, timedelta
 from src.models.user import User, UserRole
 from src.routes.auth import JWT_SECRET, JWT_ALGORITHM
+from src.utils import user_cache
 
 @pytest.fixture
 def app():
@@ -14,6 +15,7 @@ def app():
     with flask_app.app_context():
         from src.models.base import db
         db.create_all()
+        user_cache.clear_cache()
         yield flask_app
         db.drop_all()
 
@@ -172,3 +174,78 @@ def test_non_admin_get_users(client, auth_token):
     assert response.status_code == 403
     data = json.loads(response.data)
     assert 'error' in data
+
+def count_statements(action):
+    """Run an action and return the SQL statements it executed"""
+    from sqlalchemy import event
+    from src.models.base import db
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        action()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    return statements
+
+def test_authenticated_user_is_cached(client, auth_token):
+    """Test that repeated requests resolve the user without querying it again"""
+    headers = {'Authorization': f'Bearer {auth_token}'}
+    assert client.get('/api/properties/', headers=headers).status_code == 200
+
+    statements = count_statements(lambda: client.get('/api/properties/', headers=headers))
+    assert not any('FROM users' in statement for statement in statements)
+
+def test_deactivation_locks_out_immediately(client, admin_token, test_user):
+    """Test that deactivating a user revokes their cached session at once"""
+    login = client.post('/api/auth/login', json={'email': 'test@example.com', 'password': 'password123'})
+    headers = {'Authorization': f"Bearer {login.get_json()['token']}"}
+    assert client.get('/api/auth/profile', headers=headers).status_code == 200
+
+    response = client.put(f'/api/auth/users/{test_user.id}', headers={
+        'Authorization': f'Bearer {admin_token}'
+    }, json={'is_active': False})
+    assert response.status_code == 200
+
+    response = client.get('/api/auth/profile', headers=headers)
+    assert response.status_code == 401
+    assert response.get_json()['error'] == 'Token has been revoked'
+
+def test_revoke_tokens_and_password_change(client, admin_token, test_user):
+    """Test that token version bumps reject older tokens"""
+    login = client.post('/api/auth/login', json={'email': 'test@example.com', 'password': 'password123'})
+    headers = {'Authorization': f"Bearer {login.get_json()['token']}"}
+
+    response = client.put('/api/auth/profile', headers=headers, json={'password': 'newpassword'})
+    assert response.status_code == 200
+    assert client.get('/api/auth/profile', headers=headers).status_code == 401
+
+    headers = {'Authorization': f"Bearer {response.get_json()['token']}"}
+    assert client.get('/api/auth/profile', headers=headers).status_code == 200
+
+    response = client.post(f'/api/auth/users/{test_user.id}/revoke-tokens', headers={
+        'Authorization': f'Bearer {admin_token}'
+    })
+    assert response.status_code == 200
+    assert client.get('/api/auth/profile', headers=headers).status_code == 401
+
+def test_trusted_claims_skip_lookup_until_reload(app, client, test_user, monkeypatch):
+    """Test that trusted token claims avoid the lookup and are checked on reload"""
+    from src.models.base import db
+
+    monkeypatch.setattr(user_cache, 'TRUST_TOKEN_CLAIMS', True)
+    login = client.post('/api/auth/login', json={'email': 'test@example.com', 'password': 'password123'})
+    headers = {'Authorization': f"Bearer {login.get_json()['token']}"}
+    # A process that has not seen the user yet
+    user_cache.clear_cache()
+
+    statements = count_statements(lambda: client.get('/api/properties/', headers=headers))
+    assert not any('FROM users' in statement for statement in statements)
+
+    # Revoked by another process: picked up by the next periodic reload
+    db.session.execute(db.text('UPDATE users SET token_version = token_version + 1'))
+    db.session.commit()
+    assert client.get('/api/properties/', headers=headers).status_code == 200
+    monkeypatch.setattr(user_cache, 'USER_CACHE_TTL', 0)
+    assert client.get('/api/properties/', headers=headers).status_code == 401
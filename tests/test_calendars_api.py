@@ -0,0 +1,324 @@
+import pytest
+from datetime import datetime, timedelta
+from src.models.booking import Booking
+from src.models.calendar import Calendar
+from src.models.property import Property
+from src.models.user import User, UserRole
+from src.routes.calendars import ICalAPI
+from src.utils.booking_sync import apply_booking_feed
+
+@pytest.fixture
+def app():
+    from src.main import app as flask_app
+    flask_app.config['TESTING'] = True
+    flask_app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+
+    with flask_app.app_context():
+        from src.models.base import db
+        db.create_all()
+        yield flask_app
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def db_session(app):
+    from src.models.base import db
+    with app.app_context():
+        yield db.session
+
+@pytest.fixture
+def test_user(db_session):
+    """Create a test user"""
+    user = User(
+        email='test@example.com',
+        first_name='Test',
+        last_name='User',
+        role=UserRole.MANAGER
+    )
+    user.set_password('password123')
+    db_session.add(user)
+    db_session.commit()
+    return user
+
+@pytest.fixture
+def auth_headers(test_user):
+    """Generate auth headers for the test user"""
+    from src.routes.auth import JWT_SECRET, JWT_ALGORITHM
+    import jwt
+
+    token_payload = {
+        'user_id': test_user.id,
+        'email': test_user.email,
+        'role': test_user.role.value,
+        'exp': datetime.utcnow() + timedelta(hours=1)
+    }
+    token = jwt.encode(token_payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+
+    return {'Authorization': f'Bearer {token}'}
+
+@pytest.fixture
+def calendar(db_session, test_user):
+    """Create an iCal calendar for a property of the test user"""
+    property = Property(
+        name='Test Property',
+        address='123 Main St',
+        city='Testville',
+        state='TS',
+        zip_code='12345',
+        country='Testland',
+        user_id=test_user.id
+    )
+    db_session.add(property)
+    db_session.commit()
+
+    calendar = Calendar(name='Airbnb', source_type='ical', source_url='https://www.airbnb.com/calendar/ical/1.ics', property_id=property.id)
+    db_session.add(calendar)
+    db_session.commit()
+    return calendar
+
+def stay(days, nights=2, **fields):
+    check_in = datetime.utcnow().replace(hour=15, minute=0, second=0, microsecond=0) + timedelta(days=days)
+    return dict(check_in=check_in, check_out=check_in + timedelta(days=nights), **fields)
+
+def test_booking_feed_diff(db_session, calendar):
+    """Test that a feed is matched by reference, then by overlap, and applied in bulk"""
+    kept = Booking(calendar_id=calendar.id, **stay(1, booking_reference='A1', guest_name='Ann'))
+    moved = Booking(calendar_id=calendar.id, **stay(5, booking_reference='B2', guest_name='Bob'))
+    unreferenced = Booking(calendar_id=calendar.id, **stay(10))
+    cancelled = Booking(calendar_id=calendar.id, **stay(20, booking_reference='C3'))
+    past = Booking(calendar_id=calendar.id, **stay(-10, booking_reference='OLD'))
+    db_session.add_all([kept, moved, unreferenced, cancelled, past])
+    db_session.commit()
+    kept_updated_at = kept.updated_at
+    cancelled_id, past_id = cancelled.id, past.id
+
+    feed = [
+        stay(1, booking_reference='A1', guest_name='Ann'),
+        stay(6, booking_reference='B2', guest_name='Bob'),
+        stay(11, booking_reference='D4', guest_name='Dee'),
+        stay(30, booking_reference='E5', guest_name='Eve'),
+    ]
+    changes = apply_booking_feed(calendar, feed)
+    db_session.commit()
+    db_session.expire_all()
+
+    assert changes == {'created': 1, 'updated': 2, 'deleted': 1}
+    bookings = {b.id: b for b in Booking.query.filter_by(calendar_id=calendar.id)}
+    assert bookings[kept.id].updated_at == kept_updated_at
+    assert bookings[moved.id].check_in == feed[1]['check_in']
+    assert bookings[unreferenced.id].booking_reference == 'D4'
+    assert bookings[unreferenced.id].guest_name == 'Dee'
+    assert cancelled_id not in bookings
+    assert past_id in bookings
+    assert sorted(b.booking_reference for b in bookings.values()) == ['A1', 'B2', 'D4', 'E5', 'OLD']
+
+def test_booking_feed_keeps_bookings_beyond_the_window(db_session, calendar):
+    """Test that bookings past the default horizon are not deleted as cancellations"""
+    near = Booking(calendar_id=calendar.id, **stay(30, booking_reference='NEAR'))
+    far = Booking(calendar_id=calendar.id, **stay(400, booking_reference='FAR'))
+    db_session.add_all([near, far])
+    db_session.commit()
+    far_id = far.id
+
+    # The parser only expands a year ahead, so FAR is missing from the feed.
+    assert apply_booking_feed(calendar, []) == {'created': 0, 'updated': 0, 'deleted': 1}
+    db_session.commit()
+    assert [b.id for b in Booking.query.filter_by(calendar_id=calendar.id)] == [far_id]
+
+def test_booking_feed_sync_is_query_bounded(app, db_session, calendar):
+    """Test that syncing a large feed runs a constant number of statements"""
+    from sqlalchemy import event
+    from src.models.base import db
+
+    feed = [stay(day * 3, booking_reference=f'R{day}') for day in range(200)]
+    apply_booking_feed(calendar, feed[:100])
+    db_session.commit()
+    db_session.refresh(calendar)
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        changes = apply_booking_feed(calendar, feed[50:])
+        db_session.commit()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+
+    assert changes == {'created': 100, 'updated': 0, 'deleted': 50}
+    # Load, insert and delete; nothing needed updating.
+    assert len(statements) <= 3
+    assert Booking.query.filter_by(calendar_id=calendar.id).count() == 150
+
+def test_sync_calendar_endpoint(client, auth_headers, db_session, calendar, monkeypatch):
+    """Test that the sync endpoint reports the applied changes"""
+    db_session.add(Booking(calendar_id=calendar.id, **stay(2, booking_reference='X1')))
+    db_session.commit()
+    monkeypatch.setattr(ICalAPI, 'sync', lambda self, start_date=None, end_date=None: [
+        stay(2, booking_reference='X1', guest_name='Guest'),
+        stay(8, booking_reference='X2'),
+    ])
+
+    response = client.post(f'/api/calendars/{calendar.id}/sync', headers=auth_headers, json={})
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['changes'] == {'created': 1, 'updated': 1, 'deleted': 0}
+    assert data['message'] == 'Calendar synced successfully. 1 new bookings created.'
+
+ICAL_FEED = b"""BEGIN:VCALENDAR
+VERSION:2.0
+PRODID:-//Airbnb Inc//Hosting Calendar//EN
+BEGIN:VEVENT
+DTSTART;VALUE=DATE:%(check_in)s
+DTEND;VALUE=DATE:%(check_out)s
+UID:abc123@airbnb.com
+SUMMARY:Reserved
+END:VEVENT
+END:VCALENDAR
+"""
+
+class FeedSession:
+    """Serve canned responses and record the headers of each request"""
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def get(self, url, headers=None, timeout=None):
+        import requests
+        status, body, response_headers = self.responses.pop(0)
+        self.requests.append(headers or {})
+        response = requests.Response()
+        response.status_code = status
+        response._content = body
+        response.headers.update(response_headers)
+        return response
+
+def test_ical_sync_uses_conditional_requests_and_content_hash(client, auth_headers, db_session, calendar, monkeypatch):
+    """Test that unchanged iCal feeds are neither parsed nor applied"""
+    from src.routes import calendars
+
+    check_in = datetime.utcnow().date() + timedelta(days=3)
+    feed = ICAL_FEED % {
+        b'check_in': check_in.strftime('%Y%m%d').encode(),
+        b'check_out': (check_in + timedelta(days=2)).strftime('%Y%m%d').encode(),
+    }
+    validators = {'ETag': '"v1"', 'Last-Modified': 'Mon, 19 Oct 2026 10:00:00 GMT'}
+    session = FeedSession(
+        (200, feed, validators), (304, b'', {}), (200, feed, {'ETag': '"v2"'}),
+        (200, feed, {'ETag': '"v2"'}),
+    )
+    monkeypatch.setattr(calendars, '_feed_session', session)
+    parsed = []
+    parse = calendars.parse_ical_bookings
+    monkeypatch.setattr(calendars, 'parse_ical_bookings', lambda *args: parsed.append(args) or parse(*args))
+
+    response = client.post(f'/api/calendars/{calendar.id}/sync', headers=auth_headers, json={})
+    assert response.get_json()['changes'] == {'created': 1, 'updated': 0, 'deleted': 0}
+    booking = Booking.query.filter_by(calendar_id=calendar.id).one()
+    assert booking.booking_reference == 'abc123@airbnb.com'
+    assert booking.source == 'airbnb'
+    assert booking.check_in == datetime.combine(check_in, datetime.min.time())
+
+    # Not modified: the validators of the first response are sent back
+    response = client.post(f'/api/calendars/{calendar.id}/sync', headers=auth_headers, json={})
+    assert response.get_json()['changes'] == {'created': 0, 'updated': 0, 'deleted': 0}
+    assert session.requests[1] == {'If-None-Match': '"v1"', 'If-Modified-Since': validators['Last-Modified']}
+
+    # A new ETag with the same body is caught by the content hash
+    response = client.post(f'/api/calendars/{calendar.id}/sync', headers=auth_headers, json={})
+    assert response.status_code == 200
+    assert len(parsed) == 1
+    db_session.refresh(calendar)
+    assert calendar.etag == '"v2"'
+    assert calendar.last_modified is None
+
+    # Another window is fetched without validators and parsed again
+    window = {'start_date': (check_in + timedelta(days=1)).isoformat(), 'end_date': (check_in + timedelta(days=30)).isoformat()}
+    response = client.post(f'/api/calendars/{calendar.id}/sync', headers=auth_headers, json=window)
+    assert response.status_code == 200
+    assert session.requests[3] == {}
+    assert len(parsed) == 2
+    assert response.get_json()['changes'] == {'created': 0, 'updated': 0, 'deleted': 0}
+
+def test_streaming_ical_parser():
+    """Test unfolding, timezones, window filtering and recurring fallback of the iCal parser"""
+    import io
+    from src.utils.ical_stream import iter_events
+
+    feed = b"\r\n".join([
+        b"BEGIN:VCALENDAR",
+        b"VERSION:2.0",
+        b"BEGIN:VTODO",
+        b"UID:todo-1",
+        b"DTSTART:20261101T100000Z",
+        b"END:VTODO",
+        b"BEGIN:VEVENT",
+        b"UID:in-window",
+        b"SUMMARY:Reserved\\, long",
+        b"  stay",
+        b"DTSTART;TZID=America/New_York:20261101T150000",
+        b"DTEND;TZID=America/New_York:20261104T110000",
+        b"BEGIN:VALARM",
+        b"DTSTART:19990101T000000Z",
+        b"END:VALARM",
+        b"END:VEVENT",
+        b"BEGIN:VEVENT",
+        b"UID:too-late",
+        b"DTSTART;VALUE=DATE:20280101",
+        b"DTEND;VALUE=DATE:20280103",
+        b"END:VEVENT",
+        b"BEGIN:VEVENT",
+        b"UID:cleaning",
+        b"SUMMARY:Cleaning",
+        b"DTSTART:20261102T090000Z",
+        b"DURATION:PT2H",
+        b"RRULE:FREQ=WEEKLY;COUNT=3",
+        b"END:VEVENT",
+        b"END:VCALENDAR",
+        b"",
+    ])
+    events = list(iter_events(io.BytesIO(feed), datetime(2026, 10, 20), datetime(2026, 11, 12)))
+
+    assert events[0].uid == 'in-window'
+    assert events[0].summary == 'Reserved, long stay'
+    assert events[0].start == datetime(2026, 11, 1, 20, 0)
+    assert events[0].end == datetime(2026, 11, 4, 16, 0)
+    assert [(e.uid, e.start, e.end) for e in events[1:]] == [
+        ('cleaning/20261102T090000', datetime(2026, 11, 2, 9), datetime(2026, 11, 2, 11)),
+        ('cleaning/20261109T090000', datetime(2026, 11, 9, 9), datetime(2026, 11, 9, 11)),
+    ]
+
+def test_recurring_expansion_is_cached(app, db_session, monkeypatch):
+    """Test that recurring events are expanded once per window and evicted least recently used first"""
+    from src.models.recurrence_expansion import RecurrenceExpansion
+    from src.utils import recurrence_cache
+    from src.utils.ical_stream import iter_events
+
+    def feed(uid):
+        return "\r\n".join([
+            "BEGIN:VCALENDAR", "BEGIN:VEVENT", f"UID:{uid}", "SUMMARY:Cleaning",
+            "DTSTART:20261102T090000Z", "DTEND:20261102T110000Z", "RRULE:FREQ=DAILY;COUNT=400",
+            "END:VEVENT", "END:VCALENDAR", "",
+        ]).splitlines()
+
+    expansions = []
+    expand = recurrence_cache.expand_recurring
+    monkeypatch.setattr(recurrence_cache, 'expand_recurring', lambda *args: expansions.append(args) or expand(*args))
+    cached = recurrence_cache.expand_recurring_cached
+
+    first = list(iter_events(feed('a'), datetime(2026, 11, 10, 8), datetime(2026, 11, 20), expand=cached))
+    # An hour later the window falls on the same days, so the entry is reused.
+    second = list(iter_events(feed('a'), datetime(2026, 11, 10, 9), datetime(2026, 11, 19, 23), expand=cached))
+    assert len(expansions) == 1
+    assert first[0].uid == 'a/20261110T090000'
+    assert first[0].end == datetime(2026, 11, 10, 11)
+    assert len(first) == 10
+    assert [e.start for e in second] == [e.start for e in first]
+
+    monkeypatch.setattr(recurrence_cache, 'MAX_CACHED_EXPANSIONS', 1)
+    list(iter_events(feed('b'), datetime(2026, 11, 10), datetime(2026, 11, 20), expand=cached))
+    db_session.commit()
+    assert len(expansions) == 2
+    assert RecurrenceExpansion.query.count() == 1
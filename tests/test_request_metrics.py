@@ -0,0 +1,114 @@
+import pytest
+import json
+import logging
+import requests
+from requests.adapters import BaseAdapter
+from sqlalchemy import event
+from src.models.user import User, UserRole
+from src.utils import request_metrics, user_cache
+
+@pytest.fixture
+def app():
+    from src.main import app as flask_app
+    flask_app.config['TESTING'] = True
+
+    with flask_app.app_context():
+        from src.models.base import db
+        db.create_all()
+        user_cache.clear_cache()
+        yield flask_app
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def test_user(app):
+    from src.models.base import db
+    user = User(email='test@example.com', first_name='Test', last_name='User', role=UserRole.MANAGER)
+    user.set_password('password123')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+class FakeVendorAdapter(BaseAdapter):
+    """Answers every request with an empty 200 without touching the network"""
+
+    def send(self, request, **kwargs):
+        response = requests.Response()
+        response.status_code = 200
+        response.request = request
+        response.url = request.url
+        response._content = b'{}'
+        return response
+
+    def close(self):
+        pass
+
+def login(client):
+    return client.post('/api/auth/login', json={'email': 'test@example.com', 'password': 'password123'})
+
+def register(client, email):
+    return client.post('/api/auth/register', json={
+        'email': email, 'password': 'password123', 'first_name': 'New', 'last_name': 'User'
+    })
+
+def test_server_timing_counts_statements(app, client, test_user, caplog):
+    """Test that each response reports its statements and logs one JSON line"""
+    from src.models.base import db
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        with caplog.at_level(logging.INFO, logger=request_metrics.__name__):
+            response = login(client)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+
+    assert response.status_code == 200
+    timing = response.headers['Server-Timing']
+    assert f'desc="{len(statements)} queries"' in timing
+    assert 'vendor;dur=0.0;desc="0 calls"' in timing
+
+    line = json.loads(caplog.records[-1].getMessage())
+    assert line['path'] == '/api/auth/login'
+    assert line['status'] == 200
+    assert line['queries'] == len(statements)
+    assert 'over_budget' not in line
+
+def test_vendor_calls_are_counted(app):
+    """Test that HTTP calls made through requests count against the request"""
+    session = requests.Session()
+    session.mount('https://', FakeVendorAdapter())
+
+    with app.test_request_context('/api/thermostats/1/status'):
+        request_metrics.start_request_metrics()
+        session.get('https://developer-api.nest.com/devices')
+        session.post('https://developer-api.nest.com/devices', json={})
+        metrics = request_metrics.current_metrics()
+        response = request_metrics.finish_request_metrics(app.response_class('{}'))
+
+    assert metrics.http_calls == 2
+    assert 'desc="2 calls"' in response.headers['Server-Timing']
+    assert request_metrics.current_metrics() is None
+
+    # Calls outside a request are not attributed to any
+    session.get('https://developer-api.nest.com/devices')
+    assert metrics.http_calls == 2
+
+def test_budgets_log_or_fail(client, monkeypatch, caplog):
+    """Test that requests over budget are logged, or raise in raise mode"""
+    monkeypatch.setattr(request_metrics, 'REQUEST_QUERY_BUDGET', 1)
+    monkeypatch.setattr(request_metrics, 'REQUEST_BUDGET_MODE', 'log')
+
+    with caplog.at_level(logging.WARNING, logger=request_metrics.__name__):
+        assert register(client, 'first@example.com').status_code == 201
+    line = json.loads(caplog.records[-1].getMessage())
+    assert line['over_budget'][0].startswith('queries ')
+
+    monkeypatch.setattr(request_metrics, 'REQUEST_BUDGET_MODE', 'raise')
+    with pytest.raises(request_metrics.BudgetExceeded, match='POST /api/auth/register went over budget: queries'):
+        register(client, 'second@example.com')
+    assert request_metrics.current_metrics() is None
@@ -0,0 +1,327 @@
+import pytest
+from datetime import datetime, timedelta
+from src.models.booking import Booking
+from src.models.calendar import Calendar
+from src.models.property import Property
+from src.models.schedule import Schedule, ScheduleType
+from src.models.thermostat import Thermostat, ThermostatType
+from src.models.user import User, UserRole
+from src.utils import schedule_compiler
+
+@pytest.fixture
+def app():
+    from src.main import app as flask_app
+    flask_app.config['TESTING'] = True
+    flask_app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+
+    with flask_app.app_context():
+        from src.models.base import db
+        db.create_all()
+        schedule_compiler.clear_cache()
+        yield flask_app
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def db_session(app):
+    from src.models.base import db
+    with app.app_context():
+        yield db.session
+
+@pytest.fixture
+def test_user(db_session):
+    """Create a test user"""
+    user = User(
+        email='test@example.com',
+        first_name='Test',
+        last_name='User',
+        role=UserRole.MANAGER
+    )
+    user.set_password('password123')
+    db_session.add(user)
+    db_session.commit()
+    return user
+
+@pytest.fixture
+def auth_headers(test_user):
+    """Generate auth headers for the test user"""
+    from src.routes.auth import JWT_SECRET, JWT_ALGORITHM
+    import jwt
+
+    token_payload = {
+        'user_id': test_user.id,
+        'email': test_user.email,
+        'role': test_user.role.value,
+        'exp': datetime.utcnow() + timedelta(hours=1)
+    }
+    token = jwt.encode(token_payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+
+    return {'Authorization': f'Bearer {token}'}
+
+@pytest.fixture
+def thermostat(db_session, test_user):
+    """Create a thermostat with check-in, check-out and vacancy schedules"""
+    property = Property(
+        name='Test Property',
+        address='123 Main St',
+        city='Testville',
+        state='TS',
+        zip_code='12345',
+        country='Testland',
+        user_id=test_user.id
+    )
+    db_session.add(property)
+    db_session.commit()
+
+    thermostat = Thermostat(name='Living Room', device_id='TEST123', type=ThermostatType.NEST, property_id=property.id)
+    calendar = Calendar(name='Airbnb', source_type='ical', source_url='https://example.com/calendar.ics', property_id=property.id)
+    db_session.add_all([thermostat, calendar])
+    db_session.commit()
+
+    db_session.add_all([
+        Schedule(thermostat_id=thermostat.id, schedule_type=ScheduleType.VACANCY, target_temperature=80.0),
+        Schedule(thermostat_id=thermostat.id, schedule_type=ScheduleType.CHECK_IN, hours_before_checkin=3, target_temperature=72.0),
+        Schedule(thermostat_id=thermostat.id, schedule_type=ScheduleType.CHECK_OUT, hours_after_checkout=1, target_temperature=78.0),
+    ])
+    db_session.commit()
+    return thermostat
+
+def add_booking(db_session, thermostat, check_in, nights=2):
+    calendar = Calendar.query.filter_by(property_id=thermostat.property_id).first()
+    booking = Booking(calendar_id=calendar.id, check_in=check_in, check_out=check_in + timedelta(days=nights))
+    db_session.add(booking)
+    db_session.commit()
+    return booking
+
+def test_timeline_resolves_bookings(db_session, thermostat):
+    """Test setpoint lookups across a compiled booking timeline"""
+    now = datetime.utcnow().replace(microsecond=0)
+    booking = add_booking(db_session, thermostat, now + timedelta(days=1))
+    timeline = schedule_compiler.get_timeline(thermostat, now)
+
+    assert timeline.setpoint_at(now) == 80.0
+    assert timeline.setpoint_at(booking.check_in - timedelta(hours=2)) == 72.0
+    assert timeline.setpoint_at(booking.check_out + timedelta(minutes=30)) == 72.0
+    assert timeline.setpoint_at(booking.check_out + timedelta(hours=2)) == 78.0
+
+    transitions = timeline.next_transitions(now, 5)
+    assert [t['start'] for t in transitions] == [
+        booking.check_in - timedelta(hours=3),
+        booking.check_out + timedelta(hours=1),
+    ]
+    assert transitions[-1]['end'] is None
+
+def test_manual_schedule_overrides_bookings(db_session, thermostat):
+    """Test that manual schedules take precedence over booking schedules"""
+    now = datetime.utcnow().replace(microsecond=0)
+    booking = add_booking(db_session, thermostat, now + timedelta(days=1))
+    db_session.add(Schedule(
+        thermostat_id=thermostat.id,
+        schedule_type=ScheduleType.MANUAL,
+        target_temperature=68.0,
+        start_time=booking.check_in,
+        end_time=booking.check_in + timedelta(hours=6),
+    ))
+    db_session.commit()
+
+    timeline = schedule_compiler.get_timeline(thermostat, now)
+    assert timeline.setpoint_at(booking.check_in + timedelta(hours=1)) == 68.0
+    assert timeline.setpoint_at(booking.check_in + timedelta(hours=7)) == 72.0
+
+def test_timeline_recompiles_when_bookings_change(db_session, thermostat):
+    """Test that cached timelines are reused until a booking changes"""
+    now = datetime.utcnow().replace(microsecond=0)
+    first = schedule_compiler.get_timeline(thermostat, now)
+    assert schedule_compiler.get_timeline(thermostat, now) is first
+
+    booking = add_booking(db_session, thermostat, now + timedelta(days=2))
+    second = schedule_compiler.get_timeline(thermostat, now)
+    assert second is not first
+    assert second.setpoint_at(booking.check_in) == 72.0
+
+def test_timeline_lookups_outside_the_compiled_range(client, auth_headers, db_session, thermostat):
+    """Test that earlier instants raise on a timeline and are recompiled for by the endpoint"""
+    now = datetime.utcnow().replace(microsecond=0)
+    booking = add_booking(db_session, thermostat, now - timedelta(days=10))
+    timeline = schedule_compiler.get_timeline(thermostat, now)
+    with pytest.raises(ValueError):
+        timeline.setpoint_at(booking.check_in)
+
+    at = (booking.check_in + timedelta(hours=1)).isoformat()
+    response = client.get(f'/api/schedules/thermostat/{thermostat.id}/timeline?at={at}&limit=1', headers=auth_headers)
+    data = response.get_json()
+    assert data['current']['target_temperature'] == 72.0
+    assert data['transitions'][0]['start'] == (booking.check_out + timedelta(hours=1)).isoformat()
+
+    # The check-out setpoint of the past booking lasts until now.
+    assert schedule_compiler.get_timeline(thermostat, now).setpoint_at(now) == 78.0
+
+def test_upcoming_uses_compiled_triggers(client, auth_headers, db_session, thermostat):
+    """Test that upcoming booking schedules report real trigger times"""
+    booking = add_booking(db_session, thermostat, datetime.utcnow() + timedelta(days=1))
+
+    response = client.get('/api/schedules/upcoming', headers=auth_headers)
+    assert response.status_code == 200
+    triggers = {
+        item['schedule']['schedule_type']: item['trigger_time']
+        for item in response.get_json()['upcoming_schedules']
+    }
+    assert triggers['check_in'] == (booking.check_in - timedelta(hours=3)).isoformat()
+    assert triggers['check_out'] == (booking.check_out + timedelta(hours=1)).isoformat()
+    assert triggers['vacancy'] == 'In progress'
+
+def test_upcoming_includes_schedules_of_earlier_bookings(client, auth_headers, db_session, thermostat):
+    """Test that a check-out schedule still running from a past booking is reported"""
+    now = datetime.utcnow()
+    add_booking(db_session, thermostat, now - timedelta(days=10))
+    add_booking(db_session, thermostat, now - timedelta(days=5))
+    upcoming = add_booking(db_session, thermostat, now + timedelta(days=3))
+
+    response = client.get('/api/schedules/upcoming', headers=auth_headers)
+    items = response.get_json()['upcoming_schedules']
+    assert [(item['schedule']['schedule_type'], item['trigger_time']) for item in items[:2]] == [
+        ('check_out', 'In progress'),
+        ('check_in', (upcoming.check_in - timedelta(hours=3)).isoformat()),
+    ]
+    assert items[0]['end_time'] == (upcoming.check_in - timedelta(hours=3)).isoformat()
+
+def test_thermostat_timeline_endpoint(client, auth_headers, db_session, thermostat):
+    """Test the setpoint and transitions endpoint"""
+    booking = add_booking(db_session, thermostat, datetime.utcnow() + timedelta(days=1))
+    at = (booking.check_in - timedelta(hours=1)).isoformat()
+
+    response = client.get(f'/api/schedules/thermostat/{thermostat.id}/timeline?at={at}&limit=1', headers=auth_headers)
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['current']['target_temperature'] == 72.0
+    assert len(data['transitions']) == 1
+    assert data['transitions'][0]['target_temperature'] == 78.0
+
+def test_thermostat_timeline_accepts_aware_instant(client, auth_headers, db_session, thermostat):
+    """Test that an `at` with a Z suffix is looked up as naive UTC"""
+    booking = add_booking(db_session, thermostat, datetime.utcnow() + timedelta(days=1))
+    at = (booking.check_in - timedelta(hours=1)).replace(microsecond=0)
+
+    response = client.get(f'/api/schedules/thermostat/{thermostat.id}/timeline?at={at.isoformat()}Z&limit=1',
+                          headers=auth_headers)
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['at'] == at.isoformat()
+    assert data['current']['target_temperature'] == 72.0
+    assert data['transitions'][0]['target_temperature'] == 78.0
+
+def test_upcoming_is_windowed_paginated_and_query_bounded(app, client, auth_headers, db_session, thermostat):
+    """Test /upcoming pagination, window filtering and its constant query count"""
+    from sqlalchemy import event
+    from src.models.base import db
+
+    now = datetime.utcnow()
+    for day in (1, 4, 20):
+        add_booking(db_session, thermostat, now + timedelta(days=day))
+    for index in range(3):
+        extra = Thermostat(name=f'Zone {index}', device_id=f'ZONE{index}', type=ThermostatType.NEST,
+                           property_id=thermostat.property_id)
+        db_session.add(extra)
+        db_session.commit()
+        db_session.add(Schedule(thermostat_id=extra.id, schedule_type=ScheduleType.CHECK_IN,
+                                hours_before_checkin=2, target_temperature=70.0))
+    db_session.commit()
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        response = client.get('/api/schedules/upcoming?limit=3&offset=2', headers=auth_headers)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+
+    data = response.get_json()
+    # Vacancy now, plus check-in and check-out triggers for the two bookings
+    # within 7 days on the first thermostat and check-ins on the other three.
+    assert data['total'] == 1 + 2 * 2 + 3 * 2
+    assert len(data['upcoming_schedules']) == 3
+    times = [item['trigger_time'] for item in data['upcoming_schedules']]
+    assert times == sorted(times)
+    # Authentication, schedules with thermostats and properties, bookings
+    assert len(statements) <= 3
+
+def test_upcoming_accepts_aware_window_bounds(client, auth_headers, db_session, thermostat):
+    """Test that from/to with a UTC offset are compared as naive UTC"""
+    booking = add_booking(db_session, thermostat, datetime.utcnow() + timedelta(days=1))
+    start = (booking.check_in - timedelta(hours=4)).replace(microsecond=0)
+    end = start + timedelta(hours=2)
+
+    response = client.get('/api/schedules/upcoming', headers=auth_headers, query_string={
+        'from': start.isoformat() + 'Z',
+        'to': (end - timedelta(hours=2)).isoformat() + '-02:00',
+    })
+    assert response.status_code == 200
+    # The window ends 2 hours before check-in in UTC, after the check-in
+    # schedule starts; read as a wall time the -02:00 bound ends before it.
+    items = response.get_json()['upcoming_schedules']
+    assert [(item['schedule']['schedule_type'], item['trigger_time']) for item in items] == [
+        ('vacancy', start.isoformat()),
+        ('check_in', (booking.check_in - timedelta(hours=3)).isoformat()),
+    ]
+
+@pytest.mark.parametrize('query', ['limit=0', 'limit=-5', 'offset=-1'])
+def test_upcoming_rejects_out_of_range_pagination(client, auth_headers, thermostat, query):
+    """Test that a limit below 1 or a negative offset is a 400"""
+    response = client.get(f'/api/schedules/upcoming?{query}', headers=auth_headers)
+    assert response.status_code == 400
+
+def test_schedule_access_is_one_joined_query(app, client, auth_headers, db_session, thermostat):
+    """Test that a schedule, its thermostat and its owner are checked in one query"""
+    from sqlalchemy import event
+    from src.models.base import db
+
+    schedule = Schedule.query.filter_by(thermostat_id=thermostat.id).first()
+    client.get(f'/api/schedules/{schedule.id}', headers=auth_headers)
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        response = client.get(f'/api/schedules/{schedule.id}', headers=auth_headers)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+
+    assert response.status_code == 200
+    assert response.get_json()['schedule']['id'] == schedule.id
+    assert len(statements) == 1
+
+    response = client.get('/api/schedules/9999', headers=auth_headers)
+    assert response.status_code == 404
+    assert response.get_json()['error'] == 'Schedule not found'
+
+def test_access_denied_for_other_users_property(client, auth_headers, db_session, thermostat):
+    """Test that objects and property ids of another user's property are rejected"""
+    other = User(email='other@example.com', first_name='Other', last_name='User', role=UserRole.MANAGER)
+    other.set_password('password123')
+    db_session.add(other)
+    db_session.commit()
+    property = Property(name='Other Property', address='1 Elm St', city='Testville', state='TS',
+                        zip_code='12345', country='Testland', user_id=other.id)
+    db_session.add(property)
+    db_session.commit()
+    foreign = Thermostat(name='Foreign', device_id='OTHER1', type=ThermostatType.NEST, property_id=property.id)
+    db_session.add(foreign)
+    db_session.commit()
+
+    assert client.get(f'/api/thermostats/property/{thermostat.property_id}', headers=auth_headers).status_code == 200
+    assert client.get(f'/api/thermostats/property/{property.id}', headers=auth_headers).status_code == 403
+    assert client.get(f'/api/thermostats/{foreign.id}', headers=auth_headers).status_code == 403
+    assert client.get('/api/calendars/property/9999', headers=auth_headers).status_code == 404
+
+    # Reassigning the property changes access at once, in both directions
+    property.user_id = thermostat.property.user_id
+    db_session.commit()
+    assert client.get(f'/api/thermostats/property/{property.id}', headers=auth_headers).status_code == 200
+    assert client.get(f'/api/thermostats/{foreign.id}', headers=auth_headers).status_code == 200
+
+    property.user_id = other.id
+    db_session.commit()
+    assert client.get(f'/api/thermostats/property/{property.id}', headers=auth_headers).status_code == 403
@@ -43,11 +43,14 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'rest_framework',
     'corsheaders',
+    'django_celery_beat',
     'thermostats',
     'properties',
 ]
 
 MIDDLEWARE = [
+    # First, so that its budgets cover every other middleware
+    'thermostats.middleware.RequestMetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -149,6 +152,57 @@ DEFAULT_ECO_HEAT_TEMP: float = float(os.environ.get('DEFAULT_ECO_HEAT_TEMP', 62)
 # Default property time zone (used when a property does not specify its own)
 DEFAULT_PROPERTY_TIME_ZONE: str = os.environ.get('DEFAULT_PROPERTY_TIME_ZONE', 'America/Chicago')
 
+# Client cache lifetime (in seconds) for property usage statistics
+USAGE_STATISTICS_CACHE_SECONDS: int = int(os.environ.get('USAGE_STATISTICS_CACHE_SECONDS', 300))
+
+# Due-queue dispatching of scheduled actions: batch size, batches per
+# dispatcher run, how long an undispatched claim is held, and how long a
+# dispatched action's lease lasts before it is dispatched again (at most
+# SCHEDULED_ACTION_MAX_DISPATCHES times)
+SCHEDULED_ACTION_BATCH_SIZE: int = int(os.environ.get('SCHEDULED_ACTION_BATCH_SIZE', 50))
+SCHEDULED_ACTION_MAX_BATCHES: int = int(os.environ.get('SCHEDULED_ACTION_MAX_BATCHES', 20))
+SCHEDULED_ACTION_CLAIM_TIMEOUT_SECONDS: int = int(os.environ.get('SCHEDULED_ACTION_CLAIM_TIMEOUT_SECONDS', 300))
+SCHEDULED_ACTION_DISPATCH_TIMEOUT_SECONDS: int = int(os.environ.get('SCHEDULED_ACTION_DISPATCH_TIMEOUT_SECONDS', 1800))
+SCHEDULED_ACTION_MAX_DISPATCHES: int = int(os.environ.get('SCHEDULED_ACTION_MAX_DISPATCHES', 3))
+
+# Incremental calendar scanning: lookahead horizon, re-read overlap for late
+# commits, and database streaming chunk size
+CALENDAR_SCAN_LOOKAHEAD_HOURS: int = int(os.environ.get('CALENDAR_SCAN_LOOKAHEAD_HOURS', 48))
+CALENDAR_SCAN_OVERLAP_SECONDS: int = int(os.environ.get('CALENDAR_SCAN_OVERLAP_SECONDS', 300))
+CALENDAR_SCAN_CHUNK_SIZE: int = int(os.environ.get('CALENDAR_SCAN_CHUNK_SIZE', 500))
+
+# Maximum concurrent thermostats per scheduled action
+THERMOSTAT_FANOUT_MAX_WORKERS: int = int(os.environ.get('THERMOSTAT_FANOUT_MAX_WORKERS', 8))
+
+# Maximum concurrent requests per vendor account in batched execution
+VENDOR_ACCOUNT_MAX_CONCURRENCY: int = int(os.environ.get('VENDOR_ACCOUNT_MAX_CONCURRENCY', 4))
+
+# Window before the planned time over which actions are spread, and vendor
+# requests per second per worker process (0 for unlimited)
+SCHEDULED_ACTION_SPREAD_SECONDS: int = int(os.environ.get('SCHEDULED_ACTION_SPREAD_SECONDS', 900))
+VENDOR_RATE_LIMITS: dict = {
+    'nest': float(os.environ.get('NEST_RATE_LIMIT', 5)),
+    'cielo': float(os.environ.get('CIELO_RATE_LIMIT', 5)),
+    'pioneer': float(os.environ.get('PIONEER_RATE_LIMIT', 5)),
+}
+
+# Retry policy for thermostat command tasks: attempts and backoff bounds (s)
+SCHEDULED_ACTION_MAX_RETRIES: int = int(os.environ.get('SCHEDULED_ACTION_MAX_RETRIES', 5))
+SCHEDULED_ACTION_RETRY_BACKOFF: int = int(os.environ.get('SCHEDULED_ACTION_RETRY_BACKOFF', 30))
+SCHEDULED_ACTION_RETRY_BACKOFF_MAX: int = int(os.environ.get('SCHEDULED_ACTION_RETRY_BACKOFF_MAX', 600))
+
+# Fleet-wide iCal feed sync: feeds per run, concurrent downloads overall and
+# per host (with per-domain overrides), request timeout (s) and days synced
+CALENDAR_SYNC_BATCH_SIZE: int = int(os.environ.get('CALENDAR_SYNC_BATCH_SIZE', 500))
+CALENDAR_SYNC_MAX_WORKERS: int = int(os.environ.get('CALENDAR_SYNC_MAX_WORKERS', 16))
+CALENDAR_SYNC_HOST_CONCURRENCY: int = int(os.environ.get('CALENDAR_SYNC_HOST_CONCURRENCY', 4))
+CALENDAR_SYNC_HOST_LIMITS: dict = {
+    'airbnb.com': int(os.environ.get('AIRBNB_SYNC_CONCURRENCY', 4)),
+    'vrbo.com': int(os.environ.get('VRBO_SYNC_CONCURRENCY', 4)),
+}
+CALENDAR_SYNC_TIMEOUT_SECONDS: int = int(os.environ.get('CALENDAR_SYNC_TIMEOUT_SECONDS', 30))
+CALENDAR_SYNC_WINDOW_DAYS: int = int(os.environ.get('CALENDAR_SYNC_WINDOW_DAYS', 365))
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/4.2/howto/static-files/
 
@@ -160,14 +214,47 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Authenticate JWTs from their claims rather than the user row, and cache
+# the ids of each user's properties (seconds) for scoping querysets
+JWT_STATELESS_AUTH: bool = os.environ.get('JWT_STATELESS_AUTH', 'True') == 'True'
+OWNED_PROPERTY_IDS_CACHE_SECONDS: int = int(os.environ.get('OWNED_PROPERTY_IDS_CACHE_SECONDS', 300))
+TOKEN_VERSION_CACHE_SECONDS: int = int(os.environ.get('TOKEN_VERSION_CACHE_SECONDS', 300))
+
+# Shared cache for token versions and owned property ids; all web workers
+# must see the same entries, so production sets CACHE_URL (e.g. Redis)
+CACHE_URL: str = os.environ.get('CACHE_URL', '')
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+
+# Cursor pagination page size of list endpoints, and the most rows a client
+# may request with ?page_size=
+API_PAGE_SIZE: int = int(os.environ.get('API_PAGE_SIZE', 100))
+API_MAX_PAGE_SIZE: int = int(os.environ.get('API_MAX_PAGE_SIZE', 1000))
+
+# Per-request SQL and vendor HTTP budgets (0 disables one); requests over
+# budget are logged, or raise with REQUEST_BUDGET_MODE=raise
+REQUEST_QUERY_BUDGET: int = int(os.environ.get('REQUEST_QUERY_BUDGET', 50))
+REQUEST_DB_TIME_BUDGET_MS: float = float(os.environ.get('REQUEST_DB_TIME_BUDGET_MS', 500))
+REQUEST_HTTP_CALL_BUDGET: int = int(os.environ.get('REQUEST_HTTP_CALL_BUDGET', 10))
+REQUEST_HTTP_TIME_BUDGET_MS: float = float(os.environ.get('REQUEST_HTTP_TIME_BUDGET_MS', 5000))
+REQUEST_BUDGET_MODE: str = os.environ.get('REQUEST_BUDGET_MODE', 'log')
+
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'authentication.authentication.StatelessJWTAuthentication' if JWT_STATELESS_AUTH
+        else 'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_PAGINATION_CLASS': 'thermostats.pagination.CursorPagination',
+    'PAGE_SIZE': API_PAGE_SIZE,
 }
 
 # JWT Settings
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Property, Thermostat, CalendarEvent, ThermostatCommand, UsageStatistics
+from .models import Property, Thermostat, CalendarEvent, CalendarFeed, DeadLetter, ScheduledAction, ScanCheckpoint, ThermostatCommand, UsageStatistics, UsageAggregate
 
 @admin.register(Property)
 class PropertyAdmin(admin.ModelAdmin):
@@ -19,14 +19,43 @@ class CalendarEventAdmin(admin.ModelAdmin):
     list_filter = ('event_type',)
     search_fields = ('title', 'property__name', 'description')
 
+@admin.register(CalendarFeed)
+class CalendarFeedAdmin(admin.ModelAdmin):
+    list_display = ('name', 'property', 'sync_frequency', 'last_synced', 'last_error')
+    list_filter = ('sync_frequency',)
+    search_fields = ('name', 'property__name', 'url')
+
+@admin.register(ScheduledAction)
+class ScheduledActionAdmin(admin.ModelAdmin):
+    list_display = ('event', 'action_type', 'planned_time', 'status', 'task_id')
+    list_filter = ('action_type', 'status')
+    search_fields = ('event__title', 'event__property__name', 'task_id')
+
+@admin.register(ScanCheckpoint)
+class ScanCheckpointAdmin(admin.ModelAdmin):
+    list_display = ('name', 'watermark', 'horizon_end', 'updated_at')
+    search_fields = ('name',)
+
 @admin.register(ThermostatCommand)
 class ThermostatCommandAdmin(admin.ModelAdmin):
     list_display = ('thermostat', 'command_type', 'status', 'created_at')
     list_filter = ('command_type', 'status')
-    search_fields = ('thermostat__name',)
+    search_fields = ('thermostat__name', 'idempotency_key')
+
+@admin.register(DeadLetter)
+class DeadLetterAdmin(admin.ModelAdmin):
+    list_display = ('task_name', 'task_id', 'failed_at', 'replayed_at')
+    list_filter = ('task_name',)
+    search_fields = ('task_name', 'task_id', 'exception')
 
 @admin.register(UsageStatistics)
 class UsageStatisticsAdmin(admin.ModelAdmin):
     list_display = ('property', 'date', 'energy_usage', 'cost', 'savings')
     list_filter = ('date',)
     search_fields = ('property__name',)
+
+@admin.register(UsageAggregate)
+class UsageAggregateAdmin(admin.ModelAdmin):
+    list_display = ('property', 'period', 'period_start', 'days', 'energy_usage', 'cost', 'savings')
+    list_filter = ('period',)
+    search_fields = ('property__name',)
@@ -0,0 +1,76 @@
+"""
+Maintenance of precomputed usage aggregates.
+
+Daily ``UsageStatistics`` rows are rolled up into one ``UsageAggregate`` row
+per property for each calendar week (starting Monday), month and year.  The
+rollups are refreshed one bucket at a time whenever a daily row changes, so
+reading a period never has to touch the daily rows again.
+"""
+
+from datetime import timedelta
+
+from django.db.models import Avg, Count, Sum
+
+from .models import UsageAggregate, UsageStatistics
+
+PERIODS = ('week', 'month', 'year')
+
+
+def period_start(period, day):
+    """Return the first day of the ``period`` bucket containing ``day``."""
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    if period == 'year':
+        return day.replace(month=1, day=1)
+    raise ValueError(f"Unsupported period: {period}")
+
+
+def period_end(period, start):
+    """Return the first day after the ``period`` bucket starting at ``start``."""
+    if period == 'week':
+        return start + timedelta(days=7)
+    if period == 'month':
+        if start.month == 12:
+            return start.replace(year=start.year + 1, month=1)
+        return start.replace(month=start.month + 1)
+    if period == 'year':
+        return start.replace(year=start.year + 1)
+    raise ValueError(f"Unsupported period: {period}")
+
+
+def refresh_usage_aggregates(property_id, day):
+    """
+    Recompute the week, month and year aggregates that contain ``day``.
+
+    Each bucket is rebuilt from its daily rows with a single aggregate query,
+    which keeps the rollups exact even when daily rows are edited or deleted.
+    Buckets left without any daily rows are removed.
+    """
+    for period in PERIODS:
+        start = period_start(period, day)
+        totals = UsageStatistics.objects.filter(
+            property_id=property_id,
+            date__gte=start,
+            date__lt=period_end(period, start),
+        ).aggregate(
+            days=Count('id'),
+            energy_usage=Sum('energy_usage'),
+            cost=Sum('cost'),
+            savings=Sum('savings'),
+            average_temperature=Avg('average_temperature'),
+        )
+
+        if not totals['days']:
+            UsageAggregate.objects.filter(
+                property_id=property_id, period=period, period_start=start
+            ).delete()
+            continue
+
+        UsageAggregate.objects.update_or_create(
+            property_id=property_id,
+            period=period,
+            period_start=start,
+            defaults=totals,
+        )
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 class ThermostatsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'thermostats'
+
+    def ready(self):
+        # Register signal handlers
+        from . import signals  # noqa: F401
@@ -0,0 +1,386 @@
+"""
+Fleet-wide sync of external iCal feeds into CalendarEvent rows.
+
+Feeds are downloaded concurrently on a bounded thread pool that shares one
+pooled HTTP session.  Booking channels such as airbnb.com throttle clients
+that open many connections at once, so each host also gets a semaphore that
+caps how many of its feeds are downloaded in parallel.  The download threads
+only do network I/O; parsing and the database writes happen on the calling
+thread as each download completes, so the database sees one writer.
+
+Events are synced for a window that starts at midnight UTC the day before
+the sync, so the syncs of one day share it.  Downloads are conditional on the
+ETag and Last-Modified of the previous one, and a body whose hash matches the
+stored digest is not parsed again, but only while the window is the one the
+stored feed was parsed for: once it moves, recurring and far-off events may
+enter it, so the feed is downloaded and parsed in full.  A changed feed is diffed against its stored events by external id and only
+the difference is written: new events are inserted, changed ones updated
+and vanished ones kept as tombstones.  ``calendar_events_changed`` is then
+sent with the affected event ids so only their actions are rescheduled.
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone as dt_timezone
+from urllib.parse import urlparse
+from zoneinfo import ZoneInfo
+
+import icalendar
+import recurring_ical_events
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+
+from .models import CalendarEvent, CalendarFeed
+from .signals import calendar_events_changed
+
+logger = logging.getLogger(__name__)
+
+# How long after its last sync a feed falls due again.  Manual feeds are only
+# synced on request.
+SYNC_INTERVALS = {
+    'hourly': timedelta(hours=1),
+    'daily': timedelta(days=1),
+}
+
+# Fields of a CalendarEvent that a feed controls.
+FEED_EVENT_FIELDS = ('title', 'description', 'start_date', 'end_date')
+
+# Result of downloading one feed.  ``content`` is None when the feed did not
+# change or the download failed (``error`` is set in that case).
+FeedDownload = namedtuple('FeedDownload', ['content', 'etag', 'last_modified', 'error', 'seconds'])
+
+# Events to insert, events to update and events to tombstone for one feed.
+FeedDiff = namedtuple('FeedDiff', ['added', 'changed', 'removed'])
+
+
+def sync_window(now):
+    """Return the ``(start, end)`` window feeds are synced for at ``now``."""
+    start = datetime.combine((now - timedelta(days=1)).date(), datetime.min.time(), tzinfo=dt_timezone.utc)
+    return start, start + timedelta(days=settings.CALENDAR_SYNC_WINDOW_DAYS + 1)
+
+
+def window_key(window):
+    """Return how a sync window is recorded in ``CalendarFeed.feed_window``."""
+    return '/'.join(bound.isoformat() for bound in window)
+
+
+def due_feeds(now):
+    """Return the feeds due for a sync at ``now``, least recently synced first."""
+    due = Q()
+    for frequency, interval in SYNC_INTERVALS.items():
+        due |= Q(sync_frequency=frequency) & (Q(last_synced__isnull=True) | Q(last_synced__lte=now - interval))
+    return CalendarFeed.objects.filter(due).order_by(F('last_synced').asc(nulls_first=True), 'id')
+
+
+class HostLimiter:
+    """Per-host semaphores capping concurrent downloads from one channel."""
+
+    def __init__(self, limits, default):
+        self.limits = limits
+        self.default = default
+        self.semaphores = {}
+        self.lock = threading.Lock()
+
+    def key(self, url):
+        """Return the configured domain a URL belongs to, or its host."""
+        host = (urlparse(url).hostname or '').lower()
+        for domain in self.limits:
+            if host == domain or host.endswith(f'.{domain}'):
+                return domain
+        return host
+
+    def slot(self, url):
+        """Return the semaphore to hold while downloading ``url``."""
+        key = self.key(url)
+        with self.lock:
+            semaphore = self.semaphores.get(key)
+            if semaphore is None:
+                limit = self.limits.get(key, self.default)
+                semaphore = self.semaphores[key] = threading.BoundedSemaphore(max(limit, 1))
+            return semaphore
+
+
+def build_feed_session(pool_size):
+    """Build a `requests.Session` keeping up to ``pool_size`` connections per host."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=32, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def download_feed(feed, session, limiter, window):
+    """
+    Download a feed unless it is unchanged since the previous sync.
+
+    The validators of the previous download are only sent if it was parsed
+    for the same ``window``.  Runs on a worker thread, so it only reads
+    attributes already loaded on ``feed`` and never touches the database.
+    """
+    headers = {}
+    same_window = feed.feed_window == window_key(window)
+    if same_window and feed.etag:
+        headers['If-None-Match'] = feed.etag
+    if same_window and feed.last_modified:
+        headers['If-Modified-Since'] = feed.last_modified
+
+    started = time.monotonic()
+    try:
+        with limiter.slot(feed.url):
+            response = session.get(feed.url, headers=headers, timeout=settings.CALENDAR_SYNC_TIMEOUT_SECONDS)
+        if response.status_code == 304:
+            return FeedDownload(None, feed.etag, feed.last_modified, None, time.monotonic() - started)
+        response.raise_for_status()
+    except requests.RequestException as exc:
+        return FeedDownload(None, feed.etag, feed.last_modified, str(exc), time.monotonic() - started)
+    return FeedDownload(
+        response.content,
+        response.headers.get('ETag'),
+        response.headers.get('Last-Modified'),
+        None,
+        time.monotonic() - started,
+    )
+
+
+def _feed_timezone(feed):
+    try:
+        return ZoneInfo(feed.property.timezone or settings.DEFAULT_PROPERTY_TIME_ZONE)
+    except Exception:
+        return ZoneInfo(settings.TIME_ZONE)
+
+
+def _as_aware(value, tz):
+    """Convert an iCal date or datetime to an aware datetime."""
+    if not isinstance(value, datetime):
+        # All-day events (the usual Airbnb/VRBO booking) start at local midnight.
+        value = datetime.combine(value, datetime.min.time())
+    if timezone.is_naive(value):
+        return timezone.make_aware(value, timezone=tz)
+    return value
+
+
+def parse_feed(feed, content, start, end):
+    """
+    Parse the events of a feed overlapping ``[start, end]``.
+
+    Returns:
+        dict: Event fields keyed by external id.  Occurrences of recurring
+        events are keyed by UID and recurrence id.
+    """
+    tz = _feed_timezone(feed)
+    events = {}
+    calendar = icalendar.Calendar.from_ical(content)
+    recurring = {
+        str(component.get('UID', '')) for component in calendar.walk('VEVENT')
+        if 'RRULE' in component or 'RDATE' in component
+    }
+    for component in recurring_ical_events.of(calendar).between(start, end):
+        start_date = _as_aware(component.decoded('DTSTART'), tz)
+        if 'DTEND' in component:
+            end_date = _as_aware(component.decoded('DTEND'), tz)
+        else:
+            end_date = start_date + component.decoded('DURATION', timedelta(days=1))
+        external_id = str(component.get('UID', ''))
+        if external_id in recurring and 'RECURRENCE-ID' in component:
+            recurrence = component.decoded('RECURRENCE-ID')
+            external_id = f"{external_id}/{recurrence.isoformat()}"
+        events[external_id] = {
+            'title': str(component.get('SUMMARY', 'Booking'))[:100],
+            'description': str(component['DESCRIPTION']) if 'DESCRIPTION' in component else None,
+            'start_date': start_date,
+            'end_date': end_date,
+        }
+    return events
+
+
+def diff_feed_events(existing, events, window_start, window_end):
+    """
+    Compute the minimal change that makes a feed's stored events match it.
+
+    Args:
+        existing: The feed's `CalendarEvent` rows, tombstones included.
+        events: Parsed feed events keyed by external id (see `parse_feed`).
+        window_start: Start of the window the feed was parsed for.
+        window_end: End of that window.
+
+    Returns:
+        FeedDiff: Unsaved new events, changed events (with updated fields),
+        and stored events that are missing from the feed.  Events outside the
+        parsed window are never removed, and tombstones that reappear in the
+        feed count as changed.
+    """
+    by_external_id = {event.external_id: event for event in existing}
+    added = []
+    changed = []
+    for external_id, fields in events.items():
+        event = by_external_id.get(external_id)
+        if event is None:
+            added.append(CalendarEvent(event_type='booking', external_id=external_id, **fields))
+        elif event.cancelled_at is not None or any(getattr(event, name) != value for name, value in fields.items()):
+            for name, value in fields.items():
+                setattr(event, name, value)
+            event.cancelled_at = None
+            changed.append(event)
+    removed = [
+        event for event in existing
+        if event.cancelled_at is None
+        and event.external_id not in events
+        and event.end_date > window_start
+        and event.start_date < window_end
+    ]
+    return FeedDiff(added, changed, removed)
+
+
+def apply_feed_events(feed, events, now, window_start, window_end):
+    """
+    Apply a parsed feed to its CalendarEvent rows in bulk.
+
+    New events are inserted with one ``bulk_create``, changed and revived
+    events written with one ``bulk_update`` and removed events turned into
+    tombstones with one ``UPDATE``.  Unchanged events are not written, so
+    their ``updated_at`` and scheduled actions are left alone.
+
+    Returns:
+        FeedDiff: The applied change, with primary keys set on added events.
+    """
+    existing = CalendarEvent.objects.filter(
+        property_id=feed.property_id,
+        external_calendar_id=str(feed.id),
+    ).only('id', 'external_id', 'cancelled_at', *FEED_EVENT_FIELDS)
+    diff = diff_feed_events(list(existing), events, window_start, window_end)
+
+    for event in diff.added:
+        event.property_id = feed.property_id
+        event.external_calendar_id = str(feed.id)
+    for event in diff.changed:
+        # bulk_update bypasses auto_now; the calendar scan relies on it.
+        event.updated_at = now
+    CalendarEvent.objects.bulk_create(diff.added)
+    CalendarEvent.objects.bulk_update(diff.changed, [*FEED_EVENT_FIELDS, 'cancelled_at', 'updated_at'])
+    CalendarEvent.objects.filter(id__in=[event.id for event in diff.removed]).update(
+        cancelled_at=now, updated_at=now
+    )
+    return diff
+
+
+def _sync_downloaded(feed, download, now):
+    """Parse and apply one downloaded feed, returning its report entry."""
+    report = {
+        'feed': feed.id,
+        'host': urlparse(feed.url).hostname,
+        'status': 'unchanged',
+        'fetch_ms': round(download.seconds * 1000, 1),
+        'parse_ms': 0.0,
+        'apply_ms': 0.0,
+        'created': 0,
+        'updated': 0,
+        'removed': 0,
+    }
+
+    def fail(error):
+        # Validators are kept from the last good sync, so the next run
+        # downloads the feed again instead of receiving a 304.
+        report['status'] = 'failed'
+        report['error'] = feed.last_error = error
+        feed.save(update_fields=['last_error', 'updated_at'])
+        return report
+
+    if download.error is not None:
+        return fail(download.error)
+
+    window_start, window_end = sync_window(now)
+    key = window_key((window_start, window_end))
+    content_hash = hashlib.sha256(download.content).hexdigest() if download.content is not None else None
+    changed = content_hash is not None and (content_hash != feed.content_hash or key != feed.feed_window)
+    if changed:
+        started = time.monotonic()
+        try:
+            events = parse_feed(feed, download.content, window_start, window_end)
+        except Exception as exc:
+            return fail(f"Could not parse feed: {exc}")
+        parsed = time.monotonic()
+
+    feed.etag = download.etag
+    feed.last_modified = download.last_modified
+    feed.last_synced = now
+    feed.last_error = None
+    update_fields = ['etag', 'last_modified', 'last_synced', 'last_error', 'updated_at']
+    if not changed:
+        feed.save(update_fields=update_fields)
+        return report
+
+    # Each feed is applied in its own transaction, so a feed that cannot be
+    # written is rolled back and recorded as failed without holding up the
+    # others.
+    try:
+        with transaction.atomic():
+            diff = apply_feed_events(feed, events, now, window_start, window_end)
+            feed.content_hash = content_hash
+            feed.feed_window = key
+            feed.save(update_fields=update_fields + ['content_hash', 'feed_window'])
+    except Exception as exc:
+        logger.exception(f"Could not apply calendar feed {feed.id}")
+        return fail(f"Could not apply feed: {exc}")
+    report['status'] = 'synced'
+    report['parse_ms'] = round((parsed - started) * 1000, 1)
+    report['apply_ms'] = round((time.monotonic() - parsed) * 1000, 1)
+    report['created'], report['updated'], report['removed'] = map(len, diff)
+    if any(diff):
+        calendar_events_changed.send(
+            sender=CalendarFeed,
+            property_id=feed.property_id,
+            added=[event.id for event in diff.added],
+            changed=[event.id for event in diff.changed],
+            removed=[event.id for event in diff.removed],
+        )
+    return report
+
+
+def sync_feeds(feeds, now=None):
+    """
+    Download, parse and apply a set of feeds concurrently.
+
+    Args:
+        feeds: `CalendarFeed` instances with ``property`` loaded.
+        now: Sync time; defaults to ``timezone.now()``.
+
+    Returns:
+        list[dict]: One report per feed with its status, the time spent
+        downloading, parsing and writing it, and the number of events created,
+        updated and removed.  A feed that fails to download, parse or apply
+        is reported as ``failed`` with its ``last_error`` recorded, and the
+        other feeds are still synced.
+    """
+    now = now or timezone.now()
+    if not feeds:
+        return []
+
+    limiter = HostLimiter(settings.CALENDAR_SYNC_HOST_LIMITS, settings.CALENDAR_SYNC_HOST_CONCURRENCY)
+    pool_size = max([settings.CALENDAR_SYNC_HOST_CONCURRENCY, *settings.CALENDAR_SYNC_HOST_LIMITS.values()])
+    session = build_feed_session(pool_size)
+    reports = []
+    try:
+        workers = min(len(feeds), settings.CALENDAR_SYNC_MAX_WORKERS)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            window = sync_window(now)
+            futures = {pool.submit(download_feed, feed, session, limiter, window): feed for feed in feeds}
+            for future in as_completed(futures):
+                feed = futures[future]
+                report = _sync_downloaded(feed, future.result(), now)
+                logger.info(
+                    f"Calendar feed {feed.id} ({report['host']}): {report['status']}, "
+                    f"fetch {report['fetch_ms']}ms, parse {report['parse_ms']}ms, apply {report['apply_ms']}ms, "
+                    f"{report['created']} created, {report['updated']} updated, {report['removed']} removed"
+                )
+                reports.append(report)
+    finally:
+        session.close()
+    return reports
@@ -0,0 +1,61 @@
+"""
+Per-request cost accounting.
+
+`RequestMetricsMiddleware` counts the SQL statements each request runs and
+the time spent in them, and the HTTP calls made to thermostat vendors and
+calendar hosts through `requests` and the time spent waiting on them.  Every
+response gets a ``Server-Timing`` header, which browser devtools show next
+to the request, and one JSON log line on this module's logger, e.g.::
+
+    {"method": "GET", "path": "/api/thermostats/", "status": 200, "duration_ms": 8.1,
+     "queries": 1, "db_ms": 0.4, "http_calls": 0, "http_ms": 0.0}
+
+A request that goes over one of the ``REQUEST_*_BUDGET`` settings (0
+disables it) is logged as a warning with the budgets it exceeded.  With
+``REQUEST_BUDGET_MODE = 'raise'`` it raises `BudgetExceeded` instead, so
+running the tests with ``REQUEST_BUDGET_MODE=raise`` fails them on N+1
+regressions.
+
+The accounting itself, including the counting of HTTP calls, is shared with
+the Flask app (see `src.utils.request_costs`).  Place the middleware first
+so that the budgets cover authentication too.
+"""
+
+import logging
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+# BudgetExceeded is re-exported for callers catching it from here.
+from src.utils.request_costs import BudgetExceeded, current_metrics, finish_request, report, start_request
+
+logger = logging.getLogger(__name__)
+
+
+class RequestMetricsMiddleware:
+    """Report each request's SQL and vendor HTTP costs and check them against the budgets."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = start_request()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(current_metrics().execute_wrapper))
+                response = self.get_response(request)
+        finally:
+            metrics = finish_request(token)
+
+        budgets = (
+            settings.REQUEST_QUERY_BUDGET,
+            settings.REQUEST_DB_TIME_BUDGET_MS,
+            settings.REQUEST_HTTP_CALL_BUDGET,
+            settings.REQUEST_HTTP_TIME_BUDGET_MS,
+        )
+        response['Server-Timing'] = report(
+            logger, request.method, request.path, response.status_code, metrics, budgets, settings.REQUEST_BUDGET_MODE
+        )
+        return response
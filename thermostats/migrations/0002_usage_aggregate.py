@@ -0,0 +1,59 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:23
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, Sum
+from django.db.models.functions import TruncMonth, TruncWeek, TruncYear
+import django.db.models.deletion
+
+
+def backfill_usage_aggregates(apps, schema_editor):
+    """Roll existing daily statistics up into week, month and year rows."""
+    UsageStatistics = apps.get_model('thermostats', 'UsageStatistics')
+    UsageAggregate = apps.get_model('thermostats', 'UsageAggregate')
+
+    rows = []
+    for period, trunc in (('week', TruncWeek), ('month', TruncMonth), ('year', TruncYear)):
+        buckets = (
+            UsageStatistics.objects
+            .annotate(period_start=trunc('date'))
+            .values('property_id', 'period_start')
+            .annotate(
+                days=Count('id'),
+                energy_usage=Sum('energy_usage'),
+                cost=Sum('cost'),
+                savings=Sum('savings'),
+                average_temperature=Avg('average_temperature'),
+            )
+        )
+        rows.extend(UsageAggregate(period=period, **bucket) for bucket in buckets)
+    UsageAggregate.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('thermostats', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UsageAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('week', 'Week'), ('month', 'Month'), ('year', 'Year')], max_length=10)),
+                ('period_start', models.DateField()),
+                ('days', models.PositiveIntegerField(default=0, help_text='Number of daily rows in the period')),
+                ('energy_usage', models.FloatField(default=0, help_text='Energy usage in kWh')),
+                ('cost', models.FloatField(default=0, help_text='Cost in USD')),
+                ('savings', models.FloatField(blank=True, help_text='Estimated savings in USD', null=True)),
+                ('average_temperature', models.FloatField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('property', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usage_aggregates', to='thermostats.property')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='usageaggregate',
+            constraint=models.UniqueConstraint(fields=('property', 'period', 'period_start'), name='unique_usage_aggregate'),
+        ),
+        migrations.RunPython(backfill_usage_aggregates, migrations.RunPython.noop),
+    ]
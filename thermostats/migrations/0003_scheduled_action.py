@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:24
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('thermostats', '0002_usage_aggregate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduledAction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action_type', models.CharField(choices=[('pre_arrival', 'Pre-arrival'), ('post_checkout', 'Post-checkout')], max_length=20)),
+                ('planned_time', models.DateTimeField()),
+                ('task_id', models.CharField(blank=True, max_length=255, null=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('superseded', 'Superseded'), ('completed', 'Completed')], default='pending', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scheduled_actions', to='thermostats.calendarevent')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='scheduledaction',
+            constraint=models.UniqueConstraint(fields=('event', 'action_type', 'planned_time'), name='unique_scheduled_action'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:26
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def populate_due_at(apps, schema_editor):
+    """
+    Give existing ledger rows a due time.
+
+    Pending rows recorded before the due queue existed already have an ETA
+    task in the broker, so they are marked dispatched to keep the dispatcher
+    from sending them a second time.
+    """
+    ScheduledAction = apps.get_model('thermostats', 'ScheduledAction')
+    ScheduledAction.objects.update(due_at=F('planned_time'))
+    ScheduledAction.objects.filter(status='pending', task_id__isnull=False).update(status='dispatched')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('thermostats', '0003_scheduled_action'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scheduledaction',
+            name='claim_token',
+            field=models.CharField(blank=True, db_index=True, max_length=32, null=True),
+        ),
+        migrations.AddField(
+            model_name='scheduledaction',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='scheduledaction',
+            name='due_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(populate_due_at, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='scheduledaction',
+            name='due_at',
+            field=models.DateTimeField(),
+        ),
+        migrations.AlterField(
+            model_name='scheduledaction',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('claimed', 'Claimed'), ('dispatched', 'Dispatched'), ('superseded', 'Superseded'), ('completed', 'Completed')], default='pending', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='scheduledaction',
+            index=models.Index(fields=['due_at', 'status'], name='scheduled_action_due_idx'),
+        ),
+    ]
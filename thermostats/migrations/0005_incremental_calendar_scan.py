@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('thermostats', '0004_scheduled_action_due_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScanCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('watermark', models.DateTimeField(blank=True, null=True)),
+                ('horizon_end', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='calendarevent',
+            index=models.Index(fields=['updated_at'], name='calendar_event_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='calendarevent',
+            index=models.Index(fields=['start_date'], name='calendar_event_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='calendarevent',
+            index=models.Index(fields=['end_date'], name='calendar_event_end_idx'),
+        ),
+    ]
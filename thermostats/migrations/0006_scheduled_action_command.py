@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('thermostats', '0005_incremental_calendar_scan'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='thermostatcommand',
+            name='command_type',
+            field=models.CharField(choices=[('set_temperature', 'Set Temperature'), ('set_mode', 'Set Mode'), ('set_schedule', 'Set Schedule'), ('scheduled_action', 'Scheduled Action'), ('other', 'Other')], max_length=20),
+        ),
+    ]
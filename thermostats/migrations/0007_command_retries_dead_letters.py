@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('thermostats', '0006_scheduled_action_command'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeadLetter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task_name', models.CharField(max_length=255)),
+                ('task_id', models.CharField(blank=True, max_length=255, null=True)),
+                ('args', models.JSONField(default=list)),
+                ('kwargs', models.JSONField(default=dict)),
+                ('exception', models.TextField()),
+                ('traceback', models.TextField(blank=True)),
+                ('failed_at', models.DateTimeField(auto_now_add=True)),
+                ('replayed_at', models.DateTimeField(blank=True, null=True)),
+                ('replay_task_id', models.CharField(blank=True, max_length=255, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='thermostatcommand',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=255, null=True, unique=True),
+        ),
+    ]
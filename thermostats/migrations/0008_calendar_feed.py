@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('thermostats', '0007_command_retries_dead_letters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CalendarFeed',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('url', models.URLField(max_length=1024)),
+                ('sync_frequency', models.CharField(choices=[('hourly', 'Hourly'), ('daily', 'Daily'), ('manual', 'Manual')], default='hourly', max_length=10)),
+                ('last_synced', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True, null=True)),
+                ('etag', models.CharField(blank=True, max_length=255, null=True)),
+                ('last_modified', models.CharField(blank=True, max_length=64, null=True)),
+                ('content_hash', models.CharField(blank=True, max_length=64, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('property', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='calendar_feeds', to='thermostats.property')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['sync_frequency', 'last_synced'], name='calendar_feed_due_idx')],
+            },
+        ),
+    ]
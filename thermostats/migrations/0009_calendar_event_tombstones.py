@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('thermostats', '0008_calendar_feed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='calendarevent',
+            name='cancelled_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='calendarevent',
+            index=models.Index(fields=['external_calendar_id', 'external_id'], name='calendar_event_external_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('thermostats', '0009_calendar_event_tombstones'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='calendarevent',
+            name='calendar_event_start_idx',
+        ),
+        migrations.AddIndex(
+            model_name='calendarevent',
+            index=models.Index(fields=['start_date', 'id'], name='calendar_event_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usagestatistics',
+            index=models.Index(fields=['date', 'id'], name='usage_statistics_date_idx'),
+        ),
+    ]
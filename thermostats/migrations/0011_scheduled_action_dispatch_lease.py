@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('thermostats', '0010_cursor_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scheduledaction',
+            name='dispatch_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('thermostats', '0011_scheduled_action_dispatch_lease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='calendarfeed',
+            name='feed_window',
+            field=models.CharField(blank=True, max_length=128, null=True),
+        ),
+    ]
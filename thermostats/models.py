@@ -33,6 +33,15 @@ class Property(models.Model):
         help_text='Timezone of the property, e.g. America/Chicago'
     )
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the owner the row was loaded with so that reassigning the
+        # property refreshes the cached property ids of both owners.
+        if 'owner_id' in field_names:
+            instance._original_owner_id = instance.owner_id
+        return instance
+    
     def __str__(self):
         return self.name
     
@@ -98,10 +107,128 @@ class CalendarEvent(models.Model):
     # External calendar sync info
     external_id = models.CharField(max_length=255, blank=True, null=True)
     external_calendar_id = models.CharField(max_length=255, blank=True, null=True)
+    # Set when the event disappears from its external calendar.  The row is
+    # kept as a tombstone so the scan can cancel its pending actions and a
+    # booking that reappears is revived rather than duplicated.
+    cancelled_at = models.DateTimeField(null=True, blank=True)
     
     def __str__(self):
         return f"{self.title} ({self.start_date.strftime('%Y-%m-%d')})"
 
+    class Meta:
+        # The incremental calendar scan reads changed events by `updated_at`
+        # and events entering its lookahead by `start_date`/`end_date`; feed
+        # syncs match events by their external ids.  The API pages events by
+        # `(start_date, id)`.
+        indexes = [
+            models.Index(fields=['updated_at'], name='calendar_event_updated_idx'),
+            models.Index(fields=['start_date', 'id'], name='calendar_event_start_idx'),
+            models.Index(fields=['end_date'], name='calendar_event_end_idx'),
+            models.Index(fields=['external_calendar_id', 'external_id'], name='calendar_event_external_idx'),
+        ]
+
+
+class CalendarFeed(models.Model):
+    """External iCal feed (Airbnb, VRBO, ...) whose events are synced into CalendarEvent.
+
+    ``thermostats.tasks.sync_calendar_feeds`` fetches every feed that is due
+    according to ``sync_frequency`` and ``last_synced``.  Synced events carry
+    the feed's id in ``external_calendar_id`` and the iCal UID in
+    ``external_id``.  The validators and body hash of the last download let
+    unchanged feeds be skipped without parsing them, as long as the sync
+    window is still the ``feed_window`` they were parsed for.
+    """
+    SYNC_FREQUENCIES = [
+        ('hourly', 'Hourly'),
+        ('daily', 'Daily'),
+        ('manual', 'Manual'),
+    ]
+
+    property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='calendar_feeds')
+    name = models.CharField(max_length=100)
+    url = models.URLField(max_length=1024)
+    sync_frequency = models.CharField(max_length=10, choices=SYNC_FREQUENCIES, default='hourly')
+    last_synced = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, null=True)
+    etag = models.CharField(max_length=255, blank=True, null=True)
+    last_modified = models.CharField(max_length=64, blank=True, null=True)
+    content_hash = models.CharField(max_length=64, blank=True, null=True)
+    feed_window = models.CharField(max_length=128, blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} feed of property {self.property_id}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['sync_frequency', 'last_synced'], name='calendar_feed_due_idx'),
+        ]
+
+
+class ScheduledAction(models.Model):
+    """Due queue of pre-arrival and post-checkout actions for calendar events.
+
+    The periodic calendar scan records each action with the time it falls due
+    instead of queueing a Celery task with an ETA.  The unique key on
+    ``(event, action_type, planned_time)`` lets the scan recognise actions it
+    has already recorded, and ``thermostats.tasks.dispatch_due_actions``
+    claims rows through the ``(due_at, status)`` index once they are due.
+    ``claimed_at`` doubles as the lease of a dispatched row, and
+    ``dispatch_count`` caps how often a lapsed lease is dispatched again.
+    """
+    ACTION_TYPES = [
+        ('pre_arrival', 'Pre-arrival'),
+        ('post_checkout', 'Post-checkout'),
+    ]
+
+    ACTION_STATUS = [
+        ('pending', 'Pending'),
+        ('claimed', 'Claimed'),
+        ('dispatched', 'Dispatched'),
+        ('superseded', 'Superseded'),
+        ('completed', 'Completed'),
+    ]
+
+    event = models.ForeignKey(CalendarEvent, on_delete=models.CASCADE, related_name='scheduled_actions')
+    action_type = models.CharField(max_length=20, choices=ACTION_TYPES)
+    planned_time = models.DateTimeField()
+    due_at = models.DateTimeField()
+    task_id = models.CharField(max_length=255, blank=True, null=True)
+    status = models.CharField(max_length=20, choices=ACTION_STATUS, default='pending')
+    claim_token = models.CharField(max_length=32, blank=True, null=True, db_index=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    dispatch_count = models.PositiveSmallIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.get_action_type_display()} for event {self.event_id} at {self.planned_time}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'action_type', 'planned_time'], name='unique_scheduled_action'),
+        ]
+        indexes = [
+            models.Index(fields=['due_at', 'status'], name='scheduled_action_due_idx'),
+        ]
+
+
+class ScanCheckpoint(models.Model):
+    """Progress marker for an incremental periodic scan.
+
+    ``watermark`` is the latest ``updated_at`` the scan has processed and
+    ``horizon_end`` is how far ahead its lookahead window reached, so the next
+    run only reads rows changed since then or newly entering the window.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    watermark = models.DateTimeField(null=True, blank=True)
+    horizon_end = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} checkpoint at {self.watermark}"
+
 
 class ThermostatCommand(models.Model):
     """Model for tracking commands sent to thermostats"""
@@ -109,6 +236,7 @@ class ThermostatCommand(models.Model):
         ('set_temperature', 'Set Temperature'),
         ('set_mode', 'Set Mode'),
         ('set_schedule', 'Set Schedule'),
+        ('scheduled_action', 'Scheduled Action'),
         ('other', 'Other'),
     ]
     
@@ -124,6 +252,9 @@ class ThermostatCommand(models.Model):
     parameters = models.JSONField()
     status = models.CharField(max_length=10, choices=COMMAND_STATUS, default='pending')
     result = models.JSONField(null=True, blank=True)
+    # Identifies a scheduled command across task retries so that a retry
+    # reuses the record and skips commands that already succeeded.
+    idempotency_key = models.CharField(max_length=255, unique=True, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -131,6 +262,27 @@ class ThermostatCommand(models.Model):
         return f"{self.get_command_type_display()} to {self.thermostat.name}"
 
 
+class DeadLetter(models.Model):
+    """A Celery task that failed after exhausting its retries.
+
+    Rows are written by ``thermostats.tasks.DeadLetteringTask`` with the task's
+    name and arguments so that an admin can replay them once the underlying
+    problem (e.g. a vendor outage) is resolved.
+    """
+    task_name = models.CharField(max_length=255)
+    task_id = models.CharField(max_length=255, blank=True, null=True)
+    args = models.JSONField(default=list)
+    kwargs = models.JSONField(default=dict)
+    exception = models.TextField()
+    traceback = models.TextField(blank=True)
+    failed_at = models.DateTimeField(auto_now_add=True)
+    replayed_at = models.DateTimeField(null=True, blank=True)
+    replay_task_id = models.CharField(max_length=255, blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.task_name} failed at {self.failed_at}"
+
+
 class UsageStatistics(models.Model):
     """Model for tracking energy usage and savings"""
     property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='statistics')
@@ -140,8 +292,53 @@ class UsageStatistics(models.Model):
     savings = models.FloatField(help_text="Estimated savings in USD", null=True, blank=True)
     average_temperature = models.FloatField(null=True, blank=True)
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember which aggregate buckets the row belonged to when loaded so
+        # that moving it to another day refreshes both old and new buckets.
+        if 'property_id' in field_names and 'date' in field_names:
+            instance._original_bucket = (instance.property_id, instance.date)
+        return instance
+
     def __str__(self):
         return f"Statistics for {self.property.name} on {self.date}"
-    
+
     class Meta:
         verbose_name_plural = "Usage statistics"
+        # The API pages daily rows by `(date, id)`.
+        indexes = [
+            models.Index(fields=['date', 'id'], name='usage_statistics_date_idx'),
+        ]
+
+
+class UsageAggregate(models.Model):
+    """Precomputed weekly, monthly and yearly rollups of UsageStatistics.
+
+    Rows are maintained by the signal handlers in ``thermostats.signals``
+    whenever a daily ``UsageStatistics`` row is saved or deleted, so period
+    views read a single row instead of re-aggregating every day in the range.
+    """
+    PERIODS = [
+        ('week', 'Week'),
+        ('month', 'Month'),
+        ('year', 'Year'),
+    ]
+
+    property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='usage_aggregates')
+    period = models.CharField(max_length=10, choices=PERIODS)
+    period_start = models.DateField()
+    days = models.PositiveIntegerField(default=0, help_text="Number of daily rows in the period")
+    energy_usage = models.FloatField(default=0, help_text="Energy usage in kWh")
+    cost = models.FloatField(default=0, help_text="Cost in USD")
+    savings = models.FloatField(null=True, blank=True, help_text="Estimated savings in USD")
+    average_temperature = models.FloatField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.get_period_display()} statistics for property {self.property_id} from {self.period_start}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['property', 'period', 'period_start'], name='unique_usage_aggregate'),
+        ]
@@ -0,0 +1,40 @@
+"""
+Cached ids of the properties each user owns.
+
+The viewsets scope every queryset to the user's properties.  Filtering with
+``property__owner=user`` joins (or subqueries) the property table on every
+request.  Filtering by a cached list of property ids instead turns each read
+endpoint into a single query on the indexed ``property_id`` column.
+
+Entries live in the default cache for ``OWNED_PROPERTY_IDS_CACHE_SECONDS``.
+They are dropped whenever a property is created, deleted or given a new owner
+(see `thermostats.signals`).
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+def _key(user_id):
+    return f'owned-property-ids:{user_id}'
+
+
+def owned_property_ids(user):
+    """Return the ids of the properties owned by ``user`` (a User or TokenUser)."""
+    key = _key(user.pk)
+    property_ids = cache.get(key)
+    if property_ids is None:
+        from .models import Property
+        property_ids = list(Property.objects.filter(owner_id=user.pk).values_list('id', flat=True))
+        cache.set(key, property_ids, settings.OWNED_PROPERTY_IDS_CACHE_SECONDS)
+    return property_ids
+
+
+def invalidate_owned_property_ids(*user_ids):
+    """Drop the cached property ids of the given users."""
+    keys = [_key(user_id) for user_id in user_ids if user_id is not None]
+    cache.delete_many(keys)
+    # A request running alongside the transaction may cache the old ids
+    # again before it commits.
+    transaction.on_commit(lambda: cache.delete_many(keys))
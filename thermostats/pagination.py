@@ -0,0 +1,48 @@
+"""
+Cursor pagination for the API's list endpoints.
+
+`CursorPagination` is the default pagination class (see ``REST_FRAMEWORK``).
+Pages hold ``PAGE_SIZE`` rows; clients may ask for other sizes with
+``?page_size=`` up to ``API_MAX_PAGE_SIZE``.  Responses carry ``next`` and
+``previous`` cursor links instead of page numbers.
+
+A cursor holds the value of the *first* ordering field at the page boundary,
+so each page is a seek on that field alone (``WHERE start_date > ... ORDER BY
+start_date, id LIMIT n``).  Rows sharing the boundary value are skipped with
+an ``OFFSET`` counted from it, which stays small as long as few rows share a
+value.  The other fields only make the order deterministic.  A page therefore
+costs the same however deep it is, provided the first field is nearly unique
+and the whole ordering is backed by an index.  Views whose rows are naturally
+read by date pick one of the subclasses below; the ``id`` orderings are
+unique and seek exactly.
+"""
+
+from django.conf import settings
+from rest_framework import pagination
+
+
+class CursorPagination(pagination.CursorPagination):
+    """Pages in primary key order."""
+    ordering = ('id',)
+    page_size_query_param = 'page_size'
+    max_page_size = settings.API_MAX_PAGE_SIZE
+
+
+class NewestFirstCursorPagination(CursorPagination):
+    """Pages in reverse primary key order, newest rows first."""
+    ordering = ('-id',)
+
+
+class StartDateCursorPagination(CursorPagination):
+    """Pages calendar events by ``start_date``, ties in ``id`` order."""
+    ordering = ('start_date', 'id')
+
+
+class DateCursorPagination(CursorPagination):
+    """Pages daily rows by ``date``, ties in ``id`` order."""
+    ordering = ('date', 'id')
+
+
+class TimestampCursorPagination(CursorPagination):
+    """Pages logs by ``timestamp``, newest first, ties in ``id`` order."""
+    ordering = ('-timestamp', '-id')
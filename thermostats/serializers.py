@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Property, Thermostat, CalendarEvent, ThermostatCommand, UsageStatistics
+from .models import Property, Thermostat, CalendarEvent, DeadLetter, ThermostatCommand, UsageStatistics, UsageAggregate
 
 class PropertySerializer(serializers.ModelSerializer):
     class Meta:
@@ -9,7 +9,8 @@ class PropertySerializer(serializers.ModelSerializer):
     
     def create(self, validated_data):
         # Automatically assign the current user as the owner
-        validated_data['owner'] = self.context['request'].user
+        # (request.user may be a stateless token user, so assign by id)
+        validated_data['owner_id'] = self.context['request'].user.pk
         return super().create(validated_data)
 
 class ThermostatSerializer(serializers.ModelSerializer):
@@ -32,8 +33,21 @@ class ThermostatCommandSerializer(serializers.ModelSerializer):
         fields = ['id', 'thermostat', 'command_type', 'parameters', 'status', 'result', 'created_at', 'updated_at']
         read_only_fields = ['id', 'status', 'result', 'created_at', 'updated_at']
 
+class DeadLetterSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DeadLetter
+        fields = ['id', 'task_name', 'task_id', 'args', 'kwargs', 'exception', 'traceback',
+                 'failed_at', 'replayed_at', 'replay_task_id']
+        read_only_fields = fields
+
 class UsageStatisticsSerializer(serializers.ModelSerializer):
     class Meta:
         model = UsageStatistics
         fields = ['id', 'property', 'date', 'energy_usage', 'cost', 'savings', 'average_temperature']
         read_only_fields = ['id']
+
+class UsageAggregateSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UsageAggregate
+        fields = ['period', 'period_start', 'days', 'energy_usage', 'cost', 'savings', 'average_temperature', 'updated_at']
+        read_only_fields = fields
@@ -0,0 +1,63 @@
+"""
+Signals and signal handlers for the thermostats application.
+
+Keeps the precomputed ``UsageAggregate`` rows in step with the daily
+``UsageStatistics`` rows they summarise.  Bulk queryset operations bypass
+these signals; callers using them should call
+``thermostats.aggregates.refresh_usage_aggregates`` for the affected days.
+
+The cached ids of the properties each user owns (``thermostats.ownership``)
+are dropped whenever a property is created, deleted or reassigned.
+
+Calendar syncs write events in bulk and announce what they changed with
+``calendar_events_changed``, whose handler reschedules the pre-arrival and
+post-checkout actions of just those events.
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from .aggregates import refresh_usage_aggregates
+from .models import Property, UsageStatistics
+from .ownership import invalidate_owned_property_ids
+
+# Sent after a calendar sync committed changes to a property's events, with
+# ``property_id`` and the ids of the ``added``, ``changed`` and ``removed``
+# (tombstoned) events.
+calendar_events_changed = Signal()
+
+
+@receiver(post_save, sender=UsageStatistics)
+def usage_statistics_saved(sender, instance, **kwargs):
+    refresh_usage_aggregates(instance.property_id, instance.date)
+
+    # If the row moved to another day or property, the bucket it came from
+    # needs refreshing too.
+    original = getattr(instance, '_original_bucket', None)
+    if original and original != (instance.property_id, instance.date):
+        refresh_usage_aggregates(*original)
+    instance._original_bucket = (instance.property_id, instance.date)
+
+
+@receiver(post_delete, sender=UsageStatistics)
+def usage_statistics_deleted(sender, instance, **kwargs):
+    refresh_usage_aggregates(instance.property_id, instance.date)
+
+
+@receiver(post_save, sender=Property)
+def property_saved(sender, instance, created, **kwargs):
+    original = getattr(instance, '_original_owner_id', None)
+    if created or original != instance.owner_id:
+        invalidate_owned_property_ids(instance.owner_id, original)
+    instance._original_owner_id = instance.owner_id
+
+
+@receiver(post_delete, sender=Property)
+def property_deleted(sender, instance, **kwargs):
+    invalidate_owned_property_ids(instance.owner_id)
+
+
+@receiver(calendar_events_changed)
+def calendar_events_synced(sender, added, changed, removed, **kwargs):
+    from .tasks import reschedule_events
+    reschedule_events(added + changed + removed)
@@ -4,137 +4,727 @@ Celery tasks for the thermostats application.
 These tasks are responsible for scheduling and executing temperature and mode
 adjustments around calendar events.  When a booking is about to start, we
 pre‑condition the property by setting the HVAC system to an occupied
-temperature.  After checkout, we switch to an eco/off setting.
+temperature.  After checkout, we switch to an eco/off setting.  Each action
+is applied to every thermostat of the property concurrently, and batches of
+due actions are grouped by vendor account.
 
-Periodic scanning (via Celery beat) looks ahead to upcoming events and
-schedules the appropriate actions using `apply_async` with an ETA.
+External iCal feeds are synced into calendar events by a periodic task that
+downloads every due feed concurrently (see `thermostats.calendar_sync`).
+Periodic scanning (via Celery beat) incrementally picks up changed events
+and events entering a lookahead horizon, and records the appropriate actions
+in the `ScheduledAction` table with the time they fall due.  Nothing is
+handed to the broker ahead of time: a short‑interval dispatcher claims the
+rows that are due and sends them to the workers in batches, so worker memory
+stays bounded and restarts do not redeliver days of ETA tasks.
 """
 
+import logging
+import time
+import uuid
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
+from functools import lru_cache
+from itertools import chain
 
-from celery import shared_task
+from celery import Task, shared_task
 from django.conf import settings
+from django.db import connection, connections as db_connections, transaction
+from django.db.models import F, Prefetch, Q
 from django.utils import timezone
 from zoneinfo import ZoneInfo
 
-from .models import CalendarEvent
-from .thermostat_adapters import get_thermostat_adapter
+from .calendar_sync import due_feeds, sync_feeds
+from .models import CalendarEvent, CalendarFeed, DeadLetter, ScanCheckpoint, ScheduledAction, ThermostatCommand
+from .throttling import get_vendor_limiter, spread_due_time
+from .thermostat_adapters import build_vendor_session, get_bulk_applier, get_thermostat_adapter, vendor_account_key
 
+logger = logging.getLogger(__name__)
 
-@shared_task
-def pre_arrival_action(event_id: int) -> None:
+# Ledger states in which an action may still run.
+LIVE_ACTION_STATUSES = ('pending', 'claimed', 'dispatched')
+
+
+def _action_is_live(action_id) -> bool:
+    """
+    Return whether a ledger entry still wants its action to run.
+
+    An event can move after its action was handed to a worker, so the
+    executing task double-checks the ledger before touching a thermostat.
+    """
+    if action_id is None:
+        return True
+    return ScheduledAction.objects.filter(id=action_id, status__in=LIVE_ACTION_STATUSES).exists()
+
+
+def _complete_action(action_id) -> None:
+    if action_id is not None:
+        ScheduledAction.objects.filter(id=action_id, status__in=LIVE_ACTION_STATUSES).update(
+            status='completed', updated_at=timezone.now()
+        )
+
+
+def _action_setting(action_type):
+    """Return the ``(mode, temperature)`` a scheduled action applies."""
+    if action_type == 'pre_arrival':
+        # Choose the occupied temperature.  For now we always cool to the default.
+        # In the future this could inspect the season or per‑property preferences.
+        return 'cool', settings.DEFAULT_COOL_TEMP
+    # Use eco temperatures; for simplicity we'll apply the cooling eco value.
+    return 'off', settings.DEFAULT_ECO_COOL_TEMP
+
+
+def _apply_setting(thermostat, mode, temperature, session=None):
+    """
+    Set the mode and target temperature of a single thermostat.
+
+    Errors are returned rather than raised so one failing device does not
+    affect the others.
+
+    Returns:
+        tuple: ``(succeeded, result)`` where ``result`` is stored on the
+        device's `ThermostatCommand`.
+    """
+    try:
+        adapter = get_thermostat_adapter(thermostat, session=session)
+        result = {
+            'mode': adapter.set_mode(mode),
+            'temperature': adapter.set_temperature(temperature),
+        }
+        # Adapters report vendor errors by returning False.
+        return all(result.values()), result
+    except Exception as exc:
+        return False, {'error': str(exc)}
+
+
+def _run_lane(lane):
+    """
+    Apply a lane of ``(index, job, mode, temperature, session)`` entries in
+    order, pacing calls to the vendor's rate limit.
+    """
+    outcomes = []
+    for index, job, mode, temperature, session in lane:
+        limiter = get_vendor_limiter(job.thermostat.brand)
+        if limiter is not None:
+            # Each setting is a mode call and a temperature call.  Never hold
+            # an action back past its planned time.
+            wait_until = None
+            if job.deadline is not None:
+                wait_until = time.monotonic() + (job.deadline - timezone.now()).total_seconds()
+            limiter.acquire(2, deadline=wait_until)
+        outcomes.append((index, _apply_setting(job.thermostat, mode, temperature, session=session)))
+    return outcomes
+
+
+def _run_lane_in_thread(lane):
+    try:
+        return _run_lane(lane)
+    finally:
+        # Adapters may touch the database from the worker thread; release its
+        # connection instead of leaking one per thread.
+        db_connections.close_all()
+
+
+def _apply_bulk(applier, thermostats, mode, temperature):
+    try:
+        flags = applier(thermostats, mode, temperature)
+    except Exception as exc:
+        return [(False, {'error': str(exc)})] * len(thermostats)
+    return [(bool(ok), {'mode': ok, 'temperature': ok, 'bulk': True}) for ok in flags]
+
+
+# One thermostat command to issue.  ``deadline`` is the latest acceptable time
+# (or None) and ``idempotency_key`` identifies the command across retries.
+CommandJob = namedtuple('CommandJob', ['thermostat', 'action_type', 'event_id', 'deadline', 'idempotency_key'])
+
+
+class ThermostatCommandError(Exception):
+    """Raised after a run in which at least one thermostat command failed."""
+
+
+def _command_records(jobs, settings_by_job):
+    """
+    Return one `ThermostatCommand` per job, reusing records from earlier attempts.
+
+    Records are looked up by idempotency key, so a retried task finds the
+    commands it already issued instead of creating duplicates.
+    """
+    keys = [job.idempotency_key for job in jobs if job.idempotency_key]
+    existing = {
+        command.idempotency_key: command
+        for command in ThermostatCommand.objects.filter(idempotency_key__in=keys)
+    }
+    records = [existing.get(job.idempotency_key) for job in jobs]
+    missing = [index for index, record in enumerate(records) if record is None]
+    created = ThermostatCommand.objects.bulk_create([
+        ThermostatCommand(
+            thermostat=jobs[index].thermostat,
+            command_type='scheduled_action',
+            parameters={
+                'action': jobs[index].action_type,
+                'mode': settings_by_job[index][0],
+                'temperature': settings_by_job[index][1],
+            },
+            idempotency_key=jobs[index].idempotency_key,
+        )
+        for index in missing
+    ])
+    for index, record in zip(missing, created):
+        records[index] = record
+    return records
+
+
+def _apply_to_thermostats(jobs):
+    """
+    Apply scheduled action settings to thermostats, batched by vendor account.
+
+    ``jobs`` is a list of `CommandJob`.  Each job gets its own idempotent
+    `ThermostatCommand` record which moves from pending to sent to success
+    or failed; jobs whose command already succeeded on an earlier attempt are
+    not sent again.  The remaining jobs are grouped by vendor account and
+    setting: a group whose backend has a bulk endpoint is applied in a single
+    call, otherwise the group shares one HTTP session and is split into at
+    most `VENDOR_ACCOUNT_MAX_CONCURRENCY` lanes that run concurrently on a
+    bounded thread pool.  A burst of simultaneous actions therefore becomes a
+    few well-shaped batches per account, and a multi-zone property takes
+    about as long as one vendor call rather than the sum.
+
+    Returns:
+        list[ThermostatCommand]: The command recorded for each job.
+    """
+    if not jobs:
+        return []
+
+    settings_by_job = [_action_setting(job.action_type) for job in jobs]
+    commands = _command_records(jobs, settings_by_job)
+    todo = [index for index, command in enumerate(commands) if command.status != 'success']
+    if not todo:
+        return commands
+
+    now = timezone.now()
+    ThermostatCommand.objects.filter(id__in=[commands[index].id for index in todo]).update(
+        status='sent', updated_at=now
+    )
+
+    groups = defaultdict(list)
+    for index in todo:
+        groups[(vendor_account_key(jobs[index].thermostat), settings_by_job[index])].append(index)
+
+    outcomes = {}
+    lanes = []
+    sessions = []
+    width = settings.VENDOR_ACCOUNT_MAX_CONCURRENCY
+    for ((brand, _, _), (mode, temperature)), indexes in groups.items():
+        thermostats = [jobs[index].thermostat for index in indexes]
+        applier = get_bulk_applier(brand)
+        if applier is not None:
+            outcomes.update(zip(indexes, _apply_bulk(applier, thermostats, mode, temperature)))
+            continue
+
+        session = build_vendor_session(width)
+        sessions.append(session)
+        for offset in range(min(width, len(indexes))):
+            lanes.append([
+                (index, jobs[index], mode, temperature, session)
+                for index in indexes[offset::width]
+            ])
+
+    try:
+        if len(lanes) == 1:
+            outcomes.update(_run_lane(lanes[0]))
+        elif lanes:
+            workers = min(len(lanes), settings.THERMOSTAT_FANOUT_MAX_WORKERS)
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                for lane_outcomes in pool.map(_run_lane_in_thread, lanes):
+                    outcomes.update(lane_outcomes)
+    finally:
+        for session in sessions:
+            session.close()
+
+    now = timezone.now()
+    for index in todo:
+        succeeded, result = outcomes[index]
+        command = commands[index]
+        command.status = 'success' if succeeded else 'failed'
+        command.result = result
+        command.updated_at = now
+        if not succeeded:
+            job = jobs[index]
+            logger.error(f"{job.action_type} failed for thermostat {job.thermostat.id} of event {job.event_id}: {result}")
+    ThermostatCommand.objects.bulk_update([commands[index] for index in todo], ['status', 'result', 'updated_at'])
+    return commands
+
+
+def _run_action(event, action_type, key_prefix=None):
+    """
+    Apply an action to every thermostat of the event's property.
+
+    Raises:
+        ThermostatCommandError: If any thermostat could not be set.
+    """
+    commands = _apply_to_thermostats([
+        CommandJob(
+            thermostat, action_type, event.id, None,
+            f"{key_prefix}:{thermostat.id}" if key_prefix else None,
+        )
+        for thermostat in event.property.thermostats.all()
+    ])
+    failed = [command for command in commands if command.status != 'success']
+    if failed:
+        raise ThermostatCommandError(f"{action_type} failed on {len(failed)} of {len(commands)} thermostats")
+    return commands
+
+
+class DeadLetteringTask(Task):
+    """
+    Task base class that records tasks which failed for good.
+
+    Celery calls ``on_failure`` only once retries are exhausted (or for errors
+    that are not retried), so every `DeadLetter` row is a task that needs
+    attention and can be replayed from the admin API.
+    """
+
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        DeadLetter.objects.create(
+            task_name=self.name,
+            task_id=task_id,
+            args=list(args),
+            kwargs=dict(kwargs),
+            exception=repr(exc),
+            traceback=str(einfo) if einfo else '',
+        )
+        logger.error(f"Task {self.name}[{task_id}] failed permanently: {exc!r}")
+
+
+# Retry policy for tasks that command thermostats.  Retries back off
+# exponentially with jitter, and only re-send commands that did not succeed.
+COMMAND_TASK_OPTIONS = {
+    'bind': True,
+    'base': DeadLetteringTask,
+    'autoretry_for': (ThermostatCommandError,),
+    'retry_backoff': settings.SCHEDULED_ACTION_RETRY_BACKOFF,
+    'retry_backoff_max': settings.SCHEDULED_ACTION_RETRY_BACKOFF_MAX,
+    'retry_jitter': True,
+    'max_retries': settings.SCHEDULED_ACTION_MAX_RETRIES,
+}
+
+
+def _action_key_prefix(task, action_id):
+    """Return the idempotency key prefix for a task's commands, if any."""
+    if action_id is not None:
+        return f"action:{action_id}"
+    if task.request.id:
+        # Retries keep the task id, so this identifies the same run.
+        return f"task:{task.request.id}"
+    return None
+
+
+@shared_task(**COMMAND_TASK_OPTIONS)
+def pre_arrival_action(self, event_id: int, action_id: int = None) -> None:
     """
     Pre‑arrival action: prepare the property for an upcoming booking.
 
-    This task sets the thermostat to occupied mode and a comfortable
-    temperature ahead of the guest's arrival.
+    This task sets every thermostat of the property to occupied mode and a
+    comfortable temperature ahead of the guest's arrival.  Failed devices are
+    retried with backoff; devices that were already set are not commanded
+    again.
 
     Args:
         event_id (int): The ID of the CalendarEvent instance.
+        action_id (int): The ID of the ScheduledAction ledger entry, if any.
     """
+    if not _action_is_live(action_id):
+        return
+
     try:
         event = CalendarEvent.objects.select_related('property').get(id=event_id)
     except CalendarEvent.DoesNotExist:
         # Event was deleted before the task ran; nothing to do.
         return
 
-    prop = event.property
-    thermostat = prop.thermostats.first()
-    if not thermostat:
-        # No thermostat associated with this property.
-        return
-
-    adapter = get_thermostat_adapter(thermostat)
-
-    # Choose the occupied temperature.  For now we always cool to the default.
-    # In the future this could inspect the season or per‑property preferences.
-    target_temp = settings.DEFAULT_COOL_TEMP
-    try:
-        # Turn on the system (cooling mode) and set the target temperature.
-        adapter.set_mode('cool')
-        adapter.set_temperature(target_temp)
-    except Exception as exc:
-        # Log the error; Celery will not retry by default.  In a real system you
-        # might raise to trigger retry logic or record a failed command.
-        raise exc
+    _run_action(event, 'pre_arrival', _action_key_prefix(self, action_id))
+    _complete_action(action_id)
 
 
-@shared_task
-def post_checkout_action(event_id: int) -> None:
+@shared_task(**COMMAND_TASK_OPTIONS)
+def post_checkout_action(self, event_id: int, action_id: int = None) -> None:
     """
     Post‑checkout action: restore the property to an eco setting after a booking.
 
     This task is executed a number of hours after the guest checks out.  It
-    turns off the HVAC system (or sets it to eco/off) and uses an energy‑saving
-    temperature.
+    turns off every HVAC unit of the property (or sets it to eco/off) and
+    uses an energy‑saving temperature.  Failed devices are retried with
+    backoff.
 
     Args:
         event_id (int): The ID of the CalendarEvent instance.
+        action_id (int): The ID of the ScheduledAction ledger entry, if any.
     """
+    if not _action_is_live(action_id):
+        return
+
     try:
         event = CalendarEvent.objects.select_related('property').get(id=event_id)
     except CalendarEvent.DoesNotExist:
         return
 
-    prop = event.property
-    thermostat = prop.thermostats.first()
-    if not thermostat:
-        return
+    _run_action(event, 'post_checkout', _action_key_prefix(self, action_id))
+    _complete_action(action_id)
 
-    adapter = get_thermostat_adapter(thermostat)
 
-    # Use eco temperatures; for simplicity we'll apply the cooling eco value.
-    eco_temp = settings.DEFAULT_ECO_COOL_TEMP
+@shared_task(**COMMAND_TASK_OPTIONS)
+def execute_scheduled_actions(self, action_ids) -> None:
+    """
+    Execute a batch of due actions claimed by `dispatch_due_actions`.
+
+    Actions that were superseded after being dispatched are skipped.  The
+    thermostat commands of the whole batch are grouped by vendor account (see
+    `_apply_to_thermostats`), so actions falling due together, such as the
+    usual 15:00 check-ins, share connections and vendor bulk calls.  A failing
+    device does not hold up the rest of the batch: actions whose devices were
+    all set are completed, and the task is retried for the others, re-sending
+    only the commands that failed.
+
+    Each attempt renews the lease of the batch's dispatched rows, so that
+    `dispatch_due_actions` only dispatches them again once this task has
+    stopped running.
+
+    Args:
+        action_ids (list[int]): IDs of ScheduledAction ledger entries.
+    """
+    ScheduledAction.objects.filter(id__in=action_ids, status='dispatched').update(claimed_at=timezone.now())
+    actions = list(
+        ScheduledAction.objects
+        .select_related('event__property')
+        .prefetch_related('event__property__thermostats')
+        .filter(id__in=action_ids, status__in=LIVE_ACTION_STATUSES)
+    )
+    jobs = []
+    owners = []
+    for action in actions:
+        for thermostat in action.event.property.thermostats.all():
+            jobs.append(CommandJob(
+                thermostat, action.action_type, action.event_id, action.planned_time,
+                f"action:{action.id}:{thermostat.id}",
+            ))
+            owners.append(action.id)
+    commands = _apply_to_thermostats(jobs)
+
+    failed = {action_id for action_id, command in zip(owners, commands) if command.status != 'success'}
+    for action in actions:
+        if action.id not in failed:
+            _complete_action(action.id)
+    if failed:
+        raise ThermostatCommandError(f"{len(failed)} of {len(actions)} scheduled actions failed")
+
+
+def _revoke(task_id) -> None:
+    """Best-effort revoke of a queued task; the ledger check covers misses."""
+    if not task_id:
+        return
     try:
-        adapter.set_mode('off')
-        adapter.set_temperature(eco_temp)
+        pre_arrival_action.app.control.revoke(task_id)
     except Exception as exc:
-        raise exc
+        logger.warning(f"Could not revoke superseded task {task_id}: {exc}")
 
 
-@shared_task
-def scan_calendar_events() -> None:
+def _schedule_action(event, action_type, planned_time, now, horizon_end) -> None:
+    """
+    Reconcile the ledger for one event/action pair with its planned time.
+
+    Live entries planned for another time are superseded (revoking any task
+    already sent for them).  A new due entry is only created when no live
+    entry already exists for ``planned_time`` and the time falls within the
+    scan horizon; later actions are recorded once they enter it.  The entry
+    falls due at a per-property offset before ``planned_time`` so actions
+    sharing a nominal time do not all hit the vendors at once.
     """
-    Scan upcoming calendar events and schedule pre/post actions.
+    current = None
+    for action in event.live_actions:
+        if action.action_type != action_type:
+            continue
+        if action.planned_time == planned_time:
+            current = action
+            continue
+        _revoke(action.task_id)
+        ScheduledAction.objects.filter(id=action.id).update(status='superseded', updated_at=now)
+
+    if current is not None or planned_time <= now or planned_time > horizon_end:
+        return
+
+    # The row may exist as superseded if the event moved away and back again;
+    # revive it rather than violating the unique key.
+    ScheduledAction.objects.update_or_create(
+        event=event,
+        action_type=action_type,
+        planned_time=planned_time,
+        defaults={
+            'due_at': spread_due_time(event.property_id, planned_time, now),
+            'status': 'pending',
+            'task_id': None,
+            'claim_token': None,
+        },
+    )
+
 
-    This task runs periodically (configured via Celery beat) and inspects
-    CalendarEvent instances.  For each event, it calculates when the pre‑arrival
-    and post‑checkout tasks should run based on the property's timezone and
-    global offsets.  It then schedules the tasks using apply_async with an ETA.
+def _claim_due_actions(limit):
+    """
+    Claim up to ``limit`` due ledger rows for this dispatcher.
+
+    On backends with row locks the candidates are selected with
+    ``SELECT ... FOR UPDATE SKIP LOCKED`` so concurrent dispatchers never wait
+    on each other.  SQLite has no row locks, so the claim relies on the
+    conditional UPDATE instead: each row is only moved to ``claimed`` by the
+    dispatcher that still sees it as claimable, and the claim token identifies
+    which rows this dispatcher won.  Rows left ``claimed`` by a dispatcher that
+    died before sending them become claimable again after a timeout.
+
+    Rows left ``dispatched`` whose lease (``claimed_at``, renewed by
+    `execute_scheduled_actions` on every attempt) has lapsed lost their
+    message or worker and are claimed again, up to
+    ``SCHEDULED_ACTION_MAX_DISPATCHES`` dispatches in all.  The command
+    idempotency keys keep devices that were already set from being set twice.
     """
     now = timezone.now()
-    upcoming_events = CalendarEvent.objects.select_related('property').filter(
-        end_date__gte=now
+    token = uuid.uuid4().hex
+    claimable = Q(status='pending') | Q(
+        status='claimed',
+        claimed_at__lt=now - timedelta(seconds=settings.SCHEDULED_ACTION_CLAIM_TIMEOUT_SECONDS),
+    ) | Q(
+        status='dispatched',
+        claimed_at__lt=now - timedelta(seconds=settings.SCHEDULED_ACTION_DISPATCH_TIMEOUT_SECONDS),
+        dispatch_count__lt=settings.SCHEDULED_ACTION_MAX_DISPATCHES,
+    )
+
+    with transaction.atomic():
+        due = ScheduledAction.objects.filter(claimable, due_at__lte=now).order_by('due_at')
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        ids = list(due.values_list('id', flat=True)[:limit])
+        if not ids:
+            return []
+        ScheduledAction.objects.filter(claimable, id__in=ids).update(
+            status='claimed', claim_token=token, claimed_at=now,
+            dispatch_count=F('dispatch_count') + 1, updated_at=now,
+        )
+
+    return list(ScheduledAction.objects.filter(claim_token=token).values_list('id', flat=True))
+
+
+@shared_task
+def dispatch_due_actions() -> int:
+    """
+    Hand due scheduled actions to the workers in batches.
+
+    Runs every minute from Celery beat.  Each batch of claimed rows becomes a
+    single `execute_scheduled_actions` message, and the number of batches per
+    run is capped so one tick never floods the broker.
+
+    Returns:
+        int: The number of actions dispatched.
+    """
+    dispatched = 0
+    for _ in range(settings.SCHEDULED_ACTION_MAX_BATCHES):
+        action_ids = _claim_due_actions(settings.SCHEDULED_ACTION_BATCH_SIZE)
+        if not action_ids:
+            break
+
+        result = execute_scheduled_actions.delay(action_ids)
+        ScheduledAction.objects.filter(id__in=action_ids, status='claimed').update(
+            status='dispatched', task_id=result.id, updated_at=timezone.now()
+        )
+        dispatched += len(action_ids)
+
+        if len(action_ids) < settings.SCHEDULED_ACTION_BATCH_SIZE:
+            break
+
+    return dispatched
+
+
+@lru_cache(maxsize=None)
+def _property_timezone(tzname) -> ZoneInfo:
+    """Return the ZoneInfo for a property timezone name, memoized per worker."""
+    try:
+        return ZoneInfo(tzname)
+    except Exception:
+        # Fall back to the Django default timezone if invalid.
+        return ZoneInfo(settings.TIME_ZONE)
+
+
+def _action_times(event):
+    """Return the (pre_time, post_time) of an event in its property's timezone."""
+    tz = _property_timezone(event.property.timezone or settings.DEFAULT_PROPERTY_TIME_ZONE)
+
+    # Convert start/end to the property's local timezone.
+    start_local = event.start_date
+    end_local = event.end_date
+    if timezone.is_aware(start_local):
+        start_local = start_local.astimezone(tz)
+    else:
+        start_local = timezone.make_aware(start_local, timezone=tz)
+
+    if timezone.is_aware(end_local):
+        end_local = end_local.astimezone(tz)
+    else:
+        end_local = timezone.make_aware(end_local, timezone=tz)
+
+    pre_time = start_local - timedelta(hours=settings.PRE_ARRIVAL_HOURS)
+    post_time = end_local + timedelta(hours=settings.POST_CHECKOUT_HOURS)
+    return pre_time, post_time
+
+
+def _scan_events(**filters):
+    """Stream events matching ``filters`` with only the fields the scan needs."""
+    return (
+        CalendarEvent.objects
+        .select_related('property')
+        .only('id', 'start_date', 'end_date', 'updated_at', 'cancelled_at', 'property__timezone')
+        .filter(**filters)
+        .prefetch_related(
+            Prefetch(
+                'scheduled_actions',
+                queryset=ScheduledAction.objects.filter(status__in=LIVE_ACTION_STATUSES),
+                to_attr='live_actions',
+            )
+        )
+        .iterator(chunk_size=settings.CALENDAR_SCAN_CHUNK_SIZE)
     )
 
-    for event in upcoming_events:
-        prop = event.property
-        tzname = getattr(prop, 'timezone', None) or settings.DEFAULT_PROPERTY_TIME_ZONE
-        try:
-            tz = ZoneInfo(tzname)
-        except Exception:
-            # Fall back to the Django default timezone if invalid.
-            tz = ZoneInfo(settings.TIME_ZONE)
-
-        # Convert start/end to the property's local timezone.
-        start_local = event.start_date
-        end_local = event.end_date
-        if timezone.is_aware(start_local):
-            start_local = start_local.astimezone(tz)
-        else:
-            start_local = timezone.make_aware(start_local, timezone=tz)
-
-        if timezone.is_aware(end_local):
-            end_local = end_local.astimezone(tz)
-        else:
-            end_local = timezone.make_aware(end_local, timezone=tz)
-
-        pre_time = start_local - timedelta(hours=settings.PRE_ARRIVAL_HOURS)
-        post_time = end_local + timedelta(hours=settings.POST_CHECKOUT_HOURS)
-
-        # Only schedule tasks for times in the future.
-        if pre_time > now:
-            pre_arrival_action.apply_async(args=[event.id], eta=pre_time)
-
-        if post_time > now:
-            post_checkout_action.apply_async(args=[event.id], eta=post_time)
\ No newline at end of file
+
+def _reconcile_event(event, now, horizon_end) -> None:
+    """Bring the ledger of one event in line with its current times."""
+    if event.cancelled_at is not None:
+        # The booking vanished from its calendar: cancel everything pending.
+        for action in event.live_actions:
+            _revoke(action.task_id)
+        ScheduledAction.objects.filter(
+            id__in=[action.id for action in event.live_actions]
+        ).update(status='superseded', updated_at=now)
+        return
+
+    pre_time, post_time = _action_times(event)
+
+    # Only schedule actions for times in the future.
+    _schedule_action(event, 'pre_arrival', pre_time, now, horizon_end)
+    _schedule_action(event, 'post_checkout', post_time, now, horizon_end)
+
+
+def reschedule_events(event_ids) -> int:
+    """
+    Reconcile the scheduled actions of specific events.
+
+    Called when a calendar sync added, moved or cancelled events, so the
+    scheduling work is proportional to what changed rather than to the size
+    of the calendar.  The periodic scan still picks the events up by their
+    ``updated_at``, which makes this idempotent with it.
+
+    Returns:
+        int: The number of events reconciled.
+    """
+    if not event_ids:
+        return 0
+    now = timezone.now()
+    horizon_end = now + timedelta(hours=settings.CALENDAR_SCAN_LOOKAHEAD_HOURS)
+    count = 0
+    for event in _scan_events(id__in=event_ids, end_date__gte=now):
+        _reconcile_event(event, now, horizon_end)
+        count += 1
+    return count
+
+
+@shared_task
+def scan_calendar_events() -> int:
+    """
+    Scan changed and upcoming calendar events and schedule pre/post actions.
+
+    This task runs periodically (configured via Celery beat).  Instead of
+    re-reading every future event, each run only looks at:
+
+    - events created or changed since the previous run's `updated_at`
+      watermark (re-read with a small overlap to tolerate late commits), and
+    - events whose pre‑arrival or post‑checkout time entered the lookahead
+      horizon since the previous run.
+
+    For each of these events it calculates when the actions should run based
+    on the property's timezone and global offsets.  Actions already in the
+    `ScheduledAction` ledger for the same time are left alone; new or moved
+    actions within the horizon are recorded with their due time for
+    `dispatch_due_actions` to pick up.
+
+    Returns:
+        int: The number of events processed.
+    """
+    now = timezone.now()
+    checkpoint, _ = ScanCheckpoint.objects.get_or_create(name='calendar_events')
+    horizon_end = now + timedelta(hours=settings.CALENDAR_SCAN_LOOKAHEAD_HOURS)
+
+    # Action times are computed with wall-clock arithmetic in the property's
+    # timezone, so widen the window by an hour to cover DST transitions.
+    slack = timedelta(hours=1)
+    window_start = (checkpoint.horizon_end or now) - slack
+    pre_offset = timedelta(hours=settings.PRE_ARRIVAL_HOURS)
+    post_offset = timedelta(hours=settings.POST_CHECKOUT_HOURS)
+
+    sources = [
+        _scan_events(
+            end_date__gte=now,
+            cancelled_at__isnull=True,
+            start_date__gt=window_start + pre_offset,
+            start_date__lte=horizon_end + pre_offset + slack,
+        ),
+        _scan_events(
+            end_date__gte=now,
+            cancelled_at__isnull=True,
+            end_date__gt=window_start - post_offset,
+            end_date__lte=horizon_end - post_offset + slack,
+        ),
+    ]
+    if checkpoint.watermark is not None:
+        overlap = timedelta(seconds=settings.CALENDAR_SCAN_OVERLAP_SECONDS)
+        sources.insert(0, _scan_events(end_date__gte=now, updated_at__gt=checkpoint.watermark - overlap))
+
+    # On the first run the horizon window covers every event that needs an
+    # action, so changes are tracked from the scan time onwards.
+    watermark = checkpoint.watermark or now
+    seen = set()
+    for event in chain.from_iterable(sources):
+        if event.id in seen:
+            continue
+        seen.add(event.id)
+        watermark = max(watermark, event.updated_at)
+        _reconcile_event(event, now, horizon_end)
+
+    checkpoint.watermark = watermark
+    checkpoint.horizon_end = horizon_end
+    checkpoint.save(update_fields=['watermark', 'horizon_end', 'updated_at'])
+    return len(seen)
+
+
+@shared_task
+def sync_calendar_feeds(feed_ids=None) -> list:
+    """
+    Sync every external calendar feed that is due, or the given feeds.
+
+    Runs every few minutes from Celery beat on the bulk queue, so feed
+    downloads never happen on the request path.  Up to
+    `CALENDAR_SYNC_BATCH_SIZE` feeds are synced per run, least recently synced
+    first; the rest are picked up by the next run.  Events that changed have
+    their actions rescheduled through the ``calendar_events_changed`` signal.
+
+    Args:
+        feed_ids (list[int]): Feeds to sync now regardless of when they are
+            due, e.g. when a user asks for a sync.
+
+    Returns:
+        list[dict]: Per-feed status and timings (see `calendar_sync.sync_feeds`).
+    """
+    now = timezone.now()
+    if feed_ids is not None:
+        feeds = CalendarFeed.objects.filter(id__in=feed_ids)
+    else:
+        feeds = due_feeds(now)
+    feeds = list(feeds.select_related('property')[:settings.CALENDAR_SYNC_BATCH_SIZE])
+    reports = sync_feeds(feeds, now)
+    failed = sum(1 for report in reports if report['status'] == 'failed')
+    logger.info(f"Synced {len(reports)} calendar feeds ({failed} failed) in {(timezone.now() - now).total_seconds():.1f}s")
+    return reports
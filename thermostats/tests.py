@@ -0,0 +1,1091 @@
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+from zoneinfo import ZoneInfo
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from . import tasks
+from .aggregates import period_start
+from .throttling import RateLimiter, spread_due_time
+from .models import (
+    CalendarEvent, CalendarFeed, DeadLetter, Property, ScanCheckpoint, ScheduledAction, Thermostat, ThermostatCommand,
+    UsageAggregate, UsageStatistics
+)
+
+User = get_user_model()
+
+
+def create_property(owner, name='Test Property'):
+    return Property.objects.create(
+        name=name,
+        owner=owner,
+        type='vacation',
+        size=1200,
+        street='123 Test St',
+        city='Test City',
+        state='TS',
+        zip_code='12345',
+    )
+
+
+class UsageAggregateTests(TestCase):
+    """Test maintenance and serving of precomputed usage aggregates"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='test@example.com',
+            email='test@example.com',
+            password='testpassword123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.property = create_property(self.user)
+        self.today = timezone.now().date()
+        self.week_start = period_start('week', self.today)
+        self.statistics_url = reverse('property-statistics', args=[self.property.id])
+
+    def add_day(self, day, energy_usage=10.0, cost=2.0):
+        return UsageStatistics.objects.create(
+            property=self.property,
+            date=day,
+            energy_usage=energy_usage,
+            cost=cost,
+            average_temperature=70.0,
+        )
+
+    def test_aggregates_follow_daily_rows(self):
+        """Test that saving and deleting daily rows refreshes every bucket"""
+        first = self.add_day(self.week_start)
+        self.add_day(self.week_start + timedelta(days=1), energy_usage=5.0, cost=1.0)
+
+        week = UsageAggregate.objects.get(property=self.property, period='week', period_start=self.week_start)
+        self.assertEqual(week.days, 2)
+        self.assertEqual(week.energy_usage, 15.0)
+        self.assertEqual(week.cost, 3.0)
+        year = UsageAggregate.objects.get(property=self.property, period='year')
+        self.assertEqual(year.energy_usage, 15.0)
+
+        first.delete()
+        week.refresh_from_db()
+        self.assertEqual(week.days, 1)
+        self.assertEqual(week.energy_usage, 5.0)
+
+    def test_moving_a_row_refreshes_the_old_bucket(self):
+        """Test that changing a row's date updates the bucket it left"""
+        self.add_day(self.week_start)
+        row = UsageStatistics.objects.get(property=self.property)
+        row.date = self.week_start - timedelta(days=7)
+        row.save()
+
+        self.assertFalse(UsageAggregate.objects.filter(
+            property=self.property, period='week', period_start=self.week_start
+        ).exists())
+        self.assertTrue(UsageAggregate.objects.filter(
+            property=self.property, period='week', period_start=row.date
+        ).exists())
+
+    def test_statistics_returns_aggregate_with_optional_daily(self):
+        """Test the statistics action and its cache validators"""
+        self.add_day(self.week_start)
+
+        response = self.client.get(self.statistics_url, {'period': 'week'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['aggregate']['energy_usage'], 10.0)
+        self.assertNotIn('daily', response.data)
+        self.assertIn('max-age', response['Cache-Control'])
+
+        response = self.client.get(self.statistics_url, {'period': 'week', 'daily': 'true'})
+        self.assertEqual(len(response.data['daily']), 1)
+
+        etag = response['ETag']
+        response = self.client.get(self.statistics_url, {'period': 'week', 'daily': 'true'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_thermostat_filter_does_not_duplicate_rows(self):
+        """Test that filtering statistics by thermostat returns each day once"""
+        for index in range(3):
+            Thermostat.objects.create(
+                name=f'Zone {index}',
+                property=self.property,
+                brand='other',
+                model='Generic',
+                device_id=f'device-{index}',
+            )
+        thermostat = self.property.thermostats.first()
+        self.add_day(self.today)
+
+        response = self.client.get(reverse('statistics-list'), {'thermostat_id': thermostat.id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 1)
+
+
+class ScheduledActionQueueTests(TestCase):
+    """Test the scheduled action ledger and due-queue dispatcher"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='test@example.com',
+            email='test@example.com',
+            password='testpassword123'
+        )
+        self.property = create_property(self.user)
+        self.event = self.add_event(timezone.now() + timedelta(hours=12))
+
+    def add_event(self, start, nights=1):
+        return CalendarEvent.objects.create(
+            property=self.property,
+            title='Guest stay',
+            start_date=start,
+            end_date=start + timedelta(days=nights),
+            event_type='booking',
+        )
+
+    def dispatch(self):
+        with mock.patch.object(tasks.execute_scheduled_actions, 'delay') as delay:
+            delay.return_value.id = 'batch-task'
+            dispatched = tasks.dispatch_due_actions()
+        return dispatched, delay
+
+    def test_repeated_scans_do_not_duplicate_actions(self):
+        """Test that a second scan records nothing for unchanged events"""
+        tasks.scan_calendar_events()
+        tasks.scan_calendar_events()
+        self.assertEqual(ScheduledAction.objects.filter(status='pending').count(), 2)
+
+    def test_scan_only_reads_changed_and_entering_events(self):
+        """Test that later scans skip unchanged events and defer far-off ones"""
+        far = self.add_event(timezone.now() + timedelta(days=10))
+        self.assertEqual(tasks.scan_calendar_events(), 1)
+        self.assertFalse(ScheduledAction.objects.filter(event=far).exists())
+
+        with self.settings(CALENDAR_SCAN_OVERLAP_SECONDS=0):
+            self.assertEqual(tasks.scan_calendar_events(), 0)
+
+            # Move the checkpoint back as if the horizon had advanced since.
+            checkpoint = ScanCheckpoint.objects.get(name='calendar_events')
+            checkpoint.horizon_end = far.start_date - timedelta(days=3)
+            checkpoint.save()
+            with self.settings(CALENDAR_SCAN_LOOKAHEAD_HOURS=24 * 12):
+                self.assertEqual(tasks.scan_calendar_events(), 1)
+        self.assertEqual(ScheduledAction.objects.filter(event=far).count(), 2)
+
+    def test_due_times_are_spread_before_the_planned_time(self):
+        """Test that actions fall due at a stable per-property offset"""
+        tasks.scan_calendar_events()
+        window = timedelta(seconds=900)
+        offsets = set()
+        for action in ScheduledAction.objects.all():
+            self.assertLessEqual(action.due_at, action.planned_time)
+            self.assertGreaterEqual(action.due_at, action.planned_time - window)
+            offsets.add(action.planned_time - action.due_at)
+        self.assertEqual(len(offsets), 1)
+
+        now = timezone.now()
+        planned = now + timedelta(minutes=5)
+        self.assertEqual(spread_due_time(self.property.id, planned, now), spread_due_time(self.property.id, planned, now))
+        self.assertGreaterEqual(spread_due_time(self.property.id, planned, now), now)
+
+    def test_moved_event_supersedes_previous_action(self):
+        """Test that moving an event replaces only its changed action"""
+        tasks.scan_calendar_events()
+        self.event.start_date += timedelta(hours=4)
+        self.event.save()
+        tasks.scan_calendar_events()
+
+        superseded = ScheduledAction.objects.get(status='superseded')
+        self.assertEqual(superseded.action_type, 'pre_arrival')
+        self.assertFalse(tasks._action_is_live(superseded.id))
+        self.assertEqual(ScheduledAction.objects.filter(status='pending').count(), 2)
+
+    def test_dispatcher_only_sends_due_actions(self):
+        """Test that the dispatcher claims due rows once and batches them"""
+        tasks.scan_calendar_events()
+        dispatched, delay = self.dispatch()
+        self.assertEqual(dispatched, 0)
+        delay.assert_not_called()
+
+        ScheduledAction.objects.filter(action_type='pre_arrival').update(due_at=timezone.now())
+        dispatched, delay = self.dispatch()
+        self.assertEqual(dispatched, 1)
+        delay.assert_called_once()
+        action = ScheduledAction.objects.get(action_type='pre_arrival')
+        self.assertEqual(action.status, 'dispatched')
+        self.assertEqual(action.task_id, 'batch-task')
+
+        dispatched, _ = self.dispatch()
+        self.assertEqual(dispatched, 0)
+
+    def test_lapsed_dispatches_are_sent_again(self):
+        """Test that dispatched actions whose lease lapsed are re-dispatched a bounded number of times"""
+        tasks.scan_calendar_events()
+        ScheduledAction.objects.filter(action_type='pre_arrival').update(due_at=timezone.now())
+        self.assertEqual(self.dispatch()[0], 1)
+        action = ScheduledAction.objects.get(action_type='pre_arrival')
+        self.assertEqual(action.dispatch_count, 1)
+
+        # A lease renewed a minute ago is still held.
+        ScheduledAction.objects.filter(id=action.id).update(claimed_at=timezone.now() - timedelta(seconds=60))
+        self.assertEqual(self.dispatch()[0], 0)
+
+        lapsed = timezone.now() - timedelta(seconds=1801)
+        with self.settings(SCHEDULED_ACTION_MAX_DISPATCHES=2):
+            ScheduledAction.objects.filter(id=action.id).update(claimed_at=lapsed)
+            self.assertEqual(self.dispatch()[0], 1)
+            action.refresh_from_db()
+            self.assertEqual(action.status, 'dispatched')
+            self.assertEqual(action.dispatch_count, 2)
+
+            ScheduledAction.objects.filter(id=action.id).update(claimed_at=lapsed)
+            self.assertEqual(self.dispatch()[0], 0)
+
+    def test_execute_renews_the_lease(self):
+        """Test that each execution attempt renews the lease of its dispatched actions"""
+        tasks.scan_calendar_events()
+        lapsed = timezone.now() - timedelta(hours=1)
+        ScheduledAction.objects.update(status='dispatched', claimed_at=lapsed)
+        action_ids = list(ScheduledAction.objects.values_list('id', flat=True))
+
+        tasks.execute_scheduled_actions(action_ids)
+
+        for action in ScheduledAction.objects.all():
+            self.assertGreater(action.claimed_at, lapsed)
+
+    def test_execute_marks_actions_completed(self):
+        """Test that executing a batch runs and completes live actions only"""
+        thermostat = Thermostat.objects.create(
+            name='Zone',
+            property=self.property,
+            brand='other',
+            model='Generic',
+            device_id='zone',
+        )
+        tasks.scan_calendar_events()
+        pre = ScheduledAction.objects.get(action_type='pre_arrival')
+        post = ScheduledAction.objects.get(action_type='post_checkout')
+        post.status = 'superseded'
+        post.save()
+
+        tasks.execute_scheduled_actions([pre.id, post.id])
+
+        command = ThermostatCommand.objects.get(thermostat=thermostat)
+        self.assertEqual(command.parameters['action'], 'pre_arrival')
+        self.assertEqual(command.status, 'success')
+        thermostat.refresh_from_db()
+        self.assertEqual(thermostat.mode, 'cool')
+        pre.refresh_from_db()
+        self.assertEqual(pre.status, 'completed')
+
+
+class ThermostatFanOutTests(TestCase):
+    """Test that scheduled actions reach every thermostat of a property"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='test@example.com',
+            email='test@example.com',
+            password='testpassword123'
+        )
+        self.property = create_property(self.user)
+        self.thermostats = [
+            Thermostat.objects.create(
+                name=f'Zone {index}',
+                property=self.property,
+                brand='nest',
+                model='Learning',
+                device_id=f'zone-{index}',
+                api_key='enterprise',
+                api_token='token',
+            )
+            for index in range(3)
+        ]
+        start = timezone.now() + timedelta(hours=12)
+        self.event = CalendarEvent.objects.create(
+            property=self.property,
+            title='Guest stay',
+            start_date=start,
+            end_date=start + timedelta(days=1),
+            event_type='booking',
+        )
+
+    def test_pre_arrival_commands_every_thermostat_concurrently(self):
+        """Test that each zone gets its own command and failures stay isolated"""
+        # Every device waits for the others, so this only passes if all
+        # three are commanded at the same time.
+        barrier = threading.Barrier(len(self.thermostats), timeout=5)
+
+        def make_adapter(thermostat, session=None):
+            adapter = mock.Mock()
+            adapter.set_mode.side_effect = lambda mode: barrier.wait() is not None
+            if thermostat.device_id == 'zone-1':
+                adapter.set_temperature.side_effect = RuntimeError('vendor unavailable')
+            else:
+                adapter.set_temperature.return_value = True
+            return adapter
+
+        with mock.patch.object(tasks, 'get_thermostat_adapter', side_effect=make_adapter):
+            with self.assertRaises(tasks.ThermostatCommandError):
+                tasks.pre_arrival_action(self.event.id)
+
+        commands = ThermostatCommand.objects.filter(command_type='scheduled_action')
+        self.assertEqual(commands.count(), 3)
+        failed = commands.get(status='failed')
+        self.assertEqual(failed.thermostat.device_id, 'zone-1')
+        self.assertEqual(failed.result, {'error': 'vendor unavailable'})
+        self.assertEqual(commands.filter(status='success').count(), 2)
+        self.assertEqual(commands.first().parameters['action'], 'pre_arrival')
+
+    def test_falsy_adapter_result_marks_command_failed(self):
+        """Test that adapters reporting an error by returning False are failures"""
+        adapter = mock.Mock()
+        adapter.set_mode.return_value = True
+        adapter.set_temperature.return_value = False
+        Thermostat.objects.exclude(id=self.thermostats[0].id).delete()
+
+        with mock.patch.object(tasks, 'get_thermostat_adapter', return_value=adapter):
+            with self.assertRaises(tasks.ThermostatCommandError):
+                tasks._run_action(self.event, 'post_checkout')
+
+        command = ThermostatCommand.objects.get()
+        self.assertEqual(command.status, 'failed')
+        adapter.set_mode.assert_called_once_with('off')
+
+    def test_batch_shares_one_session_per_vendor_account(self):
+        """Test that a batch groups devices by vendor account"""
+        other = create_property(self.user, name='Other Property')
+        Thermostat.objects.create(
+            name='Zone',
+            property=other,
+            brand='nest',
+            model='Learning',
+            device_id='other-zone',
+            api_key='enterprise-2',
+            api_token='token-2',
+        )
+        jobs = [
+            tasks.CommandJob(thermostat, 'pre_arrival', None, None, None)
+            for thermostat in Thermostat.objects.order_by('id')
+        ]
+        sessions_used = {}
+
+        def make_adapter(thermostat, session=None):
+            sessions_used[thermostat.device_id] = session
+            adapter = mock.Mock()
+            adapter.set_mode.return_value = True
+            adapter.set_temperature.return_value = True
+            return adapter
+
+        with mock.patch.object(tasks, 'build_vendor_session', side_effect=lambda size: mock.Mock()) as build, \
+                mock.patch.object(tasks, 'get_thermostat_adapter', side_effect=make_adapter):
+            commands = tasks._apply_to_thermostats(jobs)
+
+        self.assertEqual(build.call_count, 2)
+        self.assertEqual(len({id(sessions_used[f'zone-{index}']) for index in range(3)}), 1)
+        self.assertIsNot(sessions_used['other-zone'], sessions_used['zone-0'])
+        sessions_used['zone-0'].close.assert_called_once()
+        self.assertTrue(all(command.status == 'success' for command in commands))
+
+
+@override_settings(VENDOR_RATE_LIMITS={})
+class CommandRetryTests(TestCase):
+    """Test retries, idempotent command records and dead letters"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='test@example.com',
+            email='test@example.com',
+            password='testpassword123'
+        )
+        self.property = create_property(self.user)
+        for index in range(2):
+            Thermostat.objects.create(
+                name=f'Zone {index}',
+                property=self.property,
+                brand='nest',
+                model='Learning',
+                device_id=f'zone-{index}',
+                api_key='enterprise',
+                api_token='token',
+            )
+        start = timezone.now() + timedelta(hours=12)
+        self.event = CalendarEvent.objects.create(
+            property=self.property,
+            title='Guest stay',
+            start_date=start,
+            end_date=start + timedelta(days=1),
+            event_type='booking',
+        )
+        self.calls = {'zone-0': 0, 'zone-1': 0}
+
+    def make_adapter(self, failures):
+        def factory(thermostat, session=None):
+            adapter = mock.Mock()
+            adapter.set_mode.return_value = True
+
+            def set_temperature(temperature):
+                self.calls[thermostat.device_id] += 1
+                return self.calls[thermostat.device_id] > failures.get(thermostat.device_id, 0)
+
+            adapter.set_temperature.side_effect = set_temperature
+            return adapter
+        return factory
+
+    def test_retry_only_resends_failed_commands(self):
+        """Test that a retried task does not repeat successful commands"""
+        with mock.patch.object(tasks, 'get_thermostat_adapter', side_effect=self.make_adapter({'zone-1': 1})):
+            tasks.pre_arrival_action.apply(args=[self.event.id])
+
+        self.assertEqual(self.calls, {'zone-0': 1, 'zone-1': 2})
+        commands = ThermostatCommand.objects.all()
+        self.assertEqual(commands.count(), 2)
+        self.assertTrue(all(command.status == 'success' for command in commands))
+        self.assertFalse(DeadLetter.objects.exists())
+
+    def test_exhausted_retries_are_dead_lettered(self):
+        """Test that a task failing on every attempt lands in the dead-letter table"""
+        with mock.patch.object(tasks, 'get_thermostat_adapter', side_effect=self.make_adapter({'zone-1': 100})):
+            tasks.post_checkout_action.apply(args=[self.event.id])
+
+        self.assertEqual(self.calls['zone-0'], 1)
+        self.assertEqual(self.calls['zone-1'], tasks.post_checkout_action.max_retries + 1)
+        letter = DeadLetter.objects.get()
+        self.assertEqual(letter.task_name, tasks.post_checkout_action.name)
+        self.assertEqual(letter.args, [self.event.id])
+
+    def test_admin_can_replay_dead_letters(self):
+        """Test the bulk replay endpoint"""
+        letter = DeadLetter.objects.create(
+            task_name=tasks.pre_arrival_action.name,
+            args=[self.event.id],
+            exception='ThermostatCommandError()',
+        )
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        url = reverse('dead-letter-replay')
+        self.assertEqual(client.post(url).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.user.is_staff = True
+        self.user.save()
+        with mock.patch('thermostats.views.current_app') as app:
+            app.send_task.return_value.id = 'replayed-task'
+            response = client.post(url, {'ids': [letter.id]}, format='json')
+
+        self.assertEqual(response.data['replayed'], [letter.id])
+        app.send_task.assert_called_once_with(letter.task_name, args=[self.event.id], kwargs={})
+        letter.refresh_from_db()
+        self.assertEqual(letter.replay_task_id, 'replayed-task')
+        self.assertIsNotNone(letter.replayed_at)
+
+
+ICAL_FEED = """BEGIN:VCALENDAR
+VERSION:2.0
+BEGIN:VEVENT
+DTSTART;VALUE=DATE:{check_in:%Y%m%d}
+DTEND;VALUE=DATE:{check_out:%Y%m%d}
+UID:{uid}
+SUMMARY:Reserved
+END:VEVENT
+END:VCALENDAR
+"""
+
+
+class FakeFeedSession:
+    """Serve iCal feeds by URL, recording concurrent requests per host"""
+
+    def __init__(self, feeds):
+        self.feeds = feeds
+        self.lock = threading.Lock()
+        self.active = {}
+        self.peak = {}
+        self.headers = []
+
+    def get(self, url, headers=None, timeout=None):
+        import requests
+        host = url.split('/')[2]
+        with self.lock:
+            self.active[host] = self.active.get(host, 0) + 1
+            self.peak[host] = max(self.peak.get(host, 0), self.active[host])
+            self.headers.append(headers)
+        time.sleep(0.05)
+        with self.lock:
+            self.active[host] -= 1
+        response = requests.Response()
+        response.status_code = 200
+        response._content = self.feeds[url].encode()
+        response.headers['ETag'] = f'"{hash(self.feeds[url])}"'
+        return response
+
+    def close(self):
+        pass
+
+
+@override_settings(CALENDAR_SYNC_HOST_LIMITS={'airbnb.com': 1}, CALENDAR_SYNC_HOST_CONCURRENCY=4)
+class CalendarFeedSyncTests(TestCase):
+    """Test the fleet-wide calendar feed sync"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='test@example.com',
+            email='test@example.com',
+            password='testpassword123'
+        )
+        self.property = create_property(self.user)
+        check_in = timezone.now().date() + timedelta(days=3)
+        self.feeds = {}
+        self.urls = {}
+        for index, host in enumerate(['www.airbnb.com', 'www.airbnb.com', 'www.airbnb.com', 'www.vrbo.com', 'ical.example.org']):
+            url = f'https://{host}/calendar/{index}.ics'
+            feed = CalendarFeed.objects.create(property=self.property, name=f'Feed {index}', url=url)
+            self.feeds[feed.id] = feed
+            self.urls[url] = ICAL_FEED.format(check_in=check_in, check_out=check_in + timedelta(days=2), uid=f'stay-{index}')
+        # Neither of these is due.
+        CalendarFeed.objects.create(property=self.property, name='Manual', url='https://example.org/m.ics',
+                                    sync_frequency='manual')
+        CalendarFeed.objects.create(property=self.property, name='Daily', url='https://example.org/d.ics',
+                                    sync_frequency='daily', last_synced=timezone.now() - timedelta(hours=2))
+
+    def run_sync(self, feed_ids=None):
+        session = FakeFeedSession(self.urls)
+        with mock.patch('thermostats.calendar_sync.build_feed_session', return_value=session):
+            return session, tasks.sync_calendar_feeds(feed_ids)
+
+    def set_stays(self, feed, stays):
+        """Serve ``{uid: start}`` one-day stays from a feed"""
+        events = ''.join(
+            f"BEGIN:VEVENT\nUID:{uid}\nDTSTART:{start:%Y%m%dT%H%M%SZ}\n"
+            f"DTEND:{start + timedelta(days=1):%Y%m%dT%H%M%SZ}\nEND:VEVENT\n"
+            for uid, start in stays.items()
+        )
+        self.urls[feed.url] = f"BEGIN:VCALENDAR\nVERSION:2.0\n{events}END:VCALENDAR\n"
+
+    def test_due_feeds_sync_concurrently_within_host_limits(self):
+        """Test that due feeds are synced in parallel but one at a time per limited host"""
+        session, reports = self.run_sync()
+
+        self.assertEqual(sorted(report['feed'] for report in reports), sorted(self.feeds))
+        self.assertTrue(all(report['status'] == 'synced' and report['created'] == 1 for report in reports))
+        self.assertEqual(session.peak['www.airbnb.com'], 1)
+        self.assertEqual(
+            set(CalendarEvent.objects.values_list('external_calendar_id', 'external_id')),
+            {(str(feed_id), f'stay-{index}') for index, feed_id in enumerate(self.feeds)},
+        )
+        event = CalendarEvent.objects.get(external_id='stay-0')
+        # All-day events start at midnight in the property's timezone.
+        self.assertEqual(event.start_date.astimezone(ZoneInfo(self.property.timezone)).hour, 0)
+
+    def test_unchanged_feeds_are_not_parsed_again(self):
+        """Test that a resync sends validators and skips feeds with the same content"""
+        self.run_sync()
+        CalendarFeed.objects.update(last_synced=timezone.now() - timedelta(hours=2))
+        updated_at = CalendarEvent.objects.get(external_id='stay-0').updated_at
+
+        with mock.patch('thermostats.calendar_sync.parse_feed') as parse:
+            session, reports = self.run_sync()
+
+        parse.assert_not_called()
+        self.assertEqual({report['status'] for report in reports}, {'unchanged'})
+        self.assertTrue(all('If-None-Match' in headers for headers in session.headers))
+        self.assertEqual(CalendarEvent.objects.get(external_id='stay-0').updated_at, updated_at)
+
+    def test_moved_window_imports_events_of_an_unchanged_feed(self):
+        """Test that recurring events entering a moved sync window are imported although the feed is unchanged"""
+        from .calendar_sync import sync_feeds
+        feed = next(iter(self.feeds.values()))
+        now = timezone.now().replace(hour=12, minute=0, second=0, microsecond=0)
+        start = now + timedelta(days=1)
+        self.urls[feed.url] = (
+            "BEGIN:VCALENDAR\nVERSION:2.0\nBEGIN:VEVENT\nUID:weekly\n"
+            f"DTSTART:{start:%Y%m%dT%H%M%SZ}\nDTEND:{start + timedelta(hours=4):%Y%m%dT%H%M%SZ}\n"
+            "RRULE:FREQ=WEEKLY\nEND:VEVENT\nEND:VCALENDAR\n"
+        )
+        session = FakeFeedSession(self.urls)
+
+        def sync(at):
+            feeds = list(CalendarFeed.objects.filter(id=feed.id).select_related('property'))
+            with mock.patch('thermostats.calendar_sync.build_feed_session', return_value=session):
+                return sync_feeds(feeds, at)[0]
+
+        self.assertEqual(sync(now)['status'], 'synced')
+        events = CalendarEvent.objects.filter(external_calendar_id=str(feed.id))
+        count = events.count()
+        latest = events.latest('start_date').start_date
+
+        # Later the same day the window is the same, so the feed is skipped.
+        self.assertEqual(sync(now + timedelta(hours=2))['status'], 'unchanged')
+        self.assertIn('If-None-Match', session.headers[-1])
+
+        report = sync(now + timedelta(days=60))
+        self.assertEqual(report['status'], 'synced')
+        self.assertNotIn('If-None-Match', session.headers[-1])
+        self.assertEqual(report['created'], events.count() - count)
+        self.assertGreater(report['created'], 0)
+        self.assertGreater(events.latest('start_date').start_date, latest + timedelta(days=50))
+
+    def test_failing_feed_does_not_stop_the_others(self):
+        """Test that a feed that cannot be applied is rolled back and recorded while the rest sync"""
+        from . import calendar_sync
+        broken = next(iter(self.feeds.values()))
+        apply = calendar_sync.apply_feed_events
+
+        def apply_or_fail(feed, *args):
+            diff = apply(feed, *args)
+            if feed.id == broken.id:
+                raise RuntimeError('deadlock detected')
+            return diff
+
+        with mock.patch('thermostats.calendar_sync.apply_feed_events', side_effect=apply_or_fail):
+            _, reports = self.run_sync()
+
+        statuses = {report['feed']: report['status'] for report in reports}
+        self.assertEqual(statuses.pop(broken.id), 'failed')
+        self.assertEqual(set(statuses.values()), {'synced'})
+        broken.refresh_from_db()
+        self.assertEqual(broken.last_error, 'Could not apply feed: deadlock detected')
+        self.assertIsNone(broken.content_hash)
+        self.assertFalse(CalendarEvent.objects.filter(external_calendar_id=str(broken.id)).exists())
+        self.assertEqual(CalendarEvent.objects.count(), len(self.feeds) - 1)
+
+    def test_feed_changes_only_reschedule_affected_events(self):
+        """Test that a resync writes a minimal diff and reschedules only the events in it"""
+        feed = next(iter(self.feeds.values()))
+        soon = timezone.now().replace(microsecond=0) + timedelta(hours=12)
+        self.set_stays(feed, {'kept': soon, 'moved': soon + timedelta(hours=2), 'gone': soon + timedelta(hours=4)})
+        self.run_sync([feed.id])
+        events = {event.external_id: event for event in CalendarEvent.objects.filter(external_calendar_id=str(feed.id))}
+        self.assertEqual(ScheduledAction.objects.filter(status='pending').count(), 6)
+
+        self.set_stays(feed, {'kept': soon, 'moved': soon + timedelta(hours=3), 'new': soon + timedelta(hours=6)})
+        with mock.patch.object(tasks, 'reschedule_events', wraps=tasks.reschedule_events) as reschedule:
+            _, reports = self.run_sync([feed.id])
+
+        self.assertEqual((reports[0]['created'], reports[0]['updated'], reports[0]['removed']), (1, 1, 1))
+        added = CalendarEvent.objects.get(external_id='new')
+        self.assertEqual(sorted(reschedule.call_args.args[0]), sorted([added.id, events['moved'].id, events['gone'].id]))
+
+        gone = CalendarEvent.objects.get(id=events['gone'].id)
+        self.assertIsNotNone(gone.cancelled_at)
+        live = ScheduledAction.objects.filter(status='pending')
+        self.assertFalse(live.filter(event=gone).exists())
+        self.assertEqual(live.filter(event=events['kept']).get(action_type='pre_arrival').planned_time,
+                         soon - timedelta(hours=2))
+        self.assertEqual(live.filter(event=events['moved']).get(action_type='pre_arrival').planned_time,
+                         soon + timedelta(hours=1))
+        self.assertEqual(live.filter(event=added).count(), 2)
+
+        # The periodic scan leaves the tombstone alone, and a booking that
+        # reappears is revived instead of duplicated.
+        tasks.scan_calendar_events()
+        self.assertFalse(ScheduledAction.objects.filter(event=gone, status='pending').exists())
+        self.set_stays(feed, {'kept': soon, 'moved': soon + timedelta(hours=3), 'new': soon + timedelta(hours=6),
+                              'gone': soon + timedelta(hours=4)})
+        self.run_sync([feed.id])
+        gone.refresh_from_db()
+        self.assertIsNone(gone.cancelled_at)
+        self.assertEqual(CalendarEvent.objects.filter(external_id='gone').count(), 1)
+        self.assertTrue(ScheduledAction.objects.filter(event=gone, status='pending').exists())
+
+    def test_sync_calendar_action_queues_the_property_feeds(self):
+        """Test that the sync endpoint hands the property's feeds to a worker"""
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        with mock.patch.object(tasks.sync_calendar_feeds, 'apply_async') as apply_async:
+            apply_async.return_value.id = 'sync-task'
+            response = client.post(reverse('property-sync-calendar', args=[self.property.id]))
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['task_id'], 'sync-task')
+        self.assertEqual(len(apply_async.call_args.kwargs['kwargs']['feed_ids']), 7)
+        self.assertEqual(apply_async.call_args.kwargs['queue'], 'interactive')
+
+
+class RateLimiterTests(TestCase):
+    """Test the vendor request rate limiter"""
+
+    def test_deadline_overrides_the_limit(self):
+        """Test that a caller is never held past its deadline"""
+        limiter = RateLimiter(rate=0.001, burst=2)
+        self.assertTrue(limiter.acquire(2))
+        self.assertFalse(limiter.acquire(2, deadline=time.monotonic()))
+
+
+class StatelessAuthenticationTests(TestCase):
+    """Test token-user authentication and owned-property scoping"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='owner@example.com',
+            email='owner@example.com',
+            password='testpassword123'
+        )
+        self.property = create_property(self.user)
+        Thermostat.objects.create(name='Hall', property=self.property, brand='nest', device_id='hall')
+        other = User.objects.create_user(username='other@example.com', email='other@example.com', password='x')
+        Thermostat.objects.create(name='Other', property=create_property(other), brand='nest', device_id='other')
+
+    def authenticate(self):
+        response = self.client.post(
+            reverse('token_obtain_pair'),
+            {'username': 'owner@example.com', 'password': 'testpassword123'},
+            format='json',
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        return response.data
+
+    def test_read_endpoints_are_one_query(self):
+        """Test that listing thermostats needs neither the user row nor a property join"""
+        self.authenticate()
+        self.client.get(reverse('thermostat-list'))
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('thermostat-list'))
+        self.assertEqual([item['name'] for item in response.data['results']], ['Hall'])
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('property-list'))
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_new_property_is_visible_immediately(self):
+        """Test that creating a property refreshes the cached property ids"""
+        self.authenticate()
+        self.client.get(reverse('thermostat-list'))
+        second = create_property(self.user, name='Second')
+        Thermostat.objects.create(name='Porch', property=second, brand='nest', device_id='porch')
+
+        response = self.client.get(reverse('thermostat-list'))
+        self.assertEqual(sorted(item['name'] for item in response.data['results']), ['Hall', 'Porch'])
+
+    def test_deactivation_revokes_tokens(self):
+        """Test that deactivated users are locked out without a user lookup per request"""
+        tokens = self.authenticate()
+        self.assertEqual(self.client.get(reverse('property-list')).status_code, status.HTTP_200_OK)
+
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertEqual(self.client.get(reverse('property-list')).status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.post(reverse('token_refresh'), {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_revocation_is_exact_and_durable(self):
+        """Test that tokens issued right after a revocation work and revoked ones stay revoked"""
+        from django.core.cache import cache
+
+        old = self.authenticate()
+        self.user.set_password('newpassword456')
+        self.user.save()
+        self.user.save()  # saving again must not restore the old version
+
+        # Issued within the same second as the revocation
+        response = self.client.post(
+            reverse('token_obtain_pair'),
+            {'username': 'owner@example.com', 'password': 'newpassword456'},
+            format='json',
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        self.assertEqual(self.client.get(reverse('property-list')).status_code, status.HTTP_200_OK)
+
+        # Versions live in the database, so losing the cache revokes nothing back
+        cache.clear()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {old['access']}")
+        self.assertEqual(self.client.get(reverse('property-list')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class QueryBudgetTests(TestCase):
+    """Test the number of queries each endpoint runs"""
+
+    # Endpoint name -> most queries a request may run once the owner's
+    # property ids are cached.
+    BUDGETS = {
+        'property-list': 1,
+        'property-detail': 1,
+        'property-thermostats': 2,
+        'property-calendar': 2,
+        'property-statistics': 2,
+        'thermostat-list': 1,
+        'thermostat-detail': 1,
+        'calendar-event-list': 1,
+        'calendar-event-detail': 1,
+        'statistics-list': 1,
+        'statistics-detail': 1,
+        'dead-letter-list': 1,
+    }
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='owner@example.com',
+            email='owner@example.com',
+            password='testpassword123',
+            is_staff=True,
+        )
+        self.client.force_authenticate(user=self.user)
+        self.property = create_property(self.user)
+        self.rows = 0
+        self.add_rows(1)
+
+    def add_rows(self, count):
+        today = timezone.now().date()
+        for _ in range(count):
+            self.rows += 1
+            self.thermostat = Thermostat.objects.create(
+                name=f'Room {self.rows}', property=self.property, brand='nest', device_id=f'room-{self.rows}'
+            )
+            self.event = CalendarEvent.objects.create(
+                property=self.property,
+                title=f'Stay {self.rows}',
+                start_date=timezone.now() + timedelta(days=self.rows),
+                end_date=timezone.now() + timedelta(days=self.rows, hours=4),
+                event_type='booking',
+            )
+            self.statistics = UsageStatistics.objects.create(
+                property=self.property, date=today - timedelta(days=self.rows), energy_usage=1.0, cost=0.5
+            )
+            DeadLetter.objects.create(task_name='thermostats.tasks.example', task_id=f'task-{self.rows}')
+
+    def urls(self):
+        detail = {
+            'property': self.property.id,
+            'thermostat': self.thermostat.id,
+            'calendar-event': self.event.id,
+            'statistics': self.statistics.id,
+        }
+        for name in self.BUDGETS:
+            basename, _, suffix = name.rpartition('-')
+            if suffix == 'list':
+                yield name, reverse(name)
+            else:
+                yield name, reverse(name, args=[detail[basename]])
+        # Filtered statistics are held to the same budget as the full list.
+        yield 'statistics-list', reverse('statistics-list') + f'?thermostat_id={self.thermostat.id}'
+        yield 'statistics-list', reverse('statistics-list') + f'?thermostat_id={self.thermostat.id}&period=year'
+
+    def assertMaxQueries(self, maximum, path):
+        """Request ``path`` and fail if it runs more than ``maximum`` queries."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, path)
+        self.assertLessEqual(
+            len(queries), maximum,
+            f"{path} ran {len(queries)} queries:\n" + '\n'.join(query['sql'] for query in queries.captured_queries),
+        )
+        return len(queries)
+
+    def query_counts(self):
+        counts = {}
+        for position, (name, path) in enumerate(self.urls()):
+            self.client.get(path)  # warm the owned property ids
+            counts[position, name] = self.assertMaxQueries(self.BUDGETS[name], path)
+        return counts
+
+    def test_endpoints_stay_within_budget(self):
+        """Test that no endpoint runs more queries than its budget"""
+        self.query_counts()
+
+    def test_list_queries_do_not_grow_with_rows(self):
+        """Test that list endpoints run the same queries for one row as for a full page"""
+        single = self.query_counts()
+        self.add_rows(24)
+        self.assertEqual(self.query_counts(), single)
+
+    def test_later_pages_stay_within_budget(self):
+        """Test that following the cursor of the daily, event and dead-letter lists costs no more queries"""
+        self.add_rows(24)
+        for name in ('statistics-list', 'calendar-event-list', 'dead-letter-list'):
+            path = reverse(name) + '?page_size=5'
+            self.client.get(path)  # warm the owned property ids
+            for _ in range(3):
+                self.assertMaxQueries(self.BUDGETS[name], path)
+                path = self.client.get(path).data['next']
+                self.assertIsNotNone(path, name)
+
+    def test_thermostat_filter_returns_each_day_once(self):
+        """Test that filtering statistics by thermostat does not repeat daily rows"""
+        Thermostat.objects.create(name='Porch', property=self.property, brand='nest', device_id='porch')
+        response = self.client.get(reverse('statistics-list') + f'?thermostat_id={self.thermostat.id}')
+        self.assertEqual([item['id'] for item in response.data['results']], [self.statistics.id])
+
+
+class CursorPaginationTests(TestCase):
+    """Test cursor pagination of the list endpoints"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='owner@example.com',
+            email='owner@example.com',
+            password='testpassword123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.property = create_property(self.user)
+        start = timezone.now()
+        # Created out of start order, with two events starting together
+        self.events = [
+            CalendarEvent.objects.create(
+                property=self.property,
+                title=f'Stay {offset}',
+                start_date=start + timedelta(days=offset),
+                end_date=start + timedelta(days=offset, hours=4),
+                event_type='booking',
+            )
+            for offset in (3, 1, 4, 1, 5, 2)
+        ]
+
+    def walk(self, url, **params):
+        """Follow the `next` links from ``url`` and return the ids of every page"""
+        pages = []
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages.append([item['id'] for item in response.data['results']])
+            if not response.data['next']:
+                return pages
+            response = self.client.get(response.data['next'])
+
+    def test_events_are_paged_by_start_date(self):
+        """Test that pages follow (start_date, id) and cover every event once"""
+        expected = [event.id for event in sorted(self.events, key=lambda event: (event.start_date, event.id))]
+        for url in (reverse('calendar-event-list'), reverse('property-calendar', args=[self.property.id])):
+            pages = self.walk(url, page_size=4)
+            self.assertEqual([len(page) for page in pages], [4, 2])
+            self.assertEqual(sum(pages, []), expected)
+
+    def test_page_size_is_capped(self):
+        """Test that clients cannot request more rows than the maximum page size"""
+        from .pagination import CursorPagination
+
+        with mock.patch.object(CursorPagination, 'max_page_size', 2):
+            response = self.client.get(reverse('calendar-event-list'), {'page_size': 1000})
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_deep_pages_cost_the_same(self):
+        """Test that later pages without ties at their boundary seek on the start date instead of counting or offsetting"""
+        self.client.get(reverse('calendar-event-list'))  # warm the owned property ids
+        with CaptureQueriesContext(connection) as first:
+            response = self.client.get(reverse('calendar-event-list'), {'page_size': 2})
+        with CaptureQueriesContext(connection) as second:
+            response = self.client.get(response.data['next'])
+        with CaptureQueriesContext(connection) as last:
+            response = self.client.get(response.data['next'])
+        self.assertIsNone(response.data['next'])
+        self.assertEqual(len(second), len(first))
+        self.assertEqual(len(last), len(first))
+        sql = last.captured_queries[-1]['sql'].upper()
+        self.assertNotIn('COUNT(', sql)
+        self.assertNotIn('OFFSET', sql)
+
+
+class RequestMetricsTests(TestCase):
+    """Test the per-request SQL and vendor HTTP accounting"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='owner@example.com',
+            email='owner@example.com',
+            password='testpassword123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.property = create_property(self.user)
+        self.thermostat = Thermostat.objects.create(
+            name='Hall', property=self.property, brand='nest', device_id='hall', api_key='project', api_token='token'
+        )
+
+    def test_server_timing_reports_queries(self):
+        """Test that each response reports its statements and logs one JSON line"""
+        import json
+
+        with CaptureQueriesContext(connection) as queries, \
+                self.assertLogs('thermostats.middleware', 'INFO') as logs:
+            response = self.client.get(reverse('thermostat-list'))
+
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn(f'desc="{len(queries)} queries"', response['Server-Timing'])
+        self.assertIn('vendor;dur=0.0;desc="0 calls"', response['Server-Timing'])
+        line = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(line['path'], reverse('thermostat-list'))
+        self.assertEqual(line['status'], 200)
+        self.assertEqual(line['queries'], len(queries))
+        self.assertNotIn('over_budget', line)
+
+    def test_vendor_calls_are_counted(self):
+        """Test that HTTP calls made by thermostat adapters count against the request"""
+        import requests
+        # The Flask app's accounting shares the same `requests` hook, so
+        # loading it as well must not stop these calls being counted.
+        import src.utils.request_metrics  # noqa: F401
+
+        def send(adapter, request, **kwargs):
+            response = requests.Response()
+            response.status_code = 200
+            response.request = request
+            response._content = b'{"traits": {}}'
+            return response
+
+        with mock.patch('requests.adapters.HTTPAdapter.send', autospec=True, side_effect=send) as vendor:
+            response = self.client.get(reverse('thermostat-status', args=[self.thermostat.id]))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(f'desc="{vendor.call_count} calls"', response['Server-Timing'])
+        self.assertGreater(vendor.call_count, 0)
+
+    @override_settings(REQUEST_QUERY_BUDGET=1, REQUEST_BUDGET_MODE='log')
+    def test_budgets_log_or_fail(self):
+        """Test that requests over budget are logged, or raise in raise mode"""
+        import json
+        from .middleware import BudgetExceeded
+
+        url = reverse('property-thermostats', args=[self.property.id])
+        with self.assertLogs('thermostats.middleware', 'WARNING') as logs:
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        line = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(line['over_budget'], ['queries 2 > 1'])
+
+        with override_settings(REQUEST_BUDGET_MODE='raise'), \
+                self.assertRaisesMessage(BudgetExceeded, f'GET {url} went over budget: queries 2 > 1'):
+            self.client.get(url)
+
+
+class CeleryRoutingTests(TestCase):
+    """Test the queue each task is routed to"""
+
+    def test_tasks_are_routed_by_priority(self):
+        """Test that bulk scans never share a queue with scheduled or interactive work"""
+        from config.celery import app
+
+        def queue_for(task_name):
+            return app.amqp.router.route({}, task_name)['queue'].name
+
+        self.assertEqual(queue_for(tasks.execute_scheduled_actions.name), 'scheduled')
+        self.assertEqual(queue_for(tasks.dispatch_due_actions.name), 'scheduled')
+        self.assertEqual(queue_for(tasks.scan_calendar_events.name), 'bulk')
+        self.assertEqual(queue_for(tasks.sync_calendar_feeds.name), 'bulk')
+        self.assertEqual(queue_for('config.celery.debug_task'), 'interactive')
+
+    def test_beat_schedule_is_shared_by_settings_modules(self):
+        """Test that the periodic tasks are defined on the Celery app itself"""
+        from config.celery import app
+
+        scheduled = {entry['task'] for entry in app.conf.beat_schedule.values()}
+        self.assertEqual(scheduled, {
+            tasks.scan_calendar_events.name,
+            tasks.sync_calendar_feeds.name,
+            tasks.dispatch_due_actions.name,
+        })
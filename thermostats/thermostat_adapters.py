@@ -2,6 +2,9 @@
 Thermostat adapter module for integrating with various thermostat brands.
 This module implements the adapter pattern to provide a consistent interface
 for different thermostat APIs (Google/Nest, Cielo, Pioneer).
+
+Vendor adapters accept an optional `requests.Session` so that batches of
+commands for the same vendor account reuse one pool of connections.
 """
 
 import abc
@@ -9,6 +12,7 @@ import requests
 import json
 import logging
 from django.conf import settings
+from requests.adapters import HTTPAdapter
 
 logger = logging.getLogger(__name__)
 
@@ -68,8 +72,9 @@ class ThermostatAdapter(abc.ABC):
 class NestThermostatAdapter(ThermostatAdapter):
     """Adapter for Google Nest thermostats using the Smart Device Management API."""
     
-    def __init__(self, device_id, api_key=None, api_token=None):
+    def __init__(self, device_id, api_key=None, api_token=None, session=None):
         self.device_id = device_id
+        self.session = session or requests
         self.api_key = api_key or settings.NEST_API_KEY
         self.api_token = api_token or settings.NEST_API_TOKEN
         self.base_url = "https://smartdevicemanagement.googleapis.com/v1"
@@ -86,7 +91,7 @@ class NestThermostatAdapter(ThermostatAdapter):
     def get_temperature(self):
         try:
             url = f"{self.base_url}/{self._get_device_path()}"
-            response = requests.get(url, headers=self._get_headers())
+            response = self.session.get(url, headers=self._get_headers())
             response.raise_for_status()
             data = response.json()
             return data.get("traits", {}).get("sdm.devices.traits.Temperature", {}).get("ambientTemperatureCelsius")
@@ -103,7 +108,7 @@ class NestThermostatAdapter(ThermostatAdapter):
                     "heatCelsius": temperature
                 }
             }
-            response = requests.post(url, headers=self._get_headers(), json=payload)
+            response = self.session.post(url, headers=self._get_headers(), json=payload)
             response.raise_for_status()
             return True
         except Exception as e:
@@ -113,7 +118,7 @@ class NestThermostatAdapter(ThermostatAdapter):
     def get_humidity(self):
         try:
             url = f"{self.base_url}/{self._get_device_path()}"
-            response = requests.get(url, headers=self._get_headers())
+            response = self.session.get(url, headers=self._get_headers())
             response.raise_for_status()
             data = response.json()
             return data.get("traits", {}).get("sdm.devices.traits.Humidity", {}).get("ambientHumidityPercent")
@@ -124,7 +129,7 @@ class NestThermostatAdapter(ThermostatAdapter):
     def get_mode(self):
         try:
             url = f"{self.base_url}/{self._get_device_path()}"
-            response = requests.get(url, headers=self._get_headers())
+            response = self.session.get(url, headers=self._get_headers())
             response.raise_for_status()
             data = response.json()
             mode = data.get("traits", {}).get("sdm.devices.traits.ThermostatMode", {}).get("mode")
@@ -158,7 +163,7 @@ class NestThermostatAdapter(ThermostatAdapter):
                     "mode": google_mode
                 }
             }
-            response = requests.post(url, headers=self._get_headers(), json=payload)
+            response = self.session.post(url, headers=self._get_headers(), json=payload)
             response.raise_for_status()
             return True
         except Exception as e:
@@ -168,7 +173,7 @@ class NestThermostatAdapter(ThermostatAdapter):
     def is_online(self):
         try:
             url = f"{self.base_url}/{self._get_device_path()}"
-            response = requests.get(url, headers=self._get_headers())
+            response = self.session.get(url, headers=self._get_headers())
             response.raise_for_status()
             data = response.json()
             return data.get("traits", {}).get("sdm.devices.traits.Connectivity", {}).get("status") == "ONLINE"
@@ -180,8 +185,9 @@ class NestThermostatAdapter(ThermostatAdapter):
 class CieloThermostatAdapter(ThermostatAdapter):
     """Adapter for Cielo thermostats using IFTTT webhooks and direct API when available."""
     
-    def __init__(self, device_id, api_key=None, api_token=None, ifttt_key=None):
+    def __init__(self, device_id, api_key=None, api_token=None, ifttt_key=None, session=None):
         self.device_id = device_id
+        self.session = session or requests
         self.api_key = api_key
         self.api_token = api_token
         self.ifttt_key = ifttt_key or settings.IFTTT_WEBHOOK_KEY
@@ -206,7 +212,7 @@ class CieloThermostatAdapter(ThermostatAdapter):
             if value3 is not None:
                 payload["value3"] = value3
                 
-            response = requests.post(url, json=payload)
+            response = self.session.post(url, json=payload)
             response.raise_for_status()
             return True
         except Exception as e:
@@ -217,7 +223,7 @@ class CieloThermostatAdapter(ThermostatAdapter):
         if self.use_direct_api:
             try:
                 url = f"{self.direct_api_base_url}/devices/{self.device_id}"
-                response = requests.get(url, headers=self._get_direct_api_headers())
+                response = self.session.get(url, headers=self._get_direct_api_headers())
                 response.raise_for_status()
                 data = response.json()
                 return data.get("temperature")
@@ -240,7 +246,7 @@ class CieloThermostatAdapter(ThermostatAdapter):
             try:
                 url = f"{self.direct_api_base_url}/devices/{self.device_id}/temperature"
                 payload = {"temperature": temperature}
-                response = requests.post(url, headers=self._get_direct_api_headers(), json=payload)
+                response = self.session.post(url, headers=self._get_direct_api_headers(), json=payload)
                 response.raise_for_status()
                 return True
             except Exception as e:
@@ -258,7 +264,7 @@ class CieloThermostatAdapter(ThermostatAdapter):
         if self.use_direct_api:
             try:
                 url = f"{self.direct_api_base_url}/devices/{self.device_id}"
-                response = requests.get(url, headers=self._get_direct_api_headers())
+                response = self.session.get(url, headers=self._get_direct_api_headers())
                 response.raise_for_status()
                 data = response.json()
                 return data.get("humidity")
@@ -280,7 +286,7 @@ class CieloThermostatAdapter(ThermostatAdapter):
         if self.use_direct_api:
             try:
                 url = f"{self.direct_api_base_url}/devices/{self.device_id}"
-                response = requests.get(url, headers=self._get_direct_api_headers())
+                response = self.session.get(url, headers=self._get_direct_api_headers())
                 response.raise_for_status()
                 data = response.json()
                 mode = data.get("mode")
@@ -311,7 +317,7 @@ class CieloThermostatAdapter(ThermostatAdapter):
             try:
                 url = f"{self.direct_api_base_url}/devices/{self.device_id}/mode"
                 payload = {"mode": mode}
-                response = requests.post(url, headers=self._get_direct_api_headers(), json=payload)
+                response = self.session.post(url, headers=self._get_direct_api_headers(), json=payload)
                 response.raise_for_status()
                 return True
             except Exception as e:
@@ -329,7 +335,7 @@ class CieloThermostatAdapter(ThermostatAdapter):
         if self.use_direct_api:
             try:
                 url = f"{self.direct_api_base_url}/devices/{self.device_id}"
-                response = requests.get(url, headers=self._get_direct_api_headers())
+                response = self.session.get(url, headers=self._get_direct_api_headers())
                 response.raise_for_status()
                 data = response.json()
                 return data.get("online", False)
@@ -351,8 +357,9 @@ class CieloThermostatAdapter(ThermostatAdapter):
 class PioneerThermostatAdapter(ThermostatAdapter):
     """Adapter for Pioneer thermostats."""
     
-    def __init__(self, device_id, api_key=None, api_token=None):
+    def __init__(self, device_id, api_key=None, api_token=None, session=None):
         self.device_id = device_id
+        self.session = session or requests
         self.api_key = api_key or settings.PIONEER_API_KEY
         self.api_token = api_token or settings.PIONEER_API_TOKEN
         self.base_url = "https://api.pioneerminisplit.com/v1"
@@ -367,7 +374,7 @@ class PioneerThermostatAdapter(ThermostatAdapter):
     def get_temperature(self):
         try:
             url = f"{self.base_url}/devices/{self.device_id}"
-            response = requests.get(url, headers=self._get_headers())
+            response = self.session.get(url, headers=self._get_headers())
             response.raise_for_status()
             data = response.json()
             return data.get("current_temperature")
@@ -379,7 +386,7 @@ class PioneerThermostatAdapter(ThermostatAdapter):
         try:
             url = f"{self.base_url}/devices/{self.device_id}/temperature"
             payload = {"temperature": temperature}
-            response = requests.post(url, headers=self._get_headers(), json=payload)
+            response = self.session.post(url, headers=self._get_headers(), json=payload)
             response.raise_for_status()
             return True
         except Exception as e:
@@ -389,7 +396,7 @@ class PioneerThermostatAdapter(ThermostatAdapter):
     def get_humidity(self):
         try:
             url = f"{self.base_url}/devices/{self.device_id}"
-            response = requests.get(url, headers=self._get_headers())
+            response = self.session.get(url, headers=self._get_headers())
             response.raise_for_status()
             data = response.json()
             return data.get("humidity")
@@ -400,7 +407,7 @@ class PioneerThermostatAdapter(ThermostatAdapter):
     def get_mode(self):
         try:
             url = f"{self.base_url}/devices/{self.device_id}"
-            response = requests.get(url, headers=self._get_headers())
+            response = self.session.get(url, headers=self._get_headers())
             response.raise_for_status()
             data = response.json()
             mode = data.get("mode")
@@ -422,7 +429,7 @@ class PioneerThermostatAdapter(ThermostatAdapter):
         try:
             url = f"{self.base_url}/devices/{self.device_id}/mode"
             payload = {"mode": mode}
-            response = requests.post(url, headers=self._get_headers(), json=payload)
+            response = self.session.post(url, headers=self._get_headers(), json=payload)
             response.raise_for_status()
             return True
         except Exception as e:
@@ -432,7 +439,7 @@ class PioneerThermostatAdapter(ThermostatAdapter):
     def is_online(self):
         try:
             url = f"{self.base_url}/devices/{self.device_id}"
-            response = requests.get(url, headers=self._get_headers())
+            response = self.session.get(url, headers=self._get_headers())
             response.raise_for_status()
             data = response.json()
             return data.get("online", True)  # Default to True if not specified
@@ -511,13 +518,57 @@ class GenericThermostatAdapter(ThermostatAdapter):
             logger.error(f"Error getting cached online status for generic thermostat: {e}")
             return False
 
+    @classmethod
+    def apply_bulk(cls, thermostats, mode, temperature):
+        """Set the mode and target temperature of many thermostats in one query."""
+        from thermostats.models import Thermostat
+        device_ids = [thermostat.device_id for thermostat in thermostats]
+        matched = Thermostat.objects.filter(device_id__in=device_ids)
+        found = set(matched.values_list('device_id', flat=True))
+        matched.update(mode=mode, target_temperature=temperature)
+        return [device_id in found for device_id in device_ids]
+
+
+# Bulk appliers by brand for backends that can apply one setting to many
+# devices in a single call.  Each takes ``(thermostats, mode, temperature)``
+# and returns one success flag per thermostat.  None of the vendor APIs we
+# integrate with offer a bulk endpoint, so vendor devices are commanded one
+# at a time.
+BULK_APPLIERS = {
+    'other': GenericThermostatAdapter.apply_bulk,
+}
+
+
+def get_bulk_applier(brand):
+    """Return the bulk applier for a brand, or None if it has none."""
+    return BULK_APPLIERS.get(brand)
+
+
+def vendor_account_key(thermostat):
+    """Return a key identifying the vendor account a thermostat is reached through."""
+    return (thermostat.brand, thermostat.api_key, thermostat.api_token)
+
+
+def build_vendor_session(pool_size):
+    """
+    Build a `requests.Session` shared by the adapters of one vendor account.
+
+    Args:
+        pool_size: Maximum number of connections kept open to the vendor.
+    """
+    session = requests.Session()
+    session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+    return session
+
 
-def get_thermostat_adapter(thermostat):
+def get_thermostat_adapter(thermostat, session=None):
     """
     Factory function to create the appropriate thermostat adapter based on the thermostat brand.
     
     Args:
         thermostat: A Thermostat model instance
+        session: Optional `requests.Session` shared with other adapters of the
+            same vendor account
         
     Returns:
         An instance of a ThermostatAdapter subclass
@@ -526,7 +577,8 @@ def get_thermostat_adapter(thermostat):
         return NestThermostatAdapter(
             device_id=thermostat.device_id,
             api_key=thermostat.api_key,
-            api_token=thermostat.api_token
+            api_token=thermostat.api_token,
+            session=session
         )
     elif thermostat.brand == 'cielo':
         # Check if we have direct API credentials
@@ -534,19 +586,22 @@ def get_thermostat_adapter(thermostat):
             return CieloThermostatAdapter(
                 device_id=thermostat.device_id,
                 api_key=thermostat.api_key,
-                api_token=thermostat.api_token
+                api_token=thermostat.api_token,
+                session=session
             )
         else:
             # Fall back to IFTTT integration
             return CieloThermostatAdapter(
                 device_id=thermostat.device_id,
-                ifttt_key=thermostat.ifttt_key
+                ifttt_key=thermostat.ifttt_key,
+                session=session
             )
     elif thermostat.brand == 'pioneer':
         return PioneerThermostatAdapter(
             device_id=thermostat.device_id,
             api_key=thermostat.api_key,
-            api_token=thermostat.api_token
+            api_token=thermostat.api_token,
+            session=session
         )
     else:
         return GenericThermostatAdapter(device_id=thermostat.device_id)
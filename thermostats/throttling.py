@@ -0,0 +1,92 @@
+"""
+Load levelling of scheduled thermostat actions.
+
+Bookings cluster on the hour, so without help every pre-arrival action of a
+day falls due at the same minute.  Two mechanisms spread that load:
+
+- ``spread_due_time`` moves an action's due time to a deterministic point in
+  a window before its planned time, so a property's actions always fall due at
+  the same offset and the fleet is spread evenly across the window.
+- ``get_vendor_limiter`` returns a per-process token bucket for each vendor
+  with a configured request rate, which the executor waits on before calling
+  the vendor, but never past the action's planned time.
+"""
+
+import threading
+import time
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+
+
+def spread_due_time(property_id, planned_time, now):
+    """
+    Return when an action planned for ``planned_time`` should fall due.
+
+    The offset is derived from the property id, so it is stable across scans
+    and the same for every action of a property.  The result is never after
+    ``planned_time`` and never before ``now``.
+    """
+    window = settings.SCHEDULED_ACTION_SPREAD_SECONDS
+    if window <= 0:
+        return planned_time
+    offset = zlib.crc32(str(property_id).encode()) % window
+    return max(planned_time - timedelta(seconds=offset), min(now, planned_time))
+
+
+class RateLimiter:
+    """Thread-safe token bucket allowing ``rate`` calls per second on average."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = max(burst or rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens=1, deadline=None):
+        """
+        Wait until ``tokens`` calls are allowed.
+
+        Args:
+            tokens: Number of calls about to be made.
+            deadline: Optional ``time.monotonic()`` value after which the caller
+                must not be held back any longer.
+
+        Returns:
+            bool: True if the calls fit the rate, False if the deadline arrived
+            first.  Callers proceed either way; a late action is worse than a
+            rate-limited one.
+        """
+        tokens = min(tokens, self.capacity)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return True
+                wait = (tokens - self.tokens) / self.rate
+            if deadline is not None:
+                if deadline <= now:
+                    return False
+                wait = min(wait, deadline - now)
+            time.sleep(wait)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_vendor_limiter(brand):
+    """Return the shared RateLimiter for a brand, or None if it is unlimited."""
+    rate = settings.VENDOR_RATE_LIMITS.get(brand)
+    if not rate:
+        return None
+    with _limiters_lock:
+        limiter = _limiters.get(brand)
+        if limiter is None or limiter.rate != rate:
+            limiter = _limiters[brand] = RateLimiter(rate)
+        return limiter
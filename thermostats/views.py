@@ -1,15 +1,26 @@
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from celery import current_app
+from django.conf import settings
 from django.shortcuts import get_object_or_404
-from .models import Property, Thermostat, CalendarEvent, ThermostatCommand, UsageStatistics
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from config.celery import INTERACTIVE_QUEUE
+from .aggregates import PERIODS, period_end, period_start
+from .models import Property, Thermostat, CalendarEvent, DeadLetter, ThermostatCommand, UsageStatistics, UsageAggregate
+from .ownership import owned_property_ids
+from .pagination import DateCursorPagination, NewestFirstCursorPagination, StartDateCursorPagination
 from .serializers import (
     PropertySerializer, 
     ThermostatSerializer, 
     CalendarEventSerializer,
+    DeadLetterSerializer,
     ThermostatCommandSerializer, 
-    UsageStatisticsSerializer
+    UsageStatisticsSerializer,
+    UsageAggregateSerializer
 )
+from .tasks import sync_calendar_feeds
 from .thermostat_adapters import get_thermostat_adapter
 
 class PropertyViewSet(viewsets.ModelViewSet):
@@ -18,23 +29,24 @@ class PropertyViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         # Users can only see their own properties
-        return Property.objects.filter(owner=self.request.user)
+        return Property.objects.filter(owner_id=self.request.user.pk)
     
     @action(detail=True, methods=['get'])
     def thermostats(self, request, pk=None):
         property = self.get_object()
-        thermostats = Thermostat.objects.filter(property=property)
+        thermostats = self.paginate_queryset(Thermostat.objects.filter(property=property))
         serializer = ThermostatSerializer(thermostats, many=True)
-        return Response(serializer.data)
+        return self.get_paginated_response(serializer.data)
     
     @action(detail=True, methods=['get', 'post'])
     def calendar(self, request, pk=None):
         property = self.get_object()
         
         if request.method == 'GET':
-            events = CalendarEvent.objects.filter(property=property)
-            serializer = CalendarEventSerializer(events, many=True)
-            return Response(serializer.data)
+            events = CalendarEvent.objects.filter(property=property, cancelled_at__isnull=True)
+            paginator = StartDateCursorPagination()
+            serializer = CalendarEventSerializer(paginator.paginate_queryset(events, request, view=self), many=True)
+            return paginator.get_paginated_response(serializer.data)
         
         elif request.method == 'POST':
             serializer = CalendarEventSerializer(data=request.data)
@@ -45,34 +57,76 @@ class PropertyViewSet(viewsets.ModelViewSet):
     
     @action(detail=True, methods=['get'])
     def statistics(self, request, pk=None):
+        """
+        Return usage statistics for the property over a period.
+
+        For `week`, `month` and `year` (the current calendar week, month and
+        year) the totals come from the precomputed `UsageAggregate` row, so
+        the response costs the same regardless of how many days it covers.
+        Pass `daily=true` to also receive the daily rows of the period.  Any
+        other period returns every daily row without an aggregate.
+        """
         property = self.get_object()
         period = request.query_params.get('period', 'month')
+        include_daily = request.query_params.get('daily', '').lower() in ('1', 'true', 'yes')
         from django.utils import timezone
-        from datetime import timedelta
-        # Determine the start date based on the requested period.  If no period
-        # matches, return all statistics for the property.
+
+        aggregate = None
         start_date = None
-        now = timezone.now()
-        if period == 'week':
-            start_date = (now - timedelta(days=7)).date()
-        elif period == 'month':
-            # Start of the current month
-            start_date = now.replace(day=1).date()
-        elif period == 'year':
-            # Start of the current year
-            start_date = now.replace(month=1, day=1).date()
+        if period in PERIODS:
+            start_date = period_start(period, timezone.now().date())
+            aggregate = UsageAggregate.objects.filter(
+                property=property, period=period, period_start=start_date
+            ).first()
+
+        # Aggregates are refreshed whenever a daily row changes, so their
+        # timestamp doubles as a validator for the whole response.
+        etag = None
+        last_modified = None
+        if aggregate is not None:
+            etag = quote_etag(f"{aggregate.pk}-{aggregate.updated_at.timestamp()}-{int(include_daily)}")
+            last_modified = aggregate.updated_at.timestamp()
+            not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if not_modified is not None:
+                patch_cache_control(not_modified, private=True, max_age=settings.USAGE_STATISTICS_CACHE_SECONDS)
+                return not_modified
 
-        qs = UsageStatistics.objects.filter(property=property)
-        if start_date:
-            qs = qs.filter(date__gte=start_date)
-        serializer = UsageStatisticsSerializer(qs, many=True)
-        return Response(serializer.data)
+        data = {
+            'period': period,
+            'start_date': start_date,
+            'aggregate': UsageAggregateSerializer(aggregate).data if aggregate else None,
+        }
+        if include_daily or start_date is None:
+            qs = UsageStatistics.objects.filter(property=property).order_by('date')
+            if start_date:
+                qs = qs.filter(date__gte=start_date, date__lt=period_end(period, start_date))
+            data['daily'] = UsageStatisticsSerializer(qs, many=True).data
+
+        response = Response(data)
+        if etag:
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, private=True, max_age=settings.USAGE_STATISTICS_CACHE_SECONDS)
+        return response
     
     @action(detail=True, methods=['post'])
     def sync_calendar(self, request, pk=None):
+        """
+        Queue a sync of the property's external calendar feeds.
+
+        The sync runs on a worker (see `tasks.sync_calendar_feeds`) on the
+        interactive queue, so the user's request jumps ahead of the periodic
+        fleet sync without waiting for the feeds to download.
+        """
         property = self.get_object()
-        # Logic to sync with external calendar
-        return Response({"status": "Calendar sync initiated"})
+        feed_ids = list(property.calendar_feeds.values_list('id', flat=True))
+        if not feed_ids:
+            return Response({"error": "No calendar feeds configured"}, status=status.HTTP_400_BAD_REQUEST)
+        result = sync_calendar_feeds.apply_async(kwargs={'feed_ids': feed_ids}, queue=INTERACTIVE_QUEUE)
+        return Response(
+            {"status": "Calendar sync initiated", "task_id": result.id, "feeds": feed_ids},
+            status=status.HTTP_202_ACCEPTED,
+        )
 
 
 class ThermostatViewSet(viewsets.ModelViewSet):
@@ -81,7 +135,7 @@ class ThermostatViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         # Users can only see thermostats for their properties
-        return Thermostat.objects.filter(property__owner=self.request.user)
+        return Thermostat.objects.filter(property_id__in=owned_property_ids(self.request.user))
     
     @action(detail=True, methods=['get'])
     def status(self, request, pk=None):
@@ -224,15 +278,20 @@ class ThermostatViewSet(viewsets.ModelViewSet):
 class CalendarEventViewSet(viewsets.ModelViewSet):
     serializer_class = CalendarEventSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = StartDateCursorPagination
     
     def get_queryset(self):
-        # Users can only see calendar events for their properties
-        return CalendarEvent.objects.filter(property__owner=self.request.user)
+        # Users can only see calendar events for their properties; events
+        # cancelled on their external calendar are kept only as tombstones.
+        return CalendarEvent.objects.filter(
+            property_id__in=owned_property_ids(self.request.user), cancelled_at__isnull=True
+        )
 
 
 class UsageStatisticsViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = UsageStatisticsSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = DateCursorPagination
     
     def get_queryset(self):
         """
@@ -252,14 +311,18 @@ class UsageStatisticsViewSet(viewsets.ReadOnlyModelViewSet):
         from django.utils import timezone
         from datetime import timedelta
 
-        qs = UsageStatistics.objects.filter(property__owner=self.request.user)
+        qs = UsageStatistics.objects.filter(property_id__in=owned_property_ids(self.request.user))
 
         # Filter by thermostat ID (if provided).  Because usage statistics are
         # attached to properties, we find the property that owns the
-        # thermostat and filter by that property.
+        # thermostat and filter by that property.  A subquery is used rather
+        # than joining through `property__thermostats` so that each daily row
+        # is returned exactly once.
         thermostat_id = self.request.query_params.get('thermostat_id')
         if thermostat_id:
-            qs = qs.filter(property__thermostats__id=thermostat_id)
+            qs = qs.filter(
+                property__in=Thermostat.objects.filter(id=thermostat_id).values('property')
+            )
 
         # Filter by date range based on the `period` query parameter.
         period = self.request.query_params.get('period')
@@ -276,3 +339,42 @@ class UsageStatisticsViewSet(viewsets.ReadOnlyModelViewSet):
                 qs = qs.filter(date__gte=start_date)
 
         return qs
+
+
+class DeadLetterViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Admin-only access to tasks that failed after exhausting their retries.
+    """
+    serializer_class = DeadLetterSerializer
+    permission_classes = [permissions.IsAdminUser]
+    # Newest failures first; ids follow `failed_at`, which is set on insert.
+    pagination_class = NewestFirstCursorPagination
+    queryset = DeadLetter.objects.all()
+
+    @action(detail=False, methods=['post'])
+    def replay(self, request):
+        """
+        Re-send dead-lettered tasks with their original arguments.
+
+        Accepts an optional `ids` list; without it every dead letter that has
+        not been replayed yet is re-sent.  Replayed rows are kept with the id
+        of the new task so repeated failures remain traceable.
+        """
+        from django.utils import timezone
+
+        letters = DeadLetter.objects.filter(replayed_at__isnull=True)
+        ids = request.data.get('ids')
+        if ids is not None:
+            if not isinstance(ids, list):
+                return Response({'error': 'ids must be a list'}, status=status.HTTP_400_BAD_REQUEST)
+            letters = letters.filter(id__in=ids)
+
+        replayed = []
+        for letter in letters:
+            result = current_app.send_task(letter.task_name, args=letter.args, kwargs=letter.kwargs)
+            letter.replayed_at = timezone.now()
+            letter.replay_task_id = result.id
+            letter.save(update_fields=['replayed_at', 'replay_task_id'])
+            replayed.append(letter.id)
+
+        return Response({'replayed': replayed})